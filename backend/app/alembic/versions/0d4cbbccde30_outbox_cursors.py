@@ -0,0 +1,33 @@
+"""outbox_cursors
+
+Revision ID: 0d4cbbccde30
+Revises: 7c4f19e2a6b8
+Create Date: 2026-10-19 18:21:40.507392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d4cbbccde30'
+down_revision: Union[str, Sequence[str], None] = '7c4f19e2a6b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_cursors',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('outbox_cursors')
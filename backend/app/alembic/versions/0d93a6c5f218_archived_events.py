@@ -0,0 +1,37 @@
+"""archived_events
+
+Revision ID: 0d93a6c5f218
+Revises: f2b6d81c4e07
+Create Date: 2026-10-19 15:32:09.410873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d93a6c5f218'
+down_revision: Union[str, Sequence[str], None] = 'f2b6d81c4e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'archived_events',
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), primary_key=True),
+        sa.Column('orders_path', sa.String(), nullable=False),
+        sa.Column('trades_path', sa.String(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('trade_count', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('archived_events')
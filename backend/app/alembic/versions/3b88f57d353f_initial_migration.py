@@ -20,9 +20,88 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    pass
+    # databases created before migrations existed are stamped past this revision ,
+    # it only runs on a fresh database
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('current_balance', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'events',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('created_by', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('status', sa.Enum('ONGOING', 'COMPLETED', name='eventstatus'), nullable=False),
+        sa.Column('result', sa.Enum('YES', 'NO', 'DRAW', name='eventresult'), nullable=True),
+    )
+    op.create_index('ix_events_id', 'events', ['id'])
+
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        sa.Column('total_quantity', sa.Integer(), nullable=False),
+        sa.Column('filled_quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('type_of_share', sa.Enum('YES', 'NO', name='ordersharetype'), nullable=False),
+        sa.Column('side', sa.Enum('BUY', 'SELL', name='orderside'), nullable=False),
+        sa.Column('status', sa.Enum('CANCELLED', 'INCOMPLETE', 'COMPLETELYFILLED', 'PARTIALFILLED', name='orderstatus'), nullable=False),
+        sa.CheckConstraint('price >= 1 AND price <= 10', name='check_price_range'),
+    )
+    op.create_index('ix_orders_id', 'orders', ['id'])
+
+    op.create_table(
+        'trades',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('type_of_share', sa.Enum('YES', 'NO', name='tradesharetype'), nullable=False),
+        sa.Column('buyer_user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('seller_user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('buyer_order_id', sa.Integer(), sa.ForeignKey('orders.id'), nullable=False),
+        sa.Column('seller_order_id', sa.Integer(), sa.ForeignKey('orders.id'), nullable=False),
+        sa.Column('executed_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_trades_id', 'trades', ['id'])
+
+    op.create_table(
+        'portfolio',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('type_of_share', sa.Enum('YES', 'NO', name='sharetype'), nullable=False),
+    )
+    op.create_index('ix_portfolio_id', 'portfolio', ['id'])
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    pass
+    op.drop_index('ix_portfolio_id', table_name='portfolio')
+    op.drop_table('portfolio')
+    op.drop_index('ix_trades_id', table_name='trades')
+    op.drop_table('trades')
+    op.drop_index('ix_orders_id', table_name='orders')
+    op.drop_table('orders')
+    op.drop_index('ix_events_id', table_name='events')
+    op.drop_table('events')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
+
+    for name in ['sharetype', 'tradesharetype', 'orderstatus', 'orderside', 'ordersharetype', 'eventresult', 'eventstatus']:
+        sa.Enum(name=name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,43 @@
+"""api_keys
+
+Revision ID: 7c4f19e2a6b8
+Revises: 0d93a6c5f218
+Create Date: 2026-10-19 17:04:51.238614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4f19e2a6b8'
+down_revision: Union[str, Sequence[str], None] = '0d93a6c5f218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'api_keys',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('key_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('scopes', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_api_keys_id', 'api_keys', ['id'])
+    op.create_index('ix_api_keys_key_id', 'api_keys', ['key_id'], unique=True)
+    op.create_index('ix_api_keys_user_id', 'api_keys', ['user_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_keys_user_id', table_name='api_keys')
+    op.drop_index('ix_api_keys_key_id', table_name='api_keys')
+    op.drop_index('ix_api_keys_id', table_name='api_keys')
+    op.drop_table('api_keys')
@@ -0,0 +1,30 @@
+"""api_key_secrets
+
+Revision ID: 9e3a7f215c68
+Revises: 0d4cbbccde30
+Create Date: 2026-10-19 19:02:17.843106
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3a7f215c68'
+down_revision: Union[str, Sequence[str], None] = '0d4cbbccde30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing keys keep a null secret and sign with the derived one until reissued
+    op.add_column('api_keys', sa.Column('secret_encrypted', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('api_keys') as batch_op:
+        batch_op.drop_column('secret_encrypted')
@@ -0,0 +1,67 @@
+"""hot_query_indexes
+
+Revision ID: a41c7e9d2b53
+Revises: 3b88f57d353f
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e9d2b53'
+down_revision: Union[str, Sequence[str], None] = '3b88f57d353f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_id_id_desc', 'orders', ['user_id', sa.text('id DESC')])
+    op.create_index('ix_orders_event_id_status', 'orders', ['event_id', 'status'])
+
+    op.create_index('ix_trades_event_id_executed_at_desc', 'trades', ['event_id', sa.text('executed_at DESC')])
+    op.create_index('ix_trades_buyer_user_id', 'trades', ['buyer_user_id'])
+    op.create_index('ix_trades_seller_user_id', 'trades', ['seller_user_id'])
+
+    # positions used to be inserted without a lookup , fold duplicates into the oldest row
+    # before the unique constraint can be added
+    op.execute("""
+        UPDATE portfolio SET quantity = (
+            SELECT SUM(p.quantity) FROM portfolio p
+            WHERE p.user_id = portfolio.user_id
+              AND p.event_id = portfolio.event_id
+              AND p.type_of_share = portfolio.type_of_share
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM portfolio
+            GROUP BY user_id, event_id, type_of_share
+            HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM portfolio
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM portfolio
+            GROUP BY user_id, event_id, type_of_share
+        )
+    """)
+
+    with op.batch_alter_table('portfolio') as batch_op:
+        batch_op.create_unique_constraint('uq_portfolio_user_event_share', ['user_id', 'event_id', 'type_of_share'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('portfolio') as batch_op:
+        batch_op.drop_constraint('uq_portfolio_user_event_share', type_='unique')
+
+    op.drop_index('ix_trades_seller_user_id', table_name='trades')
+    op.drop_index('ix_trades_buyer_user_id', table_name='trades')
+    op.drop_index('ix_trades_event_id_executed_at_desc', table_name='trades')
+
+    op.drop_index('ix_orders_event_id_status', table_name='orders')
+    op.drop_index('ix_orders_user_id_id_desc', table_name='orders')
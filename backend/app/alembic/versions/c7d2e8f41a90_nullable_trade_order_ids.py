@@ -0,0 +1,35 @@
+"""nullable_trade_order_ids
+
+Revision ID: c7d2e8f41a90
+Revises: a41c7e9d2b53
+Create Date: 2026-10-19 11:02:15.630471
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e8f41a90'
+down_revision: Union[str, Sequence[str], None] = 'a41c7e9d2b53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # settlement payout trades have no orders behind them
+    with op.batch_alter_table('trades') as batch_op:
+        batch_op.alter_column('buyer_order_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('seller_order_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM trades WHERE buyer_order_id IS NULL OR seller_order_id IS NULL")
+
+    with op.batch_alter_table('trades') as batch_op:
+        batch_op.alter_column('seller_order_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('buyer_order_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,48 @@
+"""settlement_jobs
+
+Revision ID: e5a0b3c9d417
+Revises: c7d2e8f41a90
+Create Date: 2026-10-19 12:20:48.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a0b3c9d417'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e8f41a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'settlement_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        # the enum type already exists , it is shared with events.result
+        sa.Column('result', postgresql.ENUM('YES', 'NO', 'DRAW', name='eventresult', create_type=False), nullable=False),
+        sa.Column('admin_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='settlementstatus'), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('last_portfolio_id', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint('event_id', name='uq_settlement_jobs_event_id'),
+    )
+    op.create_index('ix_settlement_jobs_id', 'settlement_jobs', ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_settlement_jobs_id', table_name='settlement_jobs')
+    op.drop_table('settlement_jobs')
+    sa.Enum(name='settlementstatus').drop(op.get_bind(), checkfirst=True)
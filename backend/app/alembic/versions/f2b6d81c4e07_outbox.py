@@ -0,0 +1,40 @@
+"""outbox
+
+Revision ID: f2b6d81c4e07
+Revises: e5a0b3c9d417
+Create Date: 2026-10-19 14:05:31.662190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d81c4e07'
+down_revision: Union[str, Sequence[str], None] = 'e5a0b3c9d417'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id'), nullable=False),
+        sa.Column('kind', sa.Enum('TRADE', 'BOOK', name='outboxkind'), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_outbox_id', 'outbox', ['id'])
+    op.create_index('ix_outbox_created_at', 'outbox', ['created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_created_at', table_name='outbox')
+    op.drop_index('ix_outbox_id', table_name='outbox')
+    op.drop_table('outbox')
+    sa.Enum(name='outboxkind').drop(op.get_bind(), checkfirst=True)
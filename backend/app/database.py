@@ -1,21 +1,342 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from typing import Dict, List, Optional
+from fastapi import Request
+from starlette.requests import HTTPConnection
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, OperationalError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL,echo=True)
+# connection pool settings , shared by the sync and the async engine (each gets its own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_ECHO = os.getenv("DB_ECHO", "true").lower() == "true"
+
+# comma separated read replicas of DATABASE_URL , reads go to the primary when empty
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# replicas further behind the primary than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+# a replica that failed to connect is skipped this long
+REPLICA_RETRY_INTERVAL = float(os.getenv("REPLICA_RETRY_INTERVAL", "10"))
+# reads of a client that wrote within this window go to the primary , so it sees its own writes
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+class PoolMetrics:
+    """Checkout wait times and exhaustion counts of one connection pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.exhausted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_exhausted_at = None
+
+    def record_wait(self, seconds: float):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_exhausted(self):
+        with self.lock:
+            self.exhausted += 1
+            self.last_exhausted_at = time.time()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "exhausted": self.exhausted,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "last_exhausted_at": self.last_exhausted_at
+            }
+
+def _to_async_url(url: str) -> str:
+    """Swap the sync driver of a database url for its asyncio counterpart"""
+    for sync_prefix, async_prefix in [
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ]:
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+class _TimedPool:
+    """Pool mixin that records how long each checkout waited , only runs when a session actually
+    needs a connection , so a session that never queries never takes one"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_exhausted()
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+def _timed_pool(base, metrics: PoolMetrics):
+    # a class per pool , so the metrics survive the pool being recreated on dispose
+    return type(f"Timed{base.__name__}", (_TimedPool, base), {"metrics": metrics})
+
+def _pool_options() -> Dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# same database as DATABASE_URL unless set explicitly
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+db_pool_metrics = PoolMetrics("postgres")
+async_db_pool_metrics = PoolMetrics("postgres_async")
+
+engine = create_engine(DATABASE_URL, echo=DB_ECHO, poolclass=_timed_pool(QueuePool, db_pool_metrics),
+                       **_pool_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# used by the async read endpoints , they don't hold a threadpool thread while waiting on postgres
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=DB_ECHO,
+                                   poolclass=_timed_pool(AsyncAdaptedQueuePool, async_db_pool_metrics),
+                                   **_pool_options())
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
+class Replica:
+    """A read replica with its own pools and its last measured replication lag"""
+
+    def __init__(self, index: int, url: str):
+        self.name = f"replica_{index}"
+        self.metrics = PoolMetrics(self.name)
+        self.async_metrics = PoolMetrics(self.name + "_async")
+        self.engine = create_engine(url, echo=DB_ECHO, poolclass=_timed_pool(QueuePool, self.metrics),
+                                    **_pool_options())
+        self.async_engine = create_async_engine(_to_async_url(url), echo=DB_ECHO,
+                                                poolclass=_timed_pool(AsyncAdaptedQueuePool, self.async_metrics),
+                                                **_pool_options())
+        self.lag: Optional[float] = None
+        self.lag_checked_at = 0.0
+        self.down_until = 0.0
+
+    def usable(self, now: float) -> bool:
+        if now < self.down_until:
+            return False
+        return self.lag is None or self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def lag_check_due(self, now: float) -> bool:
+        return now - self.lag_checked_at >= REPLICA_LAG_CHECK_INTERVAL
+
+    def lag_statement(self):
+        # sqlite replicas (local testing) have no replication to measure
+        if self.engine.dialect.name != "postgresql":
+            return None
+        # null on a server that is not replaying wal , treated as caught up
+        return text("SELECT EXTRACT(EPOCH FROM (now() - pg_last_xact_replay_timestamp()))")
+
+    def record_lag(self, lag, now: float):
+        self.lag = float(lag) if lag is not None else 0.0
+        self.lag_checked_at = now
+
+    def mark_down(self, now: float):
+        self.down_until = now + REPLICA_RETRY_INTERVAL
+
+replicas: List[Replica] = [Replica(i, url) for i, url in enumerate(DATABASE_REPLICA_URLS)]
+_replica_lock = threading.Lock()
+_next_replica = 0
+
+# client key -> monotonic time of its last committed write
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = threading.Lock()
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_commit(session):
+    request = session.info.get("request")
+    if request is not None:
+        note_write(request)
+
+def _client_key(request: Request) -> str:
+    # the bearer token identifies the client without decoding it
+    return request.headers.get("authorization") or (request.client.host if request.client else "")
+
+def note_write(request: Request):
+    """Pin the reads of the client that sent request to the primary for a while"""
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[_client_key(request)] = now
+
+        # forget clients whose window has passed
+        if len(_recent_writes) > 10000:
+            for key in [key for key, at in _recent_writes.items() if now - at > READ_YOUR_WRITES_WINDOW]:
+                del _recent_writes[key]
+
+def wrote_recently(request: Request) -> bool:
+    with _recent_writes_lock:
+        at = _recent_writes.get(_client_key(request))
+    return at is not None and time.monotonic() - at <= READ_YOUR_WRITES_WINDOW
+
+def _pick_replica() -> Optional[Replica]:
+    """Round robin over the replicas that are up and not lagging"""
+    global _next_replica
+
+    now = time.monotonic()
+    with _replica_lock:
+        for _ in range(len(replicas)):
+            replica = replicas[_next_replica % len(replicas)]
+            _next_replica += 1
+            if replica.usable(now):
+                return replica
+    return None
+
+def _open_replica_session(request: Request) -> Optional[Session]:
+    """A session on a healthy , caught up replica , None when the primary should serve the read"""
+    if not replicas or wrote_recently(request):
+        return None
+
+    while True:
+        replica = _pick_replica()
+        if replica is None:
+            return None
+
+        db = SessionLocal(bind=replica.engine)
+        now = time.monotonic()
+        try:
+            # connect up front , a replica that is down is skipped before the read runs on it
+            db.connection()
+
+            statement = replica.lag_statement()
+            if statement is not None and replica.lag_check_due(now):
+                replica.record_lag(db.execute(statement).scalar(), now)
+        except OperationalError as e:
+            print(f"Error connecting to {replica.name}: {e}")
+            replica.mark_down(now)
+            db.close()
+            continue
+
+        if replica.usable(now):
+            return db
+        db.close()
+
+async def _open_async_replica_session(request: Request) -> Optional[AsyncSession]:
+    if not replicas or wrote_recently(request):
+        return None
+
+    while True:
+        replica = _pick_replica()
+        if replica is None:
+            return None
+
+        db: AsyncSession = AsyncSessionLocal(bind=replica.async_engine)
+        now = time.monotonic()
+        try:
+            await db.connection()
+
+            statement = replica.lag_statement()
+            if statement is not None and replica.lag_check_due(now):
+                replica.record_lag((await db.execute(statement)).scalar(), now)
+        except OperationalError as e:
+            print(f"Error connecting to {replica.name}: {e}")
+            replica.mark_down(now)
+            await db.close()
+            continue
+
+        if replica.usable(now):
+            return db
+        await db.close()
+
+def get_db(request: HTTPConnection):
+    """Session on the primary , for writes and reads that must be current , websockets included"""
     db = SessionLocal()
+    # lets a commit pin this client's following reads to the primary
+    db.info["request"] = request
+    try:
+        yield db
+    finally:
+        db.close()
+
+get_write_db = get_db
+
+async def get_async_db():
+    db: AsyncSession = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def get_read_db(request: Request):
+    """Session on a replica , falls back to the primary when none is usable"""
+    db = _open_replica_session(request)
+    if db is None:
+        yield from get_db(request)
+        return
+
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def open_async_read_session(request: Request) -> AsyncSession:
+    """Session on a replica or else the primary , the caller closes it"""
+    db = await _open_async_replica_session(request)
+    if db is None:
+        db = AsyncSessionLocal()
+    return db
+
+async def get_async_read_db(request: Request):
+    db = await open_async_read_session(request)
+
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def pool_status(sql_engine, metrics: PoolMetrics) -> Dict:
+    """Live usage of an engine's pool plus its checkout metrics"""
+    pool = sql_engine.pool
+    status = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+    }
+    for name in ["checkedout", "checkedin", "overflow"]:
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    status.update(metrics.snapshot())
+    return status
+
+def replica_status() -> List[Dict]:
+    """Pool usage , lag and health of every replica"""
+    now = time.monotonic()
+    return [{
+        "name": replica.name,
+        "usable": replica.usable(now),
+        "lag_seconds": replica.lag,
+        "down_for_seconds": round(max(0.0, replica.down_until - now), 3),
+        "sync": pool_status(replica.engine, replica.metrics),
+        "async": pool_status(replica.async_engine, replica.async_metrics)
+    } for replica in replicas]
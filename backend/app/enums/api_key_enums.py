@@ -0,0 +1,5 @@
+from enum import Enum as PyEnum
+
+class ApiKeyScope(PyEnum):
+    READ='read'
+    TRADE='trade'
@@ -0,0 +1,5 @@
+from enum import Enum as PyEnum
+
+class OutboxKind(PyEnum):
+    TRADE='trade'
+    BOOK='book'
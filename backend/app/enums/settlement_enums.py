@@ -0,0 +1,7 @@
+from enum import Enum as PyEnum
+
+class SettlementStatus(PyEnum):
+    PENDING='pending'
+    RUNNING='running'
+    COMPLETED='completed'
+    FAILED='failed'
@@ -2,4 +2,14 @@ from enum import Enum as PyEnum
 
 class TradeShareType(PyEnum):
     YES = "yes"
-    NO = "no"
\ No newline at end of file
+    NO = "no"
+
+class CandleInterval(PyEnum):
+    ONE_SECOND = "1s"
+    ONE_MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    ONE_HOUR = "1h"
+
+class ExportFormat(PyEnum):
+    CSV = "csv"
+    NDJSON = "ndjson"
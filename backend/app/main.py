@@ -1,20 +1,79 @@
+import time
+
+# cold start is measured from here , before the app and its dependencies are imported
+_started_at = time.monotonic()
+
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 
-from .model import user_model
-from .database import engine, get_db
-from .routes import auth , event , portfolio , trade ,order , user , orderbook
+from .model import user_model , api_key_model
+from .database import engine, async_engine, replicas, get_db
+from .routes import auth , event , portfolio , trade ,order , user , orderbook , admin , api_key , health
 from .service import auth as auth_module
+from .service.broadcast import dispatcher
+from .service.outbox import relay
+from .service.settlement import resume_settlement_jobs, stop_settlement_workers
+from .service.rate_limit import RateLimitMiddleware
+from .service.lifecycle import readiness, timed, verify_schema, warm_up, drain, DrainMiddleware
+from .service.redis_service import releaseAllLocks
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+
+    # tables come from alembic , a worker on an unmigrated database refuses to start
+    await timed("schema", asyncio.to_thread(verify_schema))
+
+    # engine code in threadpool workers hands its broadcasts to this loop
+    dispatcher.start(loop)
+    # publishes committed trades and book changes , from this and every other process
+    relay.start(loop)
+
+    # finish settlements a previous process left half done , from their checkpoints
+    resumed = await timed("settlements", asyncio.to_thread(resume_settlement_jobs))
+    if resumed:
+        print(f"Resumed {resumed} settlement jobs")
+
+    await warm_up()
+    readiness.mark_ready(_started_at)
+
+    yield
+
+    # refuse new orders , finish the ones matching , deliver their fills , close the feeds ,
+    # already done if app.server's signal handler or /admin/drain started it
+    result = await drain()
+    print(f"Drained in {result['drain_ms']} ms")
+
+    await asyncio.to_thread(stop_settlement_workers)
+    await relay.stop()
+    await dispatcher.stop()
+    # queues locked by this process open up now instead of after LOCK_TIMEOUT
+    released = await asyncio.to_thread(releaseAllLocks)
+    if released:
+        print(f"Released {released} queue locks")
+    await async_engine.dispose()
+    for replica in replicas:
+        await replica.async_engine.dispose()
+    engine.dispose()
 
-# Create database tables
-user_model.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="FastAPI JWT Auth",
     description="A FastAPI application with JWT authentication and PostgreSQL",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# token buckets per caller , inside cors so a 429 still carries its headers
+app.add_middleware(RateLimitMiddleware)
+
+# refuses order entry while the worker shuts down , outside the limiter so refusals cost no token
+app.add_middleware(DrainMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +81,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
 # Include routers
@@ -32,8 +92,9 @@ app.include_router(trade.router)
 app.include_router(order.router)
 app.include_router(user.router)
 app.include_router(orderbook.router)
-
-
+app.include_router(admin.router)
+app.include_router(api_key.router)
+app.include_router(health.router)
 
 
 @app.get("/")
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # sent in the X-API-Key header
+    key_id = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    # list of ApiKeyScope values
+    scopes = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    # the random signing secret , fernet encrypted under API_KEY_ENCRYPTION_KEY. Null for keys
+    # issued before secrets were stored , theirs is derived from SECRET_KEY
+    secret_encrypted = Column(String, nullable=True)
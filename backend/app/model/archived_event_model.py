@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class ArchivedEvent(Base):
+    __tablename__ = "archived_events"
+
+    # the orders and trades of the event live in these files , not in the hot tables
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    orders_path = Column(String, nullable=False)
+    trades_path = Column(String, nullable=False)
+    order_count = Column(Integer, nullable=False, default=0)
+    trade_count = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum, CheckConstraint, Index
 from ..database import Base
 from ..enums import order_enums
 
@@ -17,4 +17,8 @@ class Order(Base):
     
     __table_args__ = (
         CheckConstraint('price >= 1 AND price <= 10', name='check_price_range'),
+        # a user's order history , newest first
+        Index('ix_orders_user_id_id_desc', 'user_id', id.desc()),
+        # open orders of an event (cancel , settlement)
+        Index('ix_orders_event_id_status', 'event_id', 'status'),
     )
\ No newline at end of file
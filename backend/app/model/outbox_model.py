@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy.sql import func
+from ..database import Base
+from ..enums import outbox_enums
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox"
+
+    # also the sequence number of the message , relays deliver in id order
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    kind = Column(Enum(outbox_enums.OutboxKind), nullable=False)
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class OutboxCursor(Base):
+    __tablename__ = "outbox_cursors"
+
+    # OUTBOX_RELAY_NAME of the relay , one row each
+    name = Column(String, primary_key=True)
+    # id of the last message the relay delivered
+    last_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text , Boolean , Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text , Boolean , Enum, UniqueConstraint
 from ..database import Base
 from ..enums import portfolio_enums
 
@@ -9,4 +9,9 @@ class Portfolio(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     event_id = Column(Integer , ForeignKey("events.id"),nullable=False)
     quantity = Column(Integer , nullable=False)
-    type_of_share = Column(Enum(portfolio_enums.ShareType),nullable=False)
\ No newline at end of file
+    type_of_share = Column(Enum(portfolio_enums.ShareType),nullable=False)
+
+    __table_args__ = (
+        # one row per position , also serves the (user_id , event_id) lookups
+        UniqueConstraint('user_id', 'event_id', 'type_of_share', name='uq_portfolio_user_event_share'),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Text, Enum
+from sqlalchemy.sql import func
+from ..database import Base
+from ..enums import event_enums, settlement_enums
+
+
+class SettlementJob(Base):
+    __tablename__ = "settlement_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # one job per event , so completing an event twice can't pay twice
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, unique=True)
+    result = Column(Enum(event_enums.EventResult), nullable=False)
+    admin_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(Enum(settlement_enums.SettlementStatus), nullable=False, default=settlement_enums.SettlementStatus.PENDING)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    # checkpoint , every portfolio row up to this id is paid out
+    last_portfolio_id = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..database import Base
@@ -15,9 +15,16 @@ class Trade(Base):
     type_of_share = Column(Enum(trade_enums.TradeShareType), nullable=False)
     buyer_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     seller_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    buyer_order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    seller_order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    # settlement payouts are not backed by orders
+    buyer_order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    seller_order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
     executed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_trades_event_id_executed_at_desc', 'event_id', executed_at.desc()),
+        Index('ix_trades_buyer_user_id', 'buyer_user_id'),
+        Index('ix_trades_seller_user_id', 'seller_user_id'),
+    )
     
     # Relationships
     event = relationship("Event")
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+
+from ..schemas import user_schema
+from ..service import auth
+from ..service.redis_service import redis_pool_status
+from ..service.password import hasher
+from ..service.api_key import api_keys
+from ..service.rate_limit import limiter
+from ..service.lifecycle import drain
+from ..database import engine, async_engine, db_pool_metrics, async_db_pool_metrics, pool_status, replica_status
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+def require_admin(current_user: user_schema.User = Depends(auth.get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can access this resource"
+        )
+    return current_user
+
+@router.get("/pools")
+async def get_pool_status(current_user: user_schema.User = Depends(require_admin)):
+    """
+    Connection pool usage , checkout wait times and exhaustion counts
+    for the postgres engines , the redis clients , the password pool and the api key table
+    """
+    return {
+        "postgres": {
+            "sync": pool_status(engine, db_pool_metrics),
+            "async": pool_status(async_engine, async_db_pool_metrics),
+            "replicas": replica_status()
+        },
+        "redis": redis_pool_status(),
+        "password": hasher.hash_stats(),
+        "api_keys": api_keys.key_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/rate-limits")
+async def get_rate_limits(current_user: user_schema.User = Depends(require_admin)):
+    """Limits of each route class , with the requests let through and throttled"""
+    return {
+        **limiter.limit_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.post("/drain")
+async def drain_worker(current_user: user_schema.User = Depends(require_admin)):
+    """
+    Take this worker out of rotation ahead of a restart , readiness fails ,
+    new orders get 503 and feeds close with a reconnect hint
+    """
+    return {
+        **(await drain("Server draining")),
+        "timestamp": datetime.now().isoformat()
+    }
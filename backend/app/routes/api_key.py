@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from ..schemas import api_key_schema
+from ..service import auth, api_key
+from ..service.user_cache import Principal
+from ..database import get_db
+
+router = APIRouter(prefix="/api-keys", tags=["API keys"])
+
+@router.post("/", response_model=api_key_schema.ApiKeyIssued, status_code=status.HTTP_201_CREATED)
+def issue_api_key(key_data: api_key_schema.ApiKeyCreate,
+                  current_user: Principal = Depends(auth.get_session_user),
+                  db: Session = Depends(get_db)):
+    """Issue a key for the caller , the secret is shown only in this response"""
+    
+    if not key_data.scopes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one scope is required"
+        )
+    
+    db_key, secret = api_key.issue_key(db, current_user.id, key_data.name, key_data.scopes)
+    return {
+        "key_id": db_key.key_id,
+        "name": db_key.name,
+        "scopes": db_key.scopes,
+        "created_at": db_key.created_at,
+        "revoked_at": db_key.revoked_at,
+        "secret": secret
+    }
+
+@router.get("/", response_model=list[api_key_schema.ApiKey])
+def get_my_api_keys(current_user: Principal = Depends(auth.get_session_user),
+                    db: Session = Depends(get_db)):
+    return api_key.get_keys_by_user(db, current_user.id)
+
+@router.delete("/{key_id}", response_model=api_key_schema.ApiKey)
+def revoke_api_key(key_id: str,
+                   current_user: Principal = Depends(auth.get_session_user),
+                   db: Session = Depends(get_db)):
+    
+    db_key = api_key.get_key(db, key_id)
+    
+    if not db_key or (db_key.user_id != current_user.id and not current_user.is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="API key not found"
+        )
+    
+    return api_key.revoke_key(db, db_key)
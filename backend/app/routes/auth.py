@@ -2,33 +2,34 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..schemas import user_schema
 from ..model import user_model
 from ..service import auth
-from ..database import get_db
+from ..database import get_db, get_async_db
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/register", response_model=user_schema.User)
-def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: user_schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = auth.get_user_by_username(db, username=user.username)
+    db_user = await auth.get_user_by_username_async(db, username=user.username)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Username already registered"
         )
     
-    db_user = auth.get_user_by_email(db, email=user.email)
+    db_user = await auth.get_user_by_email_async(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+    # Create new user , bcrypt runs on the password pool
+    hashed_password = await auth.get_password_hash_async(user.password)
     db_user = user_model.User(
         username=user.username,
         email=user.email,
@@ -37,13 +38,13 @@ def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
         current_balance=0
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/login", response_model=user_schema.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await auth.authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,6 +58,14 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=user_schema.User)
-async def read_users_me(current_user: user_model.User = Depends(auth.get_current_active_user)):
-    return current_user
+async def read_users_me(current_user: user_model.User = Depends(auth.get_current_active_user),
+                        db: AsyncSession = Depends(get_async_db)):
+    # the cached principal has no balance , read the full row from the primary
+    db_user = await auth.get_user_by_id_async(db, current_user.id)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return db_user
 
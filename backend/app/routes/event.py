@@ -1,15 +1,18 @@
 # In your FastAPI endpoints:
 
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
-from ..schemas import event_schema, user_schema , portfolio_schema
+from ..schemas import event_schema, user_schema , portfolio_schema , settlement_schema , archive_schema
 from ..model import event_model
-from ..service import auth, event , portfolio
-from ..database import get_db
+from ..service import auth, event , portfolio , settlement , archive
+from ..database import get_db, get_async_read_db
 from ..enums import event_enums , portfolio_enums
+from ..service.pagination import set_next_cursor, page_size, MAX_PAGE_SIZE
 
 
 
@@ -45,10 +48,10 @@ def create_event(event_data: event_schema.EventCreate,
 
 
 @router.get("/{event_id}", response_model=event_schema.Event)
-def get_event(event_id: int,
+async def get_event(event_id: int,
               current_user: user_schema.User = Depends(auth.get_current_user),
-              db: Session = Depends(get_db)):
-    db_event = event.get_event_by_id(db, event_id)
+              db: AsyncSession = Depends(get_async_read_db)):
+    db_event = await event.get_event_by_id_async(db, event_id)
     
     if not db_event:
         raise HTTPException(
@@ -59,10 +62,15 @@ def get_event(event_id: int,
     return db_event
 
 @router.get("/", response_model=list[event_schema.Event])
-def get_all_events(current_user: user_schema.User = Depends(auth.get_current_user),
-                   db: Session = Depends(get_db)):
+async def get_all_events(response: Response,
+                   cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                   limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size , every row when neither cursor nor limit is passed"),
+                   current_user: user_schema.User = Depends(auth.get_current_user),
+                   db: AsyncSession = Depends(get_async_read_db)):
     
-    return event.get_all_events(db)
+    events, next_cursor = await event.get_all_events_async(db, cursor, page_size(cursor, limit))
+    set_next_cursor(response, next_cursor)
+    return events
 
 @router.put("/{event_id}", response_model=event_schema.Event)
 def update_event(event_id: int,
@@ -86,7 +94,7 @@ def update_event(event_id: int,
 
     return updated_event
 
-@router.put("/event_completed/{event_id}")
+@router.put("/event_completed/{event_id}", status_code=status.HTTP_202_ACCEPTED)
 def completed_event(event_id: int,
                  event_update: event_schema.EventUpdate,
                  current_user: user_schema.User = Depends(auth.get_current_user),
@@ -106,15 +114,91 @@ def completed_event(event_id: int,
             detail="Event not found"
         )
 
-    result = event.event_completed(db ,event_id, event_update , current_user)
+    job = event.event_completed(db ,event_id, event_update , current_user.id)
 
-    if not result:
+    if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Not able to update"
         )
     
-    return {"message":"Event completed succesfully"}
+    # payouts run in the background , progress at the settlement endpoint
+    return {
+        "message": "Event completed , settlement started",
+        "job_id": job.id,
+        "settlement_status": job.status.value,
+        "status_url": f"/events/{event_id}/settlement"
+    }
+
+@router.get("/{event_id}/settlement", response_model=settlement_schema.SettlementJob)
+def get_settlement_status(event_id: int,
+                          current_user: user_schema.User = Depends(auth.get_current_user),
+                          db: Session = Depends(get_db)):
+    
+    if current_user.is_admin == False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can view settlements"
+        )
+    
+    job = settlement.get_settlement_job(db, event_id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Settlement not found"
+        )
+    
+    return job
+
+@router.post("/{event_id}/archive", response_model=archive_schema.ArchivedEvent)
+def archive_event(event_id: int,
+                  current_user: user_schema.User = Depends(auth.get_current_user),
+                  db: Session = Depends(get_db)):
+    """Move the orders and trades of a settled event to the columnar archive"""
+    
+    if current_user.is_admin == False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can archive events"
+        )
+    
+    if not event.get_event_by_id(db, event_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    
+    entry = archive.archive_event(db, event_id)
+    
+    if not entry:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Event is not settled yet"
+        )
+    
+    return entry
+
+@router.get("/{event_id}/archive", response_model=archive_schema.ArchivedEvent)
+def get_archive(event_id: int,
+                current_user: user_schema.User = Depends(auth.get_current_user),
+                db: Session = Depends(get_db)):
+    
+    if current_user.is_admin == False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can view archives"
+        )
+    
+    entry = archive.get_archived_event(db, event_id)
+    
+    if not entry:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archive not found"
+        )
+    
+    return entry
 
 
 
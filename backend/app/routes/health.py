@@ -0,0 +1,19 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from ..service.lifecycle import readiness
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+@router.get("/live")
+async def liveness():
+    """The process is up and serving , restart it if this fails"""
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness_check():
+    """Caches are warm and the schema checked , send traffic only when this is 200"""
+    state = readiness.state()
+    if not readiness.ready:
+        return JSONResponse(state, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return state
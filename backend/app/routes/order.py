@@ -1,15 +1,19 @@
 # In your FastAPI endpoints:
 
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
 from ..schemas import order_schema, user_schema
 from ..model import order_model
 from ..service import auth, order , orderbook , event , user
-from ..database import get_db
+from ..database import get_db, get_async_read_db
 from ..enums import event_enums
+from ..service.pagination import set_next_cursor, page_size, MAX_PAGE_SIZE
 
 
 router = APIRouter(prefix="/orders")
@@ -50,15 +54,15 @@ def create_order(order_data: order_schema.OrderCreate,
 
 
 @router.get("/{order_id}", response_model=order_schema.Order)
-def get_order(order_id: int,
+async def get_order(order_id: int,
               current_user: user_schema.User = Depends(auth.get_current_user),
-              db: Session = Depends(get_db)):
+              db: AsyncSession = Depends(get_async_read_db)):
     
     # take from memory
-    db_order = order.get_order_by_id_from_memory(order_id)
+    db_order = await run_in_threadpool(order.get_order_by_id_from_memory, order_id)
 
     if db_order is None:
-        db_order = order.get_order_by_id(db, order_id)
+        db_order = await order.get_order_by_id_async(db, order_id)
     
     if not db_order:
         raise HTTPException(
@@ -76,22 +80,33 @@ def get_order(order_id: int,
     return db_order
 
 @router.get("/", response_model=list[order_schema.Order])
-def get_user_orders(current_user: user_schema.User = Depends(auth.get_current_user),
-                    db: Session = Depends(get_db)):
+async def get_user_orders(response: Response,
+                    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size , every row when neither cursor nor limit is passed"),
+                    current_user: user_schema.User = Depends(auth.get_current_user),
+                    db: AsyncSession = Depends(get_async_read_db)):
     
-    return order.get_orders_by_user(db, current_user.id)
+    orders, next_cursor = await order.get_orders_by_user_async(db, current_user.id, cursor, page_size(cursor, limit))
+    set_next_cursor(response, next_cursor)
+    return orders
 
 @router.get("/event/{event_id}", response_model=list[order_schema.Order])
-def get_orders_by_event(event_id: int,
+async def get_orders_by_event(event_id: int,
+                        response: Response,
+                        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size , every row when neither cursor nor limit is passed"),
                         current_user: user_schema.User = Depends(auth.get_current_user),
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_async_read_db)):
     
     if not current_user.is_admin:
         # Regular users can only see their own orders for an event
-        return order.get_orders_by_user_and_event(db, current_user.id, event_id)
+        orders, next_cursor = await order.get_orders_by_user_and_event_async(db, current_user.id, event_id, cursor, page_size(cursor, limit))
     else:
         # Admins can see all orders for an event
-        return order.get_orders_by_event(db, event_id)
+        orders, next_cursor = await order.get_orders_by_event_async(db, event_id, cursor, page_size(cursor, limit))
+    
+    set_next_cursor(response, next_cursor)
+    return orders
 
 
 @router.put("/{order_id}", response_model=order_schema.Order)
@@ -119,7 +134,7 @@ def update_order(order_id: int,
         )
     
     # Prevent updating completed or cancelled orders
-    if db_order.status in [order_schema.order_enums.OrderStatus.COMPLETELY_FILLED, 
+    if db_order.status in [order_schema.order_enums.OrderStatus.COMPLETELYFILLED, 
                           order_schema.order_enums.OrderStatus.CANCELLED]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -201,7 +216,7 @@ def cancel_order(order_id: int,
         )
     
     # Can only cancel incomplete or partially filled orders
-    if db_order.status in [order_schema.order_enums.OrderStatus.COMPLETELY_FILLED, 
+    if db_order.status in [order_schema.order_enums.OrderStatus.COMPLETELYFILLED, 
                           order_schema.order_enums.OrderStatus.CANCELLED]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -219,7 +234,7 @@ def cancel_order(order_id: int,
     return {"message": "Order cancelled successfully"}
 
 @router.get("/summary/user", response_model=order_schema.OrderSummary)
-def get_user_order_summary(current_user: user_schema.User = Depends(auth.get_current_user),
-                           db: Session = Depends(get_db)):
+async def get_user_order_summary(current_user: user_schema.User = Depends(auth.get_current_user),
+                           db: AsyncSession = Depends(get_async_read_db)):
     
-    return order.get_user_order_summary(db, current_user.id)
\ No newline at end of file
+    return await order.get_user_order_summary_async(db, current_user.id)
\ No newline at end of file
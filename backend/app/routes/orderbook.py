@@ -1,27 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Request, Response, Query, Header
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Set, Optional
+from collections import deque
 import json
 import asyncio
+import os
+import time
 from datetime import datetime
 
 from ..schemas import user_schema
 from ..service import auth, orderbook
-from ..database import get_db
+from ..service.broadcast import dispatcher
+from ..service.outbox import relay
 
 router = APIRouter(prefix="/orderbook")
 
+# seconds between two server pings to the same connection
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "15"))
+# seconds without any client message before a connection is reaped , clients answer
+# every {"type": "ping"} with {"type": "pong"} to stay connected while only listening
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "45"))
+# seconds a heartbeat ping may take to send , a client not reading its socket is reaped
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# slots of the heartbeat wheel , one slot is visited per tick
+WS_WHEEL_SLOTS = int(os.getenv("WS_WHEEL_SLOTS", "30"))
+# connections accepted per event and per manager
+WS_MAX_CONNECTIONS_PER_EVENT = int(os.getenv("WS_MAX_CONNECTIONS_PER_EVENT", "1000"))
+# feed messages kept per event for Last-Event-ID resume of the SSE stream
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", "1000"))
+# messages an SSE subscriber may lag behind before it is dropped
+SSE_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_SUBSCRIBER_QUEUE_SIZE", "256"))
+# seconds of silence before an SSE keepalive comment is sent
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
 # Store active WebSocket connections
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, name: str = "orderbook"):
+        self.name = name
         # event_id -> list of websocket connections
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        # websocket -> (event_id , monotonic time of its last message)
+        self.last_seen: Dict[WebSocket, tuple] = {}
+        # timer wheel , every connection sits in one slot and is visited once per heartbeat interval
+        self.wheel: List[Set[WebSocket]] = [set() for _ in range(WS_WHEEL_SLOTS)]
+        self.wheel_position = 0
+        self.heartbeat_task: asyncio.Task = None
+        self.stats = {
+            "reaped": 0,
+            "send_failures": 0,
+            "rejected": 0,
+            "pings_sent": 0
+        }
         
-    async def connect(self, websocket: WebSocket, event_id: int):
+    async def connect(self, websocket: WebSocket, event_id: int) -> bool:
+        """Accept a connection , returns False if the event is already at its connection limit"""
         await websocket.accept()
+
+        if len(self.active_connections.get(event_id, [])) >= WS_MAX_CONNECTIONS_PER_EVENT:
+            self.stats["rejected"] += 1
+            await websocket.close(code=1013, reason="Too many connections for this event")
+            return False
+
         if event_id not in self.active_connections:
             self.active_connections[event_id] = []
         self.active_connections[event_id].append(websocket)
+
+        # the slot just behind the cursor is the last one visited , pinged a full interval from now
+        self.last_seen[websocket] = (event_id, time.monotonic())
+        self.wheel[(self.wheel_position - 1) % WS_WHEEL_SLOTS].add(websocket)
+
+        self.ensure_heartbeat()
+        return True
         
     def disconnect(self, websocket: WebSocket, event_id: int):
         if event_id in self.active_connections:
@@ -29,6 +78,92 @@ class ConnectionManager:
                 self.active_connections[event_id].remove(websocket)
             if not self.active_connections[event_id]:
                 del self.active_connections[event_id]
+        self._forget(websocket)
+
+    def touch(self, websocket: WebSocket):
+        """Record that a client message arrived on this connection"""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = (self.last_seen[websocket][0], time.monotonic())
+
+    def ensure_heartbeat(self):
+        """Start the heartbeat loop on the running event loop if it is not already running"""
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        tick = WS_HEARTBEAT_INTERVAL / WS_WHEEL_SLOTS
+        while self.last_seen:
+            await asyncio.sleep(tick)
+            try:
+                await self._heartbeat_tick()
+            except Exception as e:
+                print(f"Error in {self.name} heartbeat: {e}")
+
+    async def _heartbeat_tick(self):
+        """Ping the connections of the current slot and reap the ones that stopped answering"""
+        slot = self.wheel[self.wheel_position]
+        self.wheel_position = (self.wheel_position + 1) % WS_WHEEL_SLOTS
+
+        now = time.monotonic()
+        to_ping = []
+        to_reap = []
+        for websocket in slot:
+            event_id, last_seen = self.last_seen[websocket]
+            if now - last_seen > WS_IDLE_TIMEOUT:
+                to_reap.append((websocket, event_id))
+            else:
+                to_ping.append((websocket, event_id))
+
+        if to_ping:
+            ping = json.dumps({
+                "type": "ping",
+                "timestamp": datetime.now().isoformat()
+            })
+            # a full socket buffer would hold the whole tick , and every slot behind it
+            results = await asyncio.gather(
+                *[asyncio.wait_for(websocket.send_text(ping), WS_SEND_TIMEOUT) for websocket, _ in to_ping],
+                return_exceptions=True
+            )
+            self.stats["pings_sent"] += len(to_ping)
+            for (websocket, event_id), result in zip(to_ping, results):
+                if isinstance(result, Exception):
+                    self.stats["send_failures"] += 1
+                    to_reap.append((websocket, event_id))
+
+        if to_reap:
+            await self.reap(to_reap)
+
+    async def reap(self, connections: List[tuple]):
+        """Drop many (websocket , event_id) pairs at once and close them in the background"""
+        for websocket, event_id in connections:
+            self.disconnect(websocket, event_id)
+        self.stats["reaped"] += len(connections)
+
+        await asyncio.gather(
+            *[self._close_quietly(websocket, 1001, "Heartbeat timeout") for websocket, _ in connections],
+            return_exceptions=True
+        )
+
+    async def _close_quietly(self, websocket: WebSocket, code: int, reason: str):
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), timeout=1)
+        except Exception:
+            pass
+
+    def _forget(self, websocket: WebSocket):
+        if self.last_seen.pop(websocket, None) is not None:
+            for slot in self.wheel:
+                slot.discard(websocket)
+
+    def connection_stats(self) -> Dict:
+        """Connection counts per event and reap counters , used for monitoring"""
+        return {
+            "connections": sum(len(connections) for connections in self.active_connections.values()),
+            "connections_per_event": {
+                event_id: len(connections) for event_id, connections in self.active_connections.items()
+            },
+            **self.stats
+        }
                 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         try:
@@ -46,8 +181,9 @@ class ConnectionManager:
                     connections_to_remove.append(connection)
             
             # Remove dead connections
-            for connection in connections_to_remove:
-                self.disconnect(connection, event_id)
+            if connections_to_remove:
+                self.stats["send_failures"] += len(connections_to_remove)
+                await self.reap([(connection, event_id) for connection in connections_to_remove])
 
     async def close_event_connections(self, event_id: int, reason: str = "Event completed"):
         """
@@ -75,17 +211,24 @@ class ConnectionManager:
                     
             # Clear the connections list for this event
             del self.active_connections[event_id]
+            for connection in connections_to_close:
+                self._forget(connection)
             
-    async def close_all_connections(self, reason: str = "System shutdown"):
+    async def close_all_connections(self, reason: str = "System shutdown", code: int = 1000,
+                                    reconnect_after_ms: Optional[int] = None):
         """
         Close all active connections across all events
+        With reconnect_after_ms clients are told to come back , to another worker
         """
         # Send final message to all connections
-        final_message = json.dumps({
+        message = {
             "type": "system_shutdown",
             "reason": reason,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        if reconnect_after_ms is not None:
+            message["reconnect_after_ms"] = reconnect_after_ms
+        final_message = json.dumps(message)
         
         all_connections = []
         for event_id, connections in self.active_connections.items():
@@ -96,31 +239,152 @@ class ConnectionManager:
                 # Send final message
                 await connection.send_text(final_message)
                 # Close the connection
-                await connection.close()
+                await connection.close(code=code, reason=reason)
             except:
                 pass
                 
         # Clear all connections
         self.active_connections.clear()
+        self.last_seen.clear()
+        for slot in self.wheel:
+            slot.clear()
+
+class MarketFeed:
+    """
+    Sequenced per event history of the feed messages (updates and trades)
+    Keeps the last SSE_BUFFER_SIZE messages in a ring buffer for Last-Event-ID
+    resume and fans new messages out to SSE subscribers.
+    Sequence numbers are per worker , resume needs the same worker (sticky sessions).
+    """
+
+    def __init__(self):
+        # event_id -> last sequence number handed out
+        self.sequences: Dict[int, int] = {}
+        # event_id -> ring of (seq , type , json message)
+        self.buffers: Dict[int, deque] = {}
+        # event_id -> queues of the connected SSE streams
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.stats = {
+            "published": 0,
+            "dropped_subscribers": 0
+        }
+
+    def publish(self, event_id: int, message: Dict) -> str:
+        """Number a feed message , buffer it and push it to SSE subscribers. Returns the json"""
+        seq = self.sequences.get(event_id, 0) + 1
+        self.sequences[event_id] = seq
+
+        message["seq"] = seq
+        data = json.dumps(message)
+        entry = (seq, message["type"], data)
+
+        if event_id not in self.buffers:
+            self.buffers[event_id] = deque(maxlen=SSE_BUFFER_SIZE)
+        self.buffers[event_id].append(entry)
+        self.stats["published"] += 1
 
-manager = ConnectionManager()
+        for subscriber in list(self.subscribers.get(event_id, [])):
+            try:
+                subscriber.put_nowait(entry)
+            except asyncio.QueueFull:
+                # too slow , it resumes from the buffer after reconnecting
+                self.unsubscribe(event_id, subscriber)
+                self.stats["dropped_subscribers"] += 1
+                self._end(subscriber)
+
+        return data
+
+    def last_seq(self, event_id: int) -> int:
+        return self.sequences.get(event_id, 0)
+
+    def replay_since(self, event_id: int, last_seq: int) -> Optional[List[tuple]]:
+        """Buffered messages after last_seq , None if some of them already left the ring"""
+        buffer = self.buffers.get(event_id)
+        if not buffer:
+            return [] if last_seq == self.last_seq(event_id) else None
+
+        if buffer[0][0] > last_seq + 1:
+            return None
+
+        return [entry for entry in buffer if entry[0] > last_seq]
+
+    def subscribe(self, event_id: int) -> asyncio.Queue:
+        subscriber = asyncio.Queue(maxsize=SSE_SUBSCRIBER_QUEUE_SIZE)
+        if event_id not in self.subscribers:
+            self.subscribers[event_id] = set()
+        self.subscribers[event_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, event_id: int, subscriber: asyncio.Queue):
+        if event_id in self.subscribers:
+            self.subscribers[event_id].discard(subscriber)
+            if not self.subscribers[event_id]:
+                del self.subscribers[event_id]
+
+    def close_event(self, event_id: int, final_message: str):
+        """End every SSE stream of an event and forget its history"""
+        for subscriber in list(self.subscribers.get(event_id, [])):
+            self._end(subscriber, (self.last_seq(event_id), "event_closed", final_message))
+        self.subscribers.pop(event_id, None)
+        self.buffers.pop(event_id, None)
+
+    def close_all(self, final_message: str):
+        for event_id in list(self.subscribers.keys()):
+            for subscriber in list(self.subscribers.get(event_id, [])):
+                self._end(subscriber, (self.last_seq(event_id), "system_shutdown", final_message))
+        self.subscribers.clear()
+
+    def _end(self, subscriber: asyncio.Queue, final_entry: tuple = None):
+        """Replace whatever a subscriber has pending with an optional last message and the end marker"""
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        if final_entry is not None:
+            subscriber.put_nowait(final_entry)
+        subscriber.put_nowait(None)
+
+    def feed_stats(self) -> Dict:
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in self.subscribers.values()),
+            "buffered_events": len(self.buffers),
+            **self.stats
+        }
+
+def _format_sse(seq: int, event_type: str, data: str) -> str:
+    return f"id: {seq}\nevent: {event_type}\ndata: {data}\n\n"
+
+manager = ConnectionManager("orderbook")
+# subscribers of the top of book channel only
+bbo_manager = ConnectionManager("bbo")
+# snapshot + delta and trade history shared by the websocket and SSE feeds
+market_feed = MarketFeed()
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against the current etag of a book"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
 
 @router.websocket("/live/{event_id}")
-async def websocket_orderbook(websocket: WebSocket, 
-                            event_id: int,
-                            db: Session = Depends(get_db)):
+async def websocket_orderbook(websocket: WebSocket, event_id: int):
     """
     WebSocket endpoint for live orderbook data for a specific event
+    The server sends {"type": "ping"} every WS_HEARTBEAT_INTERVAL , the client answers
+    {"type": "pong"}. Any client message counts as alive , a connection silent for
+    WS_IDLE_TIMEOUT is closed with 1001
     """
-    await manager.connect(websocket, event_id)
+    if not await manager.connect(websocket, event_id):
+        return
     
     try:
         # Send initial orderbook data
-        initial_data = orderbook.get_orderbook_snapshot(event_id, db)
+        initial_data = await asyncio.to_thread(orderbook.get_cached_orderbook, event_id)
         await websocket.send_text(json.dumps({
             "type": "snapshot",
             "event_id": event_id,
-            "data": initial_data,
+            "version": initial_data["version"],
+            "data": initial_data["data"],
             "timestamp": datetime.now().isoformat()
         }))
         
@@ -129,20 +393,25 @@ async def websocket_orderbook(websocket: WebSocket,
             try:
                 # Wait for any message from client (like ping/pong)
                 data = await websocket.receive_text()
+                manager.touch(websocket)
                 message = json.loads(data)
                 
-                if message.get("type") == "ping":
+                if message.get("type") == "pong":
+                    # answer to a heartbeat ping , touching the connection was all it takes
+                    continue
+                elif message.get("type") == "ping":
                     await websocket.send_text(json.dumps({
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
                     }))
                 elif message.get("type") == "refresh":
                     # Send fresh orderbook data
-                    fresh_data = orderbook.get_orderbook_snapshot(event_id, db)
+                    fresh_data = await asyncio.to_thread(orderbook.get_cached_orderbook, event_id)
                     await websocket.send_text(json.dumps({
                         "type": "snapshot",
                         "event_id": event_id,
-                        "data": fresh_data,
+                        "version": fresh_data["version"],
+                        "data": fresh_data["data"],
                         "timestamp": datetime.now().isoformat()
                     }))
                     
@@ -157,62 +426,264 @@ async def websocket_orderbook(websocket: WebSocket,
     finally:
         manager.disconnect(websocket, event_id)
 
-@router.get("/{event_id}/snapshot")
-async def get_orderbook_snapshot(event_id: int,
-                               current_user: user_schema.User = Depends(auth.get_current_user),
-                               db: Session = Depends(get_db)):
+@router.websocket("/live/{event_id}/bbo")
+async def websocket_bbo(websocket: WebSocket, event_id: int):
     """
-    REST endpoint to get current orderbook snapshot for an event
+    WebSocket endpoint streaming only best bid , best ask and last traded price
+    A message is sent only when the top of book of the event changes
+    Same heartbeat as /live/{event_id} , answer every ping with {"type": "pong"}
     """
+    if not await bbo_manager.connect(websocket, event_id):
+        return
+    
     try:
-        orderbook_data = orderbook.get_orderbook_snapshot(event_id, db)
-        return {
+        await websocket.send_text(json.dumps({
+            "type": "bbo",
             "event_id": event_id,
-            "data": orderbook_data,
+            "data": await asyncio.to_thread(orderbook.get_bbo, event_id),
             "timestamp": datetime.now().isoformat()
+        }))
+        
+        while True:
+            try:
+                data = await websocket.receive_text()
+                bbo_manager.touch(websocket)
+                message = json.loads(data)
+                
+                # a pong only needed the touch above
+                if message.get("type") == "ping":
+                    await websocket.send_text(json.dumps({
+                        "type": "pong",
+                        "timestamp": datetime.now().isoformat()
+                    }))
+                    
+            except WebSocketDisconnect:
+                break
+            except Exception as e:
+                print(f"Error in bbo websocket: {e}")
+                break
+                
+    except WebSocketDisconnect:
+        pass
+    finally:
+        bbo_manager.disconnect(websocket, event_id)
+
+@router.get("/connections/stats")
+async def get_connection_stats(current_user: user_schema.User = Depends(auth.get_current_user)):
+    """
+    Live connection counts and heartbeat reap counters of the websocket feeds
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can view connection stats"
+        )
+
+    return {
+        "orderbook": manager.connection_stats(),
+        "bbo": bbo_manager.connection_stats(),
+        "sse": market_feed.feed_stats(),
+        "dispatcher": dispatcher.dispatcher_stats(),
+        "outbox": relay.relay_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/{event_id}/bbo")
+async def get_orderbook_bbo(event_id: int,
+                          current_user: user_schema.User = Depends(auth.get_current_user)):
+    """
+    REST endpoint to get best bid , best ask and last traded price for an event
+    """
+    try:
+        bbo = await asyncio.to_thread(orderbook.get_bbo, event_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching top of book: {str(e)}"
+        )
+
+    return {
+        "event_id": event_id,
+        "data": bbo,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/{event_id}/stream")
+async def stream_orderbook(event_id: int,
+                         request: Request,
+                         last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events feed with the same update and trade messages as the websocket
+    Starts with a snapshot , or replays what was missed when Last-Event-ID is still buffered
+    """
+    # imported here , lifecycle imports the event service which imports this module
+    from ..service.lifecycle import readiness, DRAIN_RETRY_AFTER
+
+    # feeds were closed when the drain began , a new one would hold shutdown open
+    if readiness.draining:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is restarting , reconnect",
+            headers={"Retry-After": str(DRAIN_RETRY_AFTER)}
+        )
+
+    subscriber = market_feed.subscribe(event_id)
+
+    replay = None
+    if last_event_id is not None and last_event_id.isdigit():
+        replay = market_feed.replay_since(event_id, int(last_event_id))
+
+    async def event_stream():
+        try:
+            last_sent = 0
+
+            if replay is None:
+                # the snapshot covers everything published up to now
+                last_sent = market_feed.last_seq(event_id)
+                cached = await asyncio.to_thread(orderbook.get_cached_orderbook, event_id)
+                yield _format_sse(last_sent, "snapshot", json.dumps({
+                    "type": "snapshot",
+                    "event_id": event_id,
+                    "version": cached["version"],
+                    "data": cached["data"],
+                    "seq": last_sent,
+                    "timestamp": datetime.now().isoformat()
+                }))
+            else:
+                for seq, event_type, data in replay:
+                    yield _format_sse(seq, event_type, data)
+                    last_sent = seq
+
+            while True:
+                try:
+                    entry = await asyncio.wait_for(subscriber.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if readiness.draining or await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+
+                # stream ended by the feed
+                if entry is None:
+                    break
+
+                seq, event_type, data = entry
+                if seq <= last_sent and event_type not in ("event_closed", "system_shutdown"):
+                    continue
+
+                yield _format_sse(seq, event_type, data)
+                last_sent = seq
+        finally:
+            market_feed.unsubscribe(event_id, subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
         }
+    )
+
+@router.get("/{event_id}/snapshot")
+async def get_orderbook_snapshot(event_id: int,
+                               request: Request,
+                               response: Response,
+                               current_user: user_schema.User = Depends(auth.get_current_user)):
+    """
+    REST endpoint to get current orderbook snapshot for an event
+    Supports If-None-Match , answers 304 while the book version is unchanged
+    """
+    try:
+        cached = await asyncio.to_thread(orderbook.get_cached_orderbook, event_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching orderbook: {str(e)}"
         )
 
+    if _etag_matches(request.headers.get("if-none-match"), cached["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": cached["etag"]})
+
+    response.headers["ETag"] = cached["etag"]
+    return {
+        "event_id": event_id,
+        "version": cached["version"],
+        "data": cached["data"],
+        "timestamp": datetime.now().isoformat()
+    }
+
 @router.get("/{event_id}/depth")
 async def get_orderbook_depth(event_id: int,
-                            depth: int = 10,
-                            current_user: user_schema.User = Depends(auth.get_current_user),
-                            db: Session = Depends(get_db)):
+                            request: Request,
+                            response: Response,
+                            depth: int = Query(10, ge=1),
+                            current_user: user_schema.User = Depends(auth.get_current_user)):
     """
     REST endpoint to get orderbook depth (top N levels) for an event
+    Served from the same cached snapshot , shares its etag
     """
     try:
-        orderbook_data = orderbook.get_orderbook_depth(event_id, depth, db)
-        return {
-            "event_id": event_id,
-            "depth": depth,
-            "data": orderbook_data,
-            "timestamp": datetime.now().isoformat()
-        }
+        cached, orderbook_data = await asyncio.to_thread(orderbook.get_cached_orderbook_depth, event_id, depth)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching orderbook depth: {str(e)}"
         )
 
+    if _etag_matches(request.headers.get("if-none-match"), cached["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": cached["etag"]})
+
+    response.headers["ETag"] = cached["etag"]
+    return {
+        "event_id": event_id,
+        "depth": depth,
+        "version": cached["version"],
+        "data": orderbook_data,
+        "timestamp": datetime.now().isoformat()
+    }
+
 # Function to broadcast orderbook updates (call this after order execution)
-async def broadcast_orderbook_update(event_id: int, update_data: dict):
+async def broadcast_orderbook_update(event_id: int, update_data: dict, version: int = None):
     """
     Function to broadcast orderbook updates to all connected clients
     Call this function after order execution/modification
     """
-    message = json.dumps({
+    message = market_feed.publish(event_id, {
         "type": "update",
         "event_id": event_id,
+        "version": version,
         "data": update_data,
         "timestamp": datetime.now().isoformat()
     })
     await manager.broadcast_to_event(message, event_id)
 
+# Function to broadcast executed trades (called by the engine after every fill)
+async def broadcast_trade_update(event_id: int, trade: dict):
+    """
+    Function to broadcast an executed trade to websocket and SSE subscribers
+    """
+    message = market_feed.publish(event_id, {
+        "type": "trade",
+        "event_id": event_id,
+        "data": trade,
+        "timestamp": datetime.now().isoformat()
+    })
+    await manager.broadcast_to_event(message, event_id)
+
+# Function to broadcast top of book changes (called by the engine only when it moved)
+async def broadcast_bbo_update(event_id: int, bbo: dict):
+    """
+    Function to broadcast best bid / best ask / last price to BBO subscribers
+    """
+    message = json.dumps({
+        "type": "bbo",
+        "event_id": event_id,
+        "data": bbo,
+        "timestamp": datetime.now().isoformat()
+    })
+    await bbo_manager.broadcast_to_event(message, event_id)
+
 # Function to close connections for a specific event
 async def close_event_connections(event_id: int, reason: str = "Event completed"):
     """
@@ -220,11 +691,28 @@ async def close_event_connections(event_id: int, reason: str = "Event completed"
     Call this when an event is finalized/completed
     """
     await manager.close_event_connections(event_id, reason)
+    await bbo_manager.close_event_connections(event_id, reason)
+    market_feed.close_event(event_id, json.dumps({
+        "type": "event_closed",
+        "event_id": event_id,
+        "reason": reason,
+        "timestamp": datetime.now().isoformat()
+    }))
 
 # Function to close all connections (for system shutdown)
-async def close_all_connections(reason: str = "System shutdown"):
+async def close_all_connections(reason: str = "System shutdown", code: int = 1000,
+                                reconnect_after_ms: Optional[int] = None):
     """
-    Close all active WebSocket connections
+    Close all active WebSocket connections and SSE streams
     Call this during application shutdown or maintenance
     """
-    await manager.close_all_connections(reason)
\ No newline at end of file
+    await manager.close_all_connections(reason, code, reconnect_after_ms)
+    await bbo_manager.close_all_connections(reason, code, reconnect_after_ms)
+    message = {
+        "type": "system_shutdown",
+        "reason": reason,
+        "timestamp": datetime.now().isoformat()
+    }
+    if reconnect_after_ms is not None:
+        message["reconnect_after_ms"] = reconnect_after_ms
+    market_feed.close_all(json.dumps(message))
\ No newline at end of file
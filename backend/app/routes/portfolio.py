@@ -1,14 +1,18 @@
 # In your FastAPI endpoints:
 
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
 from ..schemas import portfolio_schema, user_schema
 from ..model import portfolio_model
 from ..service import auth, portfolio
-from ..database import get_db
+from ..database import get_db, get_async_db, get_async_read_db
+from ..service.pagination import set_next_cursor, page_size, MAX_PAGE_SIZE
 
 
 router = APIRouter(prefix="/portfolio")
@@ -32,22 +36,14 @@ def create_portfolio(portfolio_data: portfolio_schema.PortfolioCreate,
             detail="Portfolio entry already exists for this event and share type"
         )
     
-    db_portfolio = portfolio_model.Portfolio(
-        **portfolio_data.dict(),
-        user_id=current_user.id
-    )
-    
-    db.add(db_portfolio)
-    db.commit()
-    db.refresh(db_portfolio)
-    return db_portfolio
+    return portfolio.create_portfolio(db, portfolio_data, current_user.id)
 
 
 @router.get("/{portfolio_id}", response_model=portfolio_schema.Portfolio)
-def get_portfolio(portfolio_id: int,
+async def get_portfolio(portfolio_id: int,
                   current_user: user_schema.User = Depends(auth.get_current_user),
-                  db: Session = Depends(get_db)):
-    db_portfolio = portfolio.get_portfolio_by_id(db, portfolio_id)
+                  db: AsyncSession = Depends(get_async_read_db)):
+    db_portfolio = await portfolio.get_portfolio_by_id_async(db, portfolio_id)
     
     if not db_portfolio:
         raise HTTPException(
@@ -65,10 +61,21 @@ def get_portfolio(portfolio_id: int,
     return db_portfolio
 
 @router.get("/", response_model=list[portfolio_schema.Portfolio])
-def get_user_portfolios(current_user: user_schema.User = Depends(auth.get_current_user),
-                        db: Session = Depends(get_db)):
-    
-    return portfolio.get_portfolios_by_user(db, current_user.id)
+async def get_user_portfolios(response: Response,
+                        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size , every row when neither cursor nor limit is passed"),
+                        current_user: user_schema.User = Depends(auth.get_current_user),
+                        db: AsyncSession = Depends(get_async_db)):
+    
+    # served from the position mirror , loaded from the primary since a replica may lag
+    # behind the fills that dropped it
+    positions = await run_in_threadpool(portfolio.get_cached_positions, current_user.id)
+    if positions is None:
+        positions = await portfolio.load_positions_async(db, current_user.id)
+
+    positions, next_cursor = portfolio.page_positions(positions, cursor, page_size(cursor, limit))
+    set_next_cursor(response, next_cursor)
+    return positions
 
 
 @router.put("/{portfolio_id}", response_model=portfolio_schema.Portfolio)
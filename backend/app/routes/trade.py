@@ -1,16 +1,20 @@
 # In your FastAPI endpoints:
 
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from ..schemas import trade_schema, user_schema
 from ..model import trade_model
 from ..service import auth, trade
-from ..database import get_db
+from ..database import get_db, get_async_read_db, open_async_read_session
 from ..enums import trade_enums
+from ..service.pagination import set_next_cursor
 
 
 router = APIRouter(prefix="/trades")
@@ -36,12 +40,70 @@ def create_trade(trade_data: trade_schema.TradeCreate,
     return db_trade
 
 
+# declared before /{trade_id} , which would take "export" for an id
+@router.get("/export")
+async def export_trades(request: Request,
+                        event_id: Optional[int] = Query(None, description="Filter by event ID"),
+                        user_id: Optional[int] = Query(None, description="Filter by user ID (admin only)"),
+                        type_of_share: Optional[trade_enums.TradeShareType] = Query(None, description="Filter by share type"),
+                        start_date: Optional[datetime] = Query(None, description="Trades executed at or after"),
+                        end_date: Optional[datetime] = Query(None, description="Trades executed at or before"),
+                        format: trade_enums.ExportFormat = Query(trade_enums.ExportFormat.CSV),
+                        current_user: user_schema.User = Depends(auth.get_current_user)):
+    """
+    Stream every matching trade as CSV or NDJSON , oldest first
+    Regular users export only their own trades
+    """
+    
+    if user_id is not None and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can filter by user ID"
+        )
+    
+    if user_id is None and not current_user.is_admin:
+        user_id = current_user.id
+    
+    query_params = trade_schema.TradeHistoryQuery(
+        event_id=event_id,
+        user_id=user_id,
+        type_of_share=type_of_share,
+        start_date=start_date,
+        end_date=end_date
+    )
+    
+    async def body():
+        # the session lives as long as the stream , not the request handler
+        db = await open_async_read_session(request)
+        try:
+            async for chunk in trade.export_trades(db, query_params, format):
+                yield chunk
+        finally:
+            await db.close()
+    
+    media_type = "text/csv" if format == trade_enums.ExportFormat.CSV else "application/x-ndjson"
+    filename = f"trades-{event_id if event_id is not None else 'all'}.{format.value}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# declared before /{trade_id} too
+@router.get("/summary", response_model=trade_schema.TradeSummary)
+async def get_trade_summary(event_id: Optional[int] = Query(None, description="Filter by event ID"),
+                            current_user: user_schema.User = Depends(auth.get_current_user),
+                            db: AsyncSession = Depends(get_async_read_db)):
+    """Get trade count , volume , value and average price of all trades or of one event"""
+    
+    return await trade.get_trade_summary_async(db, event_id)
+
 @router.get("/{trade_id}", response_model=trade_schema.Trade)
-def get_trade(trade_id: int,
+async def get_trade(trade_id: int,
               current_user: user_schema.User = Depends(auth.get_current_user),
-              db: Session = Depends(get_db)):
+              db: AsyncSession = Depends(get_async_read_db)):
     
-    db_trade = trade.get_trade_by_id(db, trade_id)
+    db_trade = await trade.get_trade_by_id_async(db, trade_id)
     
     if not db_trade:
         raise HTTPException(
@@ -61,12 +123,14 @@ def get_trade(trade_id: int,
     return db_trade
 
 @router.get("/", response_model=list[trade_schema.Trade])
-def get_trades(event_id: Optional[int] = Query(None, description="Filter by event ID"),
+async def get_trades(response: Response,
+               event_id: Optional[int] = Query(None, description="Filter by event ID"),
                user_id: Optional[int] = Query(None, description="Filter by user ID (admin only)"),
                type_of_share: Optional[trade_enums.TradeShareType] = Query(None, description="Filter by share type"),
                limit: int = Query(100, ge=1, le=1000, description="Number of trades to return"),
+               cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
                current_user: user_schema.User = Depends(auth.get_current_user),
-               db: Session = Depends(get_db)):
+               db: AsyncSession = Depends(get_async_read_db)):
     """
     Get trades with optional filters
     Regular users can only see their own trades
@@ -91,32 +155,44 @@ def get_trades(event_id: Optional[int] = Query(None, description="Filter by even
         limit=limit
     )
     
-    return trade.get_trades_with_filters(db, query_params)
+    trades, next_cursor = await trade.get_trades_with_filters_async(db, query_params, cursor)
+    set_next_cursor(response, next_cursor)
+    return trades
 
 @router.get("/event/{event_id}", response_model=list[trade_schema.Trade])
-def get_trades_by_event(event_id: int,
+async def get_trades_by_event(event_id: int,
+                        response: Response,
                         limit: int = Query(100, ge=1, le=1000),
+                        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
                         current_user: user_schema.User = Depends(auth.get_current_user),
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_async_read_db)):
     """Get all trades for a specific event - public endpoint"""
     
-    return trade.get_trades_by_event(db, event_id, limit)
+    trades, next_cursor = await trade.get_trades_by_event_async(db, event_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return trades
 
 @router.get("/user/my-trades", response_model=list[trade_schema.Trade])
-def get_my_trades(event_id: Optional[int] = Query(None),
+async def get_my_trades(response: Response,
+                  event_id: Optional[int] = Query(None),
                   limit: int = Query(100, ge=1, le=1000),
+                  cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
                   current_user: user_schema.User = Depends(auth.get_current_user),
-                  db: Session = Depends(get_db)):
+                  db: AsyncSession = Depends(get_async_read_db)):
     """Get all trades for the current user"""
     
-    return trade.get_trades_by_user(db, current_user.id, event_id, limit)
+    trades, next_cursor = await trade.get_trades_by_user_async(db, current_user.id, event_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return trades
 
 @router.get("/user/{user_id}/trades", response_model=list[trade_schema.Trade])
-def get_user_trades(user_id: int,
+async def get_user_trades(user_id: int,
+                    response: Response,
                     event_id: Optional[int] = Query(None),
                     limit: int = Query(100, ge=1, le=1000),
+                    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
                     current_user: user_schema.User = Depends(auth.get_current_user),
-                    db: Session = Depends(get_db)):
+                    db: AsyncSession = Depends(get_async_read_db)):
     """Get trades for a specific user - admin only"""
     
     if not current_user.is_admin:
@@ -125,29 +201,31 @@ def get_user_trades(user_id: int,
             detail="Only admin can view other users' trades"
         )
     
-    return trade.get_trades_by_user(db, user_id, event_id, limit)
+    trades, next_cursor = await trade.get_trades_by_user_async(db, user_id, event_id, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return trades
 
 @router.get("/summary/event/{event_id}", response_model=trade_schema.EventTradeSummary)
-def get_event_trade_summary(event_id: int,
+async def get_event_trade_summary(event_id: int,
                             current_user: user_schema.User = Depends(auth.get_current_user),
-                            db: Session = Depends(get_db)):
+                            db: AsyncSession = Depends(get_async_read_db)):
     """Get trade summary for a specific event - public endpoint"""
     
-    return trade.get_event_trade_summary(db, event_id)
+    return await trade.get_event_trade_summary_async(db, event_id)
 
 @router.get("/summary/user", response_model=trade_schema.UserTradeSummary)
-def get_user_trade_summary(event_id: Optional[int] = Query(None),
+async def get_user_trade_summary(event_id: Optional[int] = Query(None),
                            current_user: user_schema.User = Depends(auth.get_current_user),
-                           db: Session = Depends(get_db)):
+                           db: AsyncSession = Depends(get_async_read_db)):
     """Get trade summary for the current user"""
     
-    return trade.get_user_trade_summary(db, current_user.id, event_id)
+    return await trade.get_user_trade_summary_async(db, current_user.id, event_id)
 
 @router.get("/summary/user/{user_id}", response_model=trade_schema.UserTradeSummary)
-def get_specific_user_trade_summary(user_id: int,
+async def get_specific_user_trade_summary(user_id: int,
                                     event_id: Optional[int] = Query(None),
                                     current_user: user_schema.User = Depends(auth.get_current_user),
-                                    db: Session = Depends(get_db)):
+                                    db: AsyncSession = Depends(get_async_read_db)):
     """Get trade summary for a specific user - admin only"""
     
     if not current_user.is_admin:
@@ -156,16 +234,28 @@ def get_specific_user_trade_summary(user_id: int,
             detail="Only admin can view other users' trade summaries"
         )
     
-    return trade.get_user_trade_summary(db, user_id, event_id)
+    return await trade.get_user_trade_summary_async(db, user_id, event_id)
 
 @router.get("/latest/event/{event_id}", response_model=list[trade_schema.Trade])
-def get_latest_trades_by_event(event_id: int,
+async def get_latest_trades_by_event(event_id: int,
                                limit: int = Query(10, ge=1, le=100),
                                current_user: user_schema.User = Depends(auth.get_current_user),
-                               db: Session = Depends(get_db)):
+                               db: AsyncSession = Depends(get_async_read_db)):
     """Get latest trades for an event - useful for price discovery"""
     
-    return trade.get_latest_trades_by_event(db, event_id, limit)
+    return await trade.get_latest_trades_by_event_async(db, event_id, limit)
+
+@router.get("/candles/{event_id}", response_model=trade_schema.CandleSeries)
+async def get_candles(event_id: int,
+                      type_of_share: trade_enums.TradeShareType = Query(trade_enums.TradeShareType.YES),
+                      interval: trade_enums.CandleInterval = Query(trade_enums.CandleInterval.ONE_MINUTE),
+                      start: Optional[int] = Query(None, description="Earliest bucket start , unix seconds"),
+                      end: Optional[int] = Query(None, description="Latest bucket start , unix seconds"),
+                      limit: int = Query(500, ge=1, le=5000, description="Number of latest buckets to return"),
+                      current_user: user_schema.User = Depends(auth.get_current_user)):
+    """OHLCV candles for charts , served from buckets the engine keeps up to date"""
+    
+    return await run_in_threadpool(trade.get_candles, event_id, type_of_share, interval, start, end, limit)
 
 @router.put("/{trade_id}", response_model=trade_schema.Trade)
 def update_trade(trade_id: int,
@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from typing import Optional
 
 from ..schemas import user_schema
 from ..service import user, auth
-from ..database import get_db
+from ..database import get_db, get_read_db
+from ..service.pagination import set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/users", tags=["Users"])
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
 @router.get("/", response_model=list[user_schema.User])
-def get_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return user.get_all_users(db, skip, limit)
+def get_all_users(response: Response,
+                  cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                  db: Session = Depends(get_read_db)):
+    users, next_cursor = user.get_all_users(db, cursor, limit)
+    set_next_cursor(response, next_cursor)
+    return users
 
 @router.get("/{user_id}", response_model=user_schema.User)
-def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
+def get_user_by_id(user_id: int, db: Session = Depends(get_read_db)):
     user = user.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -69,27 +76,27 @@ def deduct_balance(user_id: int, amount: int, db: Session = Depends(get_db)):
 
 
 @router.get("/search/", response_model=list[user_schema.User])
-def search_users(term: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def search_users(term: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     return user.search_users(db, term, skip, limit)
 
 @router.get("/admin", response_model=list[user_schema.User])
-def get_admins(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_admins(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     return user.get_users_by_admin_status(db, True, skip, limit)
 
 @router.get("/balance/above", response_model=list[user_schema.User])
-def get_users_with_high_balance(min_balance: int, db: Session = Depends(get_db)):
+def get_users_with_high_balance(min_balance: int, db: Session = Depends(get_read_db)):
     return user.get_users_with_balance_above(db, min_balance)
 
 @router.get("/balance/below", response_model=list[user_schema.User])
-def get_users_with_low_balance(max_balance: int, db: Session = Depends(get_db)):
+def get_users_with_low_balance(max_balance: int, db: Session = Depends(get_read_db)):
     return user.get_users_with_balance_below(db, max_balance)
 
 
 @router.get("/count/total")
-def total_users(db: Session = Depends(get_db)):
+def total_users(db: Session = Depends(get_read_db)):
     return {"total_users": user.get_user_count(db)}
 
 @router.get("/count/admin")
-def total_admins(db: Session = Depends(get_db)):
+def total_admins(db: Session = Depends(get_read_db)):
     return {"total_admins": user.get_admin_count(db)}
 
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from ..enums import api_key_enums
+
+class ApiKeyCreate(BaseModel):
+    name: str
+    scopes: List[api_key_enums.ApiKeyScope] = [api_key_enums.ApiKeyScope.READ]
+
+class ApiKey(BaseModel):
+    # Response schema for a key , without its secret
+    key_id: str
+    name: str
+    scopes: List[api_key_enums.ApiKeyScope]
+    created_at: Optional[datetime] = None
+    revoked_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class ApiKeyIssued(ApiKey):
+    # the secret is only ever returned here , at issue time
+    secret: str
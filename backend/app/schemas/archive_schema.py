@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class ArchivedEvent(BaseModel):
+    # Response schema for the catalog entry of an archived event
+    event_id: int
+    orders_path: str
+    trades_path: str
+    order_count: int
+    trade_count: int
+    size_bytes: int
+    archived_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
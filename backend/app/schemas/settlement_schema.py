@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+from ..enums import event_enums, settlement_enums
+
+class SettlementJob(BaseModel):
+    # Response schema for the progress of an event settlement
+    id: int
+    event_id: int
+    result: event_enums.EventResult
+    status: settlement_enums.SettlementStatus
+    total: int
+    processed: int
+    last_portfolio_id: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
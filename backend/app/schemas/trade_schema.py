@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 from ..enums import trade_enums
 
 class TradeBase(BaseModel):
@@ -10,8 +10,8 @@ class TradeBase(BaseModel):
     type_of_share: trade_enums.TradeShareType
     buyer_user_id: int
     seller_user_id: int
-    buyer_order_id:int
-    seller_order_id:int
+    buyer_order_id:Optional[int] = None
+    seller_order_id:Optional[int] = None
 
 class TradeCreate(TradeBase):
     # Used internally by the trading engine - not exposed to users directly
@@ -30,6 +30,8 @@ class TradeUpdate(BaseModel):
 
 class Trade(TradeBase):
     # Response schema - includes auto-generated fields
+    # settlement payouts of losing positions are recorded at price 0
+    price: int
     id: int
     executed_at: datetime
     
@@ -89,6 +91,22 @@ class EventTradeSummary(BaseModel):
     latest_price_no: Optional[int] = None
     price_trend: Optional[str] = None  # "up", "down", "stable"
 
+# Schema for one OHLCV bucket , time is the bucket start in unix seconds
+class Candle(BaseModel):
+    time: int
+    open: int
+    high: int
+    low: int
+    close: int
+    volume: int
+
+# Schema for the candles of an event and share type
+class CandleSeries(BaseModel):
+    event_id: int
+    type_of_share: trade_enums.TradeShareType
+    interval: trade_enums.CandleInterval
+    candles: List[Candle]
+
 # Schema for trade history query
 class TradeHistoryQuery(BaseModel):
     event_id: Optional[int] = None
@@ -0,0 +1,74 @@
+"""
+Runs the app under uvicorn with a drain on the first SIGTERM or SIGINT.
+
+    python -m app.server
+
+uvicorn closes its listeners and websockets and waits for open responses before the
+lifespan shutdown runs , an SSE stream never finishes on its own so a drain started
+there would come too late. Started with the plain uvicorn command the worker still
+drains in the lifespan shutdown , call POST /admin/drain from a preStop hook first.
+"""
+import asyncio
+import os
+import signal
+from typing import Optional
+
+import uvicorn
+
+from .service.lifecycle import readiness, drain
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+# honour X-Forwarded-For / X-Forwarded-Proto from these addresses , see RATE_LIMIT_TRUSTED_PROXIES
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    The first exit signal drains the worker and then shuts the server down , a second one
+    (or one after /admin/drain started a drain) goes straight to uvicorn
+    """
+
+    def __init__(self, config: uvicorn.Config):
+        super().__init__(config)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def serve(self, sockets=None):
+        self.loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    def handle_exit(self, sig, frame):
+        loop = self.loop
+        if readiness.drain_task is not None or self.should_exit or loop is None or loop.is_closed():
+            super().handle_exit(sig, frame)
+            return
+
+        async def drain_then_exit():
+            name = signal.Signals(sig).name
+            try:
+                await drain(f"Server restarting ({name})")
+            except Exception as e:
+                print(f"Error draining on {name}: {e}")
+            finally:
+                super(DrainingServer, self).handle_exit(sig, frame)
+
+        def start():
+            # checked again on the loop , a drain may have started since the signal
+            if readiness.drain_task is not None:
+                super(DrainingServer, self).handle_exit(sig, frame)
+                return
+            loop.create_task(drain_then_exit())
+
+        # signals may be delivered outside the loop , depending on the uvicorn version
+        loop.call_soon_threadsafe(start)
+
+
+def main():
+    config = uvicorn.Config("app.main:app", host=HOST, port=PORT, log_level=LOG_LEVEL,
+                            proxy_headers=True, forwarded_allow_ips=FORWARDED_ALLOW_IPS)
+    DrainingServer(config).run()
+
+
+if __name__ == "__main__":
+    main()
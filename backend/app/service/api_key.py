@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from fastapi import HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..enums import api_key_enums
+from ..model import api_key_model, user_model
+from ..service.redis_service import redis_client
+from ..service.user_cache import Principal
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+# fernet keys the key secrets are stored under , comma separated. The first encrypts new
+# secrets , the others only decrypt , so a key is rotated by putting a new one in front.
+# Independent of SECRET_KEY , rotating or leaking the jwt key leaves bot secrets alone
+API_KEY_ENCRYPTION_KEYS = [key.strip() for key in os.getenv("API_KEY_ENCRYPTION_KEY", "").split(",") if key.strip()]
+# seconds a signed request stays valid , its nonce is remembered for twice that
+API_KEY_MAX_SKEW = int(os.getenv("API_KEY_MAX_SKEW", "30"))
+# seconds between two checks for keys issued or revoked by other workers
+API_KEY_SYNC_INTERVAL = float(os.getenv("API_KEY_SYNC_INTERVAL", "1"))
+API_KEY_MAX_NONCE_LENGTH = 64
+
+_VERSION_KEY = "api_keys:version"
+
+# methods that only read , every other one needs the trade scope
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _get_nonce_key(key_id: str, nonce: str) -> str:
+    return f"api_nonce:{key_id}:{nonce}"
+
+
+# None when API_KEY_ENCRYPTION_KEY is unset , no key can be issued then
+_cipher = MultiFernet([Fernet(key) for key in API_KEY_ENCRYPTION_KEYS]) if API_KEY_ENCRYPTION_KEYS else None
+
+
+def derive_secret(key_id: str) -> str:
+    """Secret of a key issued before secrets were stored , derived from the server secret"""
+    return hmac.new(SECRET_KEY.encode(), f"api-key:{key_id}".encode(), hashlib.sha256).hexdigest()
+
+
+def encrypt_secret(secret: str) -> str:
+    return _cipher.encrypt(secret.encode()).decode()
+
+
+def decrypt_secret(secret_encrypted: str) -> str:
+    """Raises InvalidToken when none of the configured keys encrypted it"""
+    if _cipher is None:
+        raise InvalidToken("API_KEY_ENCRYPTION_KEY is not set")
+    return _cipher.decrypt(secret_encrypted.encode()).decode()
+
+
+def sign(secret: str, timestamp: str, nonce: str, method: str, path: str, body: bytes) -> str:
+    """
+    Signature a client sends in X-Signature , hex hmac-sha256 over timestamp , nonce ,
+    method , path with query and the sha256 of the body , one per line
+    """
+    message = "\n".join([timestamp, nonce, method.upper(), path, hashlib.sha256(body).hexdigest()])
+    return hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def _signed_path(path: str, query: str) -> str:
+    return f"{path}?{query}" if query else path
+
+
+def is_signed(key_id: Optional[str], timestamp: Optional[str], nonce: Optional[str], signature: Optional[str],
+              method: str, path: str, query: str, body: bytes) -> bool:
+    """
+    True if the request was signed with the secret of an active key , within the allowed
+    skew. Doesn't claim the nonce , for callers that only need to know who sent it
+    """
+    entry = api_keys.get(key_id) if key_id else None
+    if entry is None or not (timestamp and nonce and signature):
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > API_KEY_MAX_SKEW:
+            return False
+    except ValueError:
+        return False
+    expected = sign(entry.secret, timestamp, nonce, method, _signed_path(path, query), body)
+    return hmac.compare_digest(expected, signature)
+
+
+class ApiKeyEntry:
+    __slots__ = ("principal", "secret", "scopes")
+
+    def __init__(self, principal: Principal, secret: str, scopes: frozenset):
+        self.principal = principal
+        self.secret = secret
+        self.scopes = scopes
+
+
+class ApiKeyTable:
+    """
+    Every active key of every user in memory , so a signed request is checked without
+    the database. Issuing or revoking bumps a version in redis , workers reload on change
+    """
+
+    def __init__(self):
+        self.keys: Dict[str, ApiKeyEntry] = {}
+        self.lock = threading.Lock()
+        # redis version the table was loaded at , None before the first load
+        self.version: Optional[int] = None
+        self.synced_at = 0.0
+        self.stats = {
+            "authenticated": 0,
+            "rejected": 0,
+            "replays": 0,
+            "reloads": 0,
+            # keys without a stored secret , they still sign with the derived one until reissued
+            "legacy": 0,
+            "undecryptable": 0
+        }
+
+    def get(self, key_id: str) -> Optional[ApiKeyEntry]:
+        return self.keys.get(key_id)
+
+    def claim_sync(self) -> bool:
+        """True for the one caller that should sync now , always before the first load"""
+        now = time.monotonic()
+        with self.lock:
+            if self.version is not None and now - self.synced_at < API_KEY_SYNC_INTERVAL:
+                return False
+            self.synced_at = now
+            return True
+
+    def sync(self):
+        """Reload the table if keys changed since it was loaded"""
+        try:
+            version = int(redis_client.get(_VERSION_KEY) or 0)
+            if version != self.version:
+                self.load()
+                self.version = version
+        except Exception as e:
+            # revocations can't be seen , signed requests still need redis for their nonce
+            print(f"Error syncing api keys: {e}")
+
+    def load(self):
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(api_key_model.ApiKey, user_model.User)
+                .join(user_model.User, user_model.User.id == api_key_model.ApiKey.user_id)
+                .where(api_key_model.ApiKey.revoked_at.is_(None))
+            ).all()
+        finally:
+            db.close()
+
+        keys = {}
+        legacy = 0
+        undecryptable = 0
+        for key, user in rows:
+            if key.secret_encrypted is None:
+                secret = derive_secret(key.key_id)
+                legacy += 1
+            else:
+                try:
+                    secret = decrypt_secret(key.secret_encrypted)
+                except InvalidToken:
+                    # encrypted under a key that is no longer configured , it can't authenticate
+                    print(f"Error decrypting secret of api key {key.key_id} , check API_KEY_ENCRYPTION_KEY")
+                    undecryptable += 1
+                    continue
+
+            scopes = frozenset(key.scopes)
+            principal = Principal(user.id, user.username, user.email, bool(user.is_admin), scopes)
+            keys[key.key_id] = ApiKeyEntry(principal, secret, scopes)
+
+        # swapped whole , readers never see a half loaded table
+        self.keys = keys
+        self.stats["reloads"] += 1
+        self.stats["legacy"] = legacy
+        self.stats["undecryptable"] = undecryptable
+
+    def changed(self):
+        """Reload here now and make every other worker reload at its next sync"""
+        try:
+            redis_client.incr(_VERSION_KEY)
+        except Exception as e:
+            print(f"Error publishing api key change: {e}")
+        with self.lock:
+            self.version = None
+        self.sync()
+
+    def key_stats(self) -> Dict:
+        return {
+            "keys": len(self.keys),
+            "version": self.version,
+            **self.stats
+        }
+
+
+api_keys = ApiKeyTable()
+
+
+def _reject(detail: str, status_code: int = status.HTTP_401_UNAUTHORIZED):
+    api_keys.stats["rejected"] += 1
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+def _claim_nonce(key_id: str, nonce: str) -> bool:
+    return bool(redis_client.set(_get_nonce_key(key_id, nonce), 1, nx=True, ex=2 * API_KEY_MAX_SKEW))
+
+
+async def authenticate_request(request: Request) -> Principal:
+    """Check the api key headers and signature of a request , returns the key's principal"""
+    if api_keys.claim_sync():
+        await asyncio.to_thread(api_keys.sync)
+
+    key_id = request.headers.get("X-API-Key")
+    timestamp = request.headers.get("X-Timestamp")
+    nonce = request.headers.get("X-Nonce")
+    signature = request.headers.get("X-Signature")
+    if not (timestamp and nonce and signature) or len(nonce) > API_KEY_MAX_NONCE_LENGTH:
+        _reject("Missing or invalid signature headers")
+
+    try:
+        skew = abs(time.time() - int(timestamp))
+    except ValueError:
+        _reject("Invalid timestamp")
+    if skew > API_KEY_MAX_SKEW:
+        _reject("Request timestamp out of range")
+
+    entry = api_keys.get(key_id)
+    if entry is None:
+        _reject("Invalid API key")
+
+    body = await request.body()
+    expected = sign(entry.secret, timestamp, nonce, request.method, _signed_path(request.url.path, request.url.query), body)
+    if not hmac.compare_digest(expected, signature):
+        _reject("Invalid signature")
+
+    scope = api_key_enums.ApiKeyScope.READ if request.method in _READ_METHODS else api_key_enums.ApiKeyScope.TRADE
+    if scope.value not in entry.scopes:
+        _reject(f"API key lacks the {scope.value} scope", status.HTTP_403_FORBIDDEN)
+
+    # checked last , a forged request can't burn the nonce of a real one
+    try:
+        fresh = await asyncio.to_thread(_claim_nonce, key_id, nonce)
+    except Exception as e:
+        print(f"Error checking nonce of api key {key_id}: {e}")
+        _reject("Signature can't be verified right now", status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not fresh:
+        api_keys.stats["replays"] += 1
+        _reject("Nonce already used")
+
+    api_keys.stats["authenticated"] += 1
+    return entry.principal
+
+
+def issue_key(db: Session, user_id: int, name: str, scopes: List[api_key_enums.ApiKeyScope]):
+    """Create a key with a random secret for a user , returns (key , secret)"""
+    if _cipher is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="API keys can't be issued , API_KEY_ENCRYPTION_KEY is not set"
+        )
+
+    key_id = f"ek_{secrets.token_hex(12)}"
+    secret = secrets.token_hex(32)
+    db_key = api_key_model.ApiKey(
+        key_id=key_id,
+        user_id=user_id,
+        name=name,
+        scopes=sorted({scope.value for scope in scopes}),
+        secret_encrypted=encrypt_secret(secret)
+    )
+    db.add(db_key)
+    db.commit()
+    db.refresh(db_key)
+    api_keys.changed()
+    return db_key, secret
+
+
+def get_keys_by_user(db: Session, user_id: int):
+    return db.execute(
+        select(api_key_model.ApiKey)
+        .where(api_key_model.ApiKey.user_id == user_id)
+        .order_by(api_key_model.ApiKey.id)
+    ).scalars().all()
+
+
+def get_key(db: Session, key_id: str):
+    return db.execute(
+        select(api_key_model.ApiKey).where(api_key_model.ApiKey.key_id == key_id)
+    ).scalars().first()
+
+
+def revoke_key(db: Session, db_key):
+    """Revoke a key in every worker , revoking twice keeps the first time"""
+    if db_key.revoked_at is None:
+        db_key.revoked_at = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(db_key)
+    api_keys.changed()
+    return db_key
+
+
+def delete_keys_by_user(db: Session, user_id: int):
+    """Delete every key of a user , without committing"""
+    db.query(api_key_model.ApiKey).filter(
+        api_key_model.ApiKey.user_id == user_id
+    ).delete(synchronize_session=False)
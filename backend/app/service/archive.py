@@ -0,0 +1,273 @@
+import asyncio
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..enums import event_enums, settlement_enums
+from ..model import archived_event_model, event_model, order_model, settlement_job_model, trade_model
+from ..service.pagination import decode_cursor, encode_cursor, DEFAULT_PAGE_SIZE
+
+# directory holding one orders file and one trades file per archived event
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+# rows read from the hot tables and written per parquet row group
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50000"))
+# archive an event as soon as its settlement completes. Off by default , reads scoped to
+# one event (its orders , its trades , filtered listings and exports by event_id) fall back
+# to the archive but history across events , a user's orders and trades and their
+# summaries , only covers events still in the hot tables
+ARCHIVE_AFTER_SETTLEMENT = os.getenv("ARCHIVE_AFTER_SETTLEMENT", "false").lower() == "true"
+# rows per batch when an archived event is exported
+ARCHIVE_EXPORT_BATCH_SIZE = int(os.getenv("ARCHIVE_EXPORT_BATCH_SIZE", "5000"))
+
+# enum columns are plain strings , parquet dictionary encodes them
+ORDER_ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("user_id", pa.int64()),
+    ("event_id", pa.int64()),
+    ("total_quantity", pa.int64()),
+    ("filled_quantity", pa.int64()),
+    ("price", pa.int64()),
+    ("type_of_share", pa.string()),
+    ("side", pa.string()),
+    ("status", pa.string()),
+])
+
+TRADE_ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("event_id", pa.int64()),
+    ("price", pa.int64()),
+    ("quantity", pa.int64()),
+    ("type_of_share", pa.string()),
+    ("buyer_user_id", pa.int64()),
+    ("seller_user_id", pa.int64()),
+    ("buyer_order_id", pa.int64()),
+    ("seller_order_id", pa.int64()),
+    ("executed_at", pa.timestamp("us", tz="UTC")),
+])
+
+# same sort keys as the hot listings , so their cursors carry over to the archive
+_ORDER_PAGE_KEY = [order_model.Order.id]
+_TRADE_PAGE_KEY = [trade_model.Trade.executed_at, trade_model.Trade.id]
+
+
+def _plain(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def _utc(value: datetime) -> datetime:
+    # sqlite hands back naive utc timestamps
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _write_parquet(db: Session, table, event_id: int, schema: pa.Schema, path: str) -> int:
+    """Copy the rows of an event to a parquet file batch by batch , returns the row count"""
+    columns = [table.c[name] for name in schema.names]
+    stmt = select(*columns).where(table.c.event_id == event_id).order_by(table.c.id)
+
+    # written aside and renamed , a crash never leaves a half file under the real name
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    count = 0
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression=ARCHIVE_COMPRESSION) as writer:
+            result = db.execute(stmt.execution_options(yield_per=ARCHIVE_BATCH_SIZE))
+            for rows in result.partitions():
+                writer.write_batch(pa.RecordBatch.from_pylist(
+                    [dict(zip(schema.names, map(_plain, row))) for row in rows],
+                    schema=schema
+                ))
+                count += len(rows)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def get_archived_event(db: Session, event_id: int):
+    """Get the catalog entry of an archived event"""
+    return db.get(archived_event_model.ArchivedEvent, event_id)
+
+
+async def get_archived_event_async(db: AsyncSession, event_id: int):
+    """Get the catalog entry of an archived event"""
+    return await db.get(archived_event_model.ArchivedEvent, event_id)
+
+
+def is_archivable(db: Session, event_id: int) -> bool:
+    """Completed and fully paid out , no row of the event will change anymore"""
+    db_event = db.get(event_model.Event, event_id)
+    if db_event is None or db_event.status != event_enums.EventStatus.COMPLETED:
+        return False
+
+    job = db.execute(
+        select(settlement_job_model.SettlementJob).where(settlement_job_model.SettlementJob.event_id == event_id)
+    ).scalars().first()
+    return job is not None and job.status == settlement_enums.SettlementStatus.COMPLETED
+
+
+def archive_event(db: Session, event_id: int):
+    """
+    Move the orders and trades of a settled event out of the hot tables into parquet
+    files and record them in the catalog. Returns the catalog entry , None if the
+    event is not settled yet. Archiving twice returns the first entry
+    """
+    entry = get_archived_event(db, event_id)
+    if entry is not None:
+        return entry
+
+    if not is_archivable(db, event_id):
+        return None
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    orders_path = os.path.join(ARCHIVE_DIR, f"event_{event_id}_orders.parquet")
+    trades_path = os.path.join(ARCHIVE_DIR, f"event_{event_id}_trades.parquet")
+
+    order_count = _write_parquet(db, order_model.Order.__table__, event_id, ORDER_ARCHIVE_SCHEMA, orders_path)
+    trade_count = _write_parquet(db, trade_model.Trade.__table__, event_id, TRADE_ARCHIVE_SCHEMA, trades_path)
+
+    entry = archived_event_model.ArchivedEvent(
+        event_id=event_id,
+        orders_path=orders_path,
+        trades_path=trades_path,
+        order_count=order_count,
+        trade_count=trade_count,
+        size_bytes=os.path.getsize(orders_path) + os.path.getsize(trades_path)
+    )
+    db.add(entry)
+
+    # the catalog entry and the deletes commit together , readers see the rows in one place
+    db.execute(delete(trade_model.Trade).where(trade_model.Trade.event_id == event_id))
+    db.execute(delete(order_model.Order).where(order_model.Order.event_id == event_id))
+    try:
+        db.commit()
+    except IntegrityError:
+        # archived by another worker in the meantime
+        db.rollback()
+        return get_archived_event(db, event_id)
+
+    db.refresh(entry)
+    return entry
+
+
+def drop_archive(db: Session, event_id: int):
+    """Remove the files and the catalog entry of an event , without committing"""
+    entry = get_archived_event(db, event_id)
+    if entry is None:
+        return
+
+    for path in [entry.orders_path, entry.trades_path]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    db.delete(entry)
+
+
+def _page(table: pa.Table, sort_keys: List[Tuple[str, str]], limit: Optional[int], attributes: List[str]) -> Tuple[List[Dict], Optional[str]]:
+    if limit is None:
+        return table.sort_by(sort_keys).to_pylist(), None
+
+    rows = table.sort_by(sort_keys).slice(0, limit + 1).to_pylist()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor([rows[-1][attribute] for attribute in attributes])
+
+
+def _timestamp(value: datetime):
+    return pa.scalar(_utc(value), type=pa.timestamp("us", tz="UTC"))
+
+
+def _and(filters, condition):
+    return condition if filters is None else filters & condition
+
+
+def _trade_filters(user_id: Optional[int] = None, type_of_share: Optional[str] = None,
+                   start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    """Same filters as the hot trade listings , None when there are none"""
+    filters = None
+    if user_id is not None:
+        filters = _and(filters, (pc.field("buyer_user_id") == user_id) | (pc.field("seller_user_id") == user_id))
+    if type_of_share is not None:
+        filters = _and(filters, pc.field("type_of_share") == _plain(type_of_share))
+    if start_date is not None:
+        filters = _and(filters, pc.field("executed_at") >= _timestamp(start_date))
+    if end_date is not None:
+        filters = _and(filters, pc.field("executed_at") <= _timestamp(end_date))
+    return filters
+
+
+def read_trades_page(entry, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                     **trade_filters) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of the archived trades of an event , newest first , returns (trades , next cursor).
+    trade_filters are user_id , type_of_share , start_date and end_date
+    """
+    filters = _trade_filters(**trade_filters)
+    if cursor:
+        executed_at, trade_id = decode_cursor(cursor, _TRADE_PAGE_KEY)
+        executed_at = _timestamp(executed_at)
+        filters = _and(filters, (pc.field("executed_at") < executed_at) |
+                       ((pc.field("executed_at") == executed_at) & (pc.field("id") < trade_id)))
+
+    table = pq.read_table(entry.trades_path, filters=filters)
+    return _page(table, [("executed_at", "descending"), ("id", "descending")], limit, ["executed_at", "id"])
+
+
+def read_orders_page(entry, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                     user_id: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+    """One page of the archived orders of an event , newest first , returns (orders , next cursor)"""
+    filters = None
+    if user_id is not None:
+        filters = pc.field("user_id") == user_id
+    if cursor:
+        after = pc.field("id") < decode_cursor(cursor, _ORDER_PAGE_KEY)[0]
+        filters = after if filters is None else filters & after
+
+    table = pq.read_table(entry.orders_path, filters=filters)
+    return _page(table, [("id", "descending")], limit, ["id"])
+
+
+def iter_trade_rows(entry, columns: List[str], **trade_filters) -> Iterator[List[tuple]]:
+    """Archived trades of an event in id order , in batches of rows with the given columns"""
+    dataset = ds.dataset(entry.trades_path, format="parquet")
+    # the file was written in id order , batches come back in it
+    for batch in dataset.to_batches(columns=columns, filter=_trade_filters(**trade_filters),
+                                    batch_size=ARCHIVE_EXPORT_BATCH_SIZE):
+        if batch.num_rows:
+            yield list(zip(*[batch.column(name).to_pylist() for name in columns]))
+
+
+async def archived_trades_page_async(db: AsyncSession, event_id: int, cursor: Optional[str] = None,
+                                     limit: int = DEFAULT_PAGE_SIZE,
+                                     **trade_filters) -> Optional[Tuple[List[Dict], Optional[str]]]:
+    """Archived page of trades , None if the event is not archived"""
+    entry = await get_archived_event_async(db, event_id)
+    if entry is None:
+        return None
+
+    # file reads stay off the loop
+    return await asyncio.to_thread(read_trades_page, entry, cursor, limit, **trade_filters)
+
+
+async def archived_orders_page_async(db: AsyncSession, event_id: int, cursor: Optional[str] = None,
+                                     limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                                     user_id: Optional[int] = None) -> Optional[Tuple[List[Dict], Optional[str]]]:
+    """Archived page of orders , None if the event is not archived"""
+    entry = await get_archived_event_async(db, event_id)
+    if entry is None:
+        return None
+
+    return await asyncio.to_thread(read_orders_page, entry, cursor, limit, user_id)
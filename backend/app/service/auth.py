@@ -1,16 +1,21 @@
+import asyncio
 import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from dotenv import load_dotenv
 
 from ..schemas import user_schema
 from ..model import user_model
-from ..database import get_db
+from ..database import get_db, get_async_db, AsyncSessionLocal
+from ..service.user_cache import user_cache, Principal
+from ..service import password
+from ..service.api_key import authenticate_request
 
 load_dotenv()
 
@@ -18,21 +23,37 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# not an error on its own , the request may be signed with an api key instead
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    valid, _ = password.verify_password(plain_password, hashed_password)
+    return valid
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def get_password_hash(plain_password):
+    return password.hash_password(plain_password)
+
+async def get_password_hash_async(plain_password):
+    return await password.hash_password_async(plain_password)
 
 def get_user_by_username(db: Session, username: str):
     return db.query(user_model.User).filter(user_model.User.username == username).first()
 
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    result = await db.execute(select(user_model.User).where(user_model.User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_id_async(db: AsyncSession, user_id: int):
+    result = await db.execute(select(user_model.User).where(user_model.User.id == user_id))
+    return result.scalars().first()
+
 def get_user_by_email(db: Session, email: str):
     return db.query(user_model.User).filter(user_model.User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    result = await db.execute(select(user_model.User).where(user_model.User.email == email))
+    return result.scalars().first()
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
@@ -41,6 +62,25 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: AsyncSession, username: str, plain_password: str):
+    user = await get_user_by_username_async(db, username)
+    if not user:
+        return False
+
+    valid, new_hash = await password.verify_password_async(plain_password, user.hashed_password)
+    if not valid:
+        return False
+
+    if new_hash is not None:
+        # stored with an older cost , the login goes through even if the upgrade doesn't
+        try:
+            user.hashed_password = new_hash
+            await db.commit()
+        except Exception as e:
+            print(f"Error rehashing password of user {username}: {e}")
+            await db.rollback()
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -51,7 +91,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(request: Request, token: Optional[str] = Depends(oauth2_scheme)) -> Principal:
+    # trading bots sign their requests , checked against the in memory key table
+    if "X-API-Key" in request.headers:
+        return await authenticate_request(request)
+
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # pick up invalidations of other workers , at most once per sync interval
+    if user_cache.claim_sync():
+        await asyncio.to_thread(user_cache.sync)
+
+    # a token seen recently skips the decode and the query
+    principal = user_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -65,10 +125,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = user_schema.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user_by_username(db, username=token_data.username)
+
+    generation = user_cache.generation
+    # a connection is only checked out on a miss
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_username_async(db, username=token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+
+    principal = Principal.from_user(user)
+    user_cache.put(token, principal, generation, payload.get("exp"))
+    return principal
 
 async def get_current_active_user(current_user: user_model.User = Depends(get_current_user)):
+    return current_user
+
+async def get_session_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """The caller , only if logged in with a token , api keys can't manage keys"""
+    if current_user.scopes is not None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Requires a login token"
+        )
     return current_user
\ No newline at end of file
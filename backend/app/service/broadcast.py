@@ -0,0 +1,139 @@
+import asyncio
+import queue
+import threading
+from typing import Dict, Set
+
+
+class BroadcastDispatcher:
+    """
+    Hands engine events from any thread to the event loop that owns the websockets.
+    The matching engine runs in threadpool workers without a running loop , so it
+    only enqueues here and the loop delivers asynchronously.
+    """
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop = None
+        # (coroutine function , args) waiting to be awaited on the loop , in submission order
+        self.jobs: queue.SimpleQueue = queue.SimpleQueue()
+        # events whose book changed and is not broadcast yet , repeated changes collapse into one
+        self.dirty_books: Set[int] = set()
+        self.dirty_lock = threading.Lock()
+        self.wakeup: asyncio.Event = None
+        self.notify_pending = False
+        self.worker: asyncio.Task = None
+        self.stats = {
+            "submitted": 0,
+            "delivered": 0,
+            "failed": 0,
+            "coalesced": 0
+        }
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Bind the dispatcher to the running loop , call from a startup hook"""
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.worker = loop.create_task(self._run())
+
+        # deliver whatever the engine submitted before the loop was bound
+        self.wakeup.set()
+
+    async def stop(self):
+        """Deliver pending jobs and stop the worker"""
+        if self.worker is None:
+            return
+
+        await self.flush()
+        self.worker.cancel()
+        self.worker = None
+        self.loop = None
+
+    async def flush(self):
+        """Await every job submitted so far"""
+        await self._drain()
+
+    def submit(self, coroutine_function, *args):
+        """
+        Schedule coroutine_function(*args) on the loop. Safe to call from any thread,
+        costs one queue put and at most one loop wakeup per batch
+        """
+        self.jobs.put((coroutine_function, args))
+        self.stats["submitted"] += 1
+        self._notify()
+
+    def publish_book(self, event_id: int):
+        """Broadcast the current snapshot and top of book of an event"""
+        with self.dirty_lock:
+            if event_id in self.dirty_books:
+                self.stats["coalesced"] += 1
+                return
+            self.dirty_books.add(event_id)
+
+        self.submit(self._broadcast_book, event_id)
+
+    def publish_trade(self, event_id: int, trade: Dict):
+        """Broadcast an executed trade of an event"""
+        from ..routes.orderbook import broadcast_trade_update
+
+        self.submit(broadcast_trade_update, event_id, trade)
+
+    def dispatcher_stats(self) -> Dict:
+        return {
+            "bound": self.loop is not None,
+            "pending": self.jobs.qsize(),
+            **self.stats
+        }
+
+    async def _broadcast_book(self, event_id: int):
+        # changes from here on need a new broadcast
+        with self.dirty_lock:
+            self.dirty_books.discard(event_id)
+
+        from ..service import orderbook
+        from ..routes.orderbook import broadcast_orderbook_update, broadcast_bbo_update
+
+        # redis reads stay off the loop
+        cached = await asyncio.to_thread(orderbook.get_cached_orderbook, event_id)
+        await broadcast_orderbook_update(event_id, cached["data"], cached["version"])
+
+        bbo = await asyncio.to_thread(orderbook.refreshBbo, event_id)
+        if bbo is not None:
+            await broadcast_bbo_update(event_id, bbo)
+
+    def _notify(self):
+        if self.notify_pending:
+            return
+
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+
+        self.notify_pending = True
+        try:
+            loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # loop closed between the check and the call
+            self.notify_pending = False
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            self.notify_pending = False
+            await self._drain()
+
+    async def _drain(self):
+        while True:
+            try:
+                coroutine_function, args = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                await coroutine_function(*args)
+                self.stats["delivered"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Error delivering broadcast {getattr(coroutine_function, '__name__', coroutine_function)}: {e}")
+
+
+dispatcher = BroadcastDispatcher()
@@ -1,26 +1,47 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
 
-from ..schemas import event_schema , portfolio_schema , trade_schema , order_schema
+from ..schemas import event_schema , portfolio_schema , order_schema
 from ..model import event_model , user_model
-from ..service.trade import create_trade
-from ..service.portfolio import get_portfolios_by_event , create_portfolio
-from ..service.user import add_to_user_balance , deduct_from_user_balance
-from ..enums import portfolio_enums , event_enums , trade_enums , order_enums
-from ..service.order import cancel_order , get_active_orders_by_event , create_order
-from ..service.redis_service import removeFromMap , freeQueue
-import asyncio
+from ..service.portfolio import create_portfolio
+from ..enums import portfolio_enums , event_enums , order_enums
+from ..service.order import cancel_orders_by_event , create_order
+from ..service.redis_service import freeEvent , deleteCandles
+from ..service.orderbook import invalidateOrderbook , drop_cached_orderbook
+from ..service.broadcast import dispatcher
+from ..service.archive import drop_archive
+from ..service.pagination import paginate, page_of, DEFAULT_PAGE_SIZE
+from ..service.settlement import settle_event , start_settlement
 from ..routes import orderbook  
 
 
 def get_event_by_id(db: Session, id: int):
     return db.query(event_model.Event).filter(event_model.Event.id == id).first()
 
+async def get_event_by_id_async(db: AsyncSession, id: int):
+    result = await db.execute(select(event_model.Event).where(event_model.Event.id == id))
+    return result.scalars().first()
+
 def get_all_events(db: Session):
     events = db.query(event_model.Event).all()
     return events
 
+async def get_all_events_async(db: AsyncSession, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """One page of events in creation order , returns (events , next cursor)"""
+    stmt = paginate(select(event_model.Event), [event_model.Event.id], cursor, limit, descending=False)
+    result = await db.execute(stmt)
+    return page_of(result.scalars().all(), limit, ["id"])
+
+def get_ongoing_event_ids(db: Session) -> list[int]:
+    """Ids of the events still trading"""
+    return db.execute(
+        select(event_model.Event.id).where(event_model.Event.status == event_enums.EventStatus.ONGOING)
+    ).scalars().all()
+
 def getQueueName(id , side , type , price):
-    return str(id)+"X"+str(side)+"X"+str(type)+"X"+price
+    return str(id)+"X"+str(side)+"X"+str(type)+"X"+str(price)
 
 def update_event(db: Session, id: int, event: event_schema.EventUpdate):
     # Get the existing event
@@ -45,154 +66,54 @@ def delete_event(db: Session, id: int):
     if not db_event:
         return None
     
+    drop_archive(db, id)
     db.delete(db_event)
     db.commit()
+
+    deleteCandles(id)
     return db_event
 
 
 def event_completed(db:Session,event_id:int,event:event_schema.EventUpdate , admin_id:int):
 
-    # give money to the winners and remove trade from portfolio (add a trade object with admin)
-    remove_from_portfolio(db,event_id,event,admin_id)
+    # stop trading first : cancel all the current incompleted order's -> free memory.
+    # nothing to refund , open orders hold no balance or shares until they trade
+    order_ids = cancel_all_order(db,event_id)
 
-    # cancel all the current incompleted order's -> free memory
-    cancel_all_order(db,event_id)
+    free_all_queue(event_id , order_ids)
 
-    free_all_queue(event_id)
+    # give money to the winners (add a trade object with admin) , runs as a background job
+    return start_settlement(db , event_id , event.result , admin_id)
 
-    return True
+def free_all_queue(event_id:int , order_ids:list[int] = ()):
+    queue_names = [
+        getQueueName(event_id , side , share_type , i)
+        for i in range(1,11)
+        for side in [order_enums.OrderSide.BUY , order_enums.OrderSide.SELL]
+        for share_type in [order_enums.OrderShareType.YES , order_enums.OrderShareType.NO]
+    ]
 
-def free_all_queue(event_id:int):
-    for i in range(1,11):
-        freeQueue(getQueueName(event_id,order_enums.OrderSide.BUY,order_enums.OrderShareType.NO , i))
-        freeQueue(getQueueName(event_id,order_enums.OrderSide.BUY,order_enums.OrderShareType.YES , i))
-        freeQueue(getQueueName(event_id,order_enums.OrderSide.SELL,order_enums.OrderShareType.YES , i))
-        freeQueue(getQueueName(event_id,order_enums.OrderSide.SELL,order_enums.OrderShareType.NO , i))
+    # queues , locks and order memory of the event in one round trip
+    freeEvent(event_id , queue_names , order_ids)
 
-def cancel_all_order(db:Session , event_id:int):
-    # get all active orders
+    # the book is empty now , make sure no worker keeps serving the old snapshot
+    invalidateOrderbook(event_id)
+    drop_cached_orderbook(event_id)
 
-    orders:list[order_schema.Order]=get_active_orders_by_event(db,event_id)
+def cancel_all_order(db:Session , event_id:int) -> list[int]:
+    # one UPDATE for every open order of the event
 
-    asyncio.create_task(orderbook.close_event_connections(event_id))
+    order_ids = cancel_orders_by_event(db , event_id)
 
-    for order in orders:
-        # change status to cancel
-        cancel_order(db , order.id)
+    dispatcher.submit(orderbook.close_event_connections, event_id)
 
-        # remove from memory
-        removeFromMap(order.id)
+    return order_ids
 
 
 def remove_from_portfolio(db:Session ,event_id:int , event: event_schema.EventUpdate , admin_id:int):
 
-    # retreive all the portfolio associated with event_id
-
-    portfolios:list[portfolio_schema.Portfolio] = get_portfolios_by_event(db,event_id)
-
-    for portfolio in portfolios:
-        
-
-        if event.result == event_enums.EventResult.DRAW:
-            # add 5 to everyone
-
-            type_of_share = trade_enums.TradeShareType.YES
-
-            if portfolio.type_of_share == portfolio_enums.ShareType.NO :
-                type_of_share = trade_enums.TradeShareType.NO
-
-            # both are on same side
-            trade_data = trade_schema.TradeCreate(
-                event_id = event_id,
-                price= 5,
-                quantity =portfolio.quantity,
-                type_of_share = type_of_share,
-                buyer_user_id = admin_id,
-                seller_user_id = portfolio.user_id,
-                buyer_order_id = None,
-                seller_order_id= None
-
-            )
-
-            create_trade(db,trade_data)
-
-            # add money to user account
-
-            amount = 5 * portfolio.quantity
-            
-            # add balance to user 
-            add_to_user_balance(db , portfolio.user_id , amount)
-            # deduct from admin
-            deduct_from_user_balance(db , admin_id , amount)
-
-
-
-
-        # share and result are on the same side
-
-        elif (portfolio.type_of_share == portfolio_enums.ShareType.NO and event.result == event_enums.EventResult.NO) or (portfolio.type_of_share == portfolio_enums.ShareType.YES and event.result == event_enums.EventResult.YES):
-
-            type_of_share = trade_enums.TradeShareType.YES
-
-            if portfolio.type_of_share == portfolio_enums.ShareType.NO :
-                type_of_share = trade_enums.TradeShareType.NO
-
-
-            # both are on same side
-            trade_data = trade_schema.TradeCreate(
-                event_id = event_id,
-                price= 10,
-                quantity =portfolio.quantity,
-                type_of_share = type_of_share,
-                buyer_user_id = admin_id,
-                seller_user_id = portfolio.user_id,
-                buyer_order_id = None,
-                seller_order_id= None
-
-            )
-
-            create_trade(db,trade_data)
-
-            # add money to user account
-
-            amount = 10 * portfolio.quantity
-            
-            # add balance to user 
-            add_to_user_balance(db , portfolio.user_id , amount)
-            # deduct from admin
-            deduct_from_user_balance(db , admin_id , amount)
-
-        else:
-
-            type_of_share = trade_enums.TradeShareType.YES
-
-            if portfolio.type_of_share == portfolio_enums.ShareType.NO :
-                type_of_share = trade_enums.TradeShareType.NO
-
-
-            # both are on same side
-            trade_data = trade_schema.TradeCreate(
-                event_id = event_id,
-                price= 0,
-                quantity =portfolio.quantity,
-                type_of_share = type_of_share,
-                buyer_user_id = admin_id,
-                seller_user_id = portfolio.user_id,
-                buyer_order_id = None,
-                seller_order_id= None
-
-            )
-
-            create_trade(db,trade_data)
-
-            # add money to user account
-
-            amount = 10 * portfolio.quantity
-            
-            # add balance to admin
-            add_to_user_balance(db , admin_id , amount)
-            # deduct from user
-            deduct_from_user_balance(db , portfolio.user_id , amount)
+    # pay out every position against the admin , in bulk and chunked
+    return settle_event(db , event_id , event.result , admin_id)
 
 
 def flood_initial_shares(db:Session , event:event_schema.Event , initial_quant:int , user_id:int):
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import inspect, text
+from starlette.responses import JSONResponse
+
+from ..database import Base, SessionLocal, engine, async_engine
+from ..service import orderbook
+from ..service.api_key import api_keys
+from ..service.broadcast import dispatcher
+from ..service.event import get_ongoing_event_ids
+from ..service.outbox import relay
+from ..service.rate_limit import route_class_of
+from ..service.user_cache import user_cache
+
+# create missing tables at startup instead of refusing to start , for local setups without alembic
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() == "true"
+# order books rebuilt at the same time during warm-up
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+# seconds a draining worker waits for orders already matching
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+# seconds a client refused by a draining worker is told to wait , enough for another to take over
+DRAIN_RETRY_AFTER = int(os.getenv("DRAIN_RETRY_AFTER", "2"))
+
+
+class Readiness:
+    """Whether this worker should get traffic , with how long its cold start took"""
+
+    def __init__(self):
+        self.ready = False
+        # milliseconds spent in each startup phase
+        self.timings: Dict[str, float] = {}
+        self.cold_start_ms: Optional[float] = None
+        self.warmed_events = 0
+        # set once shutdown begins , order entry is refused from then on
+        self.draining = False
+        self.drain_task: Optional[asyncio.Task] = None
+        # order entry requests being handled , only touched on the loop
+        self.orders_in_flight = 0
+        self.orders_refused = 0
+
+    def mark_ready(self, started_at: float):
+        """started_at is the monotonic time the process began importing the app"""
+        self.cold_start_ms = round((time.monotonic() - started_at) * 1000, 1)
+        self.ready = True
+        print(f"Worker ready in {self.cold_start_ms} ms , phases {self.timings}")
+
+    def state(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "cold_start_ms": self.cold_start_ms,
+            "timings_ms": self.timings,
+            "warmed_events": self.warmed_events,
+            "draining": self.draining,
+            "orders_in_flight": self.orders_in_flight,
+            "orders_refused": self.orders_refused
+        }
+
+
+readiness = Readiness()
+
+
+async def timed(name: str, awaitable):
+    """Await a startup phase and record how long it took"""
+    started = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        readiness.timings[name] = round((time.monotonic() - started) * 1000, 1)
+
+
+def verify_schema():
+    """
+    Check that every table of the models exists , migrations own the ddl so nothing is
+    created here unless DB_CREATE_SCHEMA is set. Raises when a table is missing
+    """
+    missing = sorted(set(Base.metadata.tables) - set(inspect(engine).get_table_names()))
+    if not missing:
+        return
+
+    if DB_CREATE_SCHEMA:
+        print(f"Creating missing tables {missing}")
+        Base.metadata.create_all(bind=engine)
+        return
+
+    raise RuntimeError(f"Database schema is missing tables {missing} , run alembic upgrade head "
+                       "or start once with DB_CREATE_SCHEMA=true")
+
+
+async def _warm_database():
+    # opens the first connection of each pool , the first request doesn't pay for it
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+def _warm_orderbook(event_id: int):
+    # snapshot from the redis book , the top of book is computed if it was never stored
+    orderbook.get_cached_orderbook(event_id)
+    orderbook.get_bbo(event_id)
+
+
+async def _warm_orderbooks():
+    db = SessionLocal()
+    try:
+        event_ids = await asyncio.to_thread(get_ongoing_event_ids, db)
+    finally:
+        db.close()
+
+    semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+    async def warm(event_id: int):
+        async with semaphore:
+            try:
+                await asyncio.to_thread(_warm_orderbook, event_id)
+                readiness.warmed_events += 1
+            except Exception as e:
+                print(f"Error warming order book of event {event_id}: {e}")
+
+    await asyncio.gather(*[warm(event_id) for event_id in event_ids])
+
+
+async def _warm_quietly(name: str, awaitable):
+    # a cold cache is slower , not wrong , the worker still starts
+    try:
+        await timed(name, awaitable)
+    except Exception as e:
+        print(f"Error warming {name}: {e}")
+
+
+async def warm_up():
+    """Fill the pools and caches a first request would otherwise fill , all at once"""
+    await asyncio.gather(
+        _warm_quietly("database", _warm_database()),
+        _warm_quietly("user_cache", asyncio.to_thread(user_cache.sync)),
+        _warm_quietly("api_keys", asyncio.to_thread(api_keys.sync)),
+        _warm_quietly("orderbooks", _warm_orderbooks()),
+    )
+
+
+class DrainMiddleware:
+    """Counts order entry requests in flight , answers 503 with Retry-After once draining"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or route_class_of(scope["method"], scope["path"]) != "order":
+            await self.app(scope, receive, send)
+            return
+
+        if readiness.draining:
+            readiness.orders_refused += 1
+            response = JSONResponse(
+                {"detail": "Server is restarting , retry the order"},
+                status_code=503,
+                headers={"Retry-After": str(DRAIN_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        readiness.orders_in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            readiness.orders_in_flight -= 1
+
+
+async def _wait_for_orders(timeout: float) -> bool:
+    """Wait until no order is matching , False if some still were at the timeout"""
+    deadline = time.monotonic() + timeout
+    while readiness.orders_in_flight > 0:
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def _drain(reason: str) -> Dict:
+    from ..routes.orderbook import close_all_connections
+
+    started = time.monotonic()
+    idle = await _wait_for_orders(SHUTDOWN_DRAIN_TIMEOUT)
+    if not idle:
+        print(f"Drain timed out with {readiness.orders_in_flight} orders still matching")
+
+    # fills committed by the orders above reach clients before their feeds close
+    try:
+        await relay.relay_pending()
+    except Exception as e:
+        print(f"Error relaying outbox while draining: {e}")
+    await dispatcher.flush()
+
+    # 1012 is service restart , clients reconnect and land on another worker
+    await close_all_connections(reason, code=1012, reconnect_after_ms=DRAIN_RETRY_AFTER * 1000)
+
+    return {
+        "drained": idle,
+        "orders_in_flight": readiness.orders_in_flight,
+        "drain_ms": round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+async def drain(reason: str = "Server restarting") -> Dict:
+    """
+    Take the worker out of rotation: refuse new orders , let the ones matching finish ,
+    deliver their fills and close every feed with a reconnect hint. Safe to call twice ,
+    the second call waits for the first drain
+    """
+    readiness.ready = False
+    readiness.draining = True
+    if readiness.drain_task is None:
+        readiness.drain_task = asyncio.get_running_loop().create_task(_drain(reason))
+    return await asyncio.shield(readiness.drain_task)
@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, func, update
+from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from ..enums import order_enums
@@ -7,6 +9,11 @@ from ..model import order_model
 from ..schemas import order_schema
 from ..service.redis_service import getFromMap
 from ..service.orderbook import addOrder
+from ..service.pagination import paginate, page_of, DEFAULT_PAGE_SIZE
+from ..service import archive
+
+# newest first , the id is unique and increases with time
+ORDER_PAGE_KEY = [order_model.Order.id]
 
 
 def get_order_by_id_from_memory(order_id:int)->order_model.Order:
@@ -20,18 +27,45 @@ def get_order_by_id(db: Session, order_id: int):
         order_model.Order.id == order_id
     ).first()
 
+async def get_order_by_id_async(db: AsyncSession, order_id: int):
+    """Get order by ID"""
+    result = await db.execute(select(order_model.Order).where(
+        order_model.Order.id == order_id
+    ))
+    return result.scalars().first()
+
 def get_orders_by_user(db: Session, user_id: int):
     """Get all orders for a specific user"""
     return db.query(order_model.Order).filter(
         order_model.Order.user_id == user_id
     ).order_by(order_model.Order.id.desc()).all()
 
+async def get_orders_by_user_async(db: AsyncSession, user_id: int, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """Get one page of orders for a specific user , returns (orders , next cursor)"""
+    result = await db.execute(paginate(select(order_model.Order).where(
+        order_model.Order.user_id == user_id
+    ), ORDER_PAGE_KEY, cursor, limit))
+    return page_of(result.scalars().all(), limit, ["id"])
+
 def get_orders_by_event(db: Session, event_id: int):
     """Get all orders for a specific event"""
     return db.query(order_model.Order).filter(
         order_model.Order.event_id == event_id
     ).order_by(order_model.Order.id.desc()).all()
 
+async def get_orders_by_event_async(db: AsyncSession, event_id: int, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """Get one page of orders for a specific event , returns (orders , next cursor)"""
+    result = await db.execute(paginate(select(order_model.Order).where(
+        order_model.Order.event_id == event_id
+    ), ORDER_PAGE_KEY, cursor, limit))
+    orders, next_cursor = page_of(result.scalars().all(), limit, ["id"])
+    
+    # an archived event has no rows left in the hot table
+    if not orders:
+        return await archive.archived_orders_page_async(db, event_id, cursor, limit) or (orders, next_cursor)
+    
+    return orders, next_cursor
+
 def get_orders_by_user_and_event(db: Session, user_id: int, event_id: int):
     """Get all orders for a user in a specific event"""
     return db.query(order_model.Order).filter(
@@ -41,6 +75,21 @@ def get_orders_by_user_and_event(db: Session, user_id: int, event_id: int):
         )
     ).order_by(order_model.Order.id.desc()).all()
 
+async def get_orders_by_user_and_event_async(db: AsyncSession, user_id: int, event_id: int, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """Get one page of orders for a user in a specific event , returns (orders , next cursor)"""
+    result = await db.execute(paginate(select(order_model.Order).where(
+        and_(
+            order_model.Order.user_id == user_id,
+            order_model.Order.event_id == event_id
+        )
+    ), ORDER_PAGE_KEY, cursor, limit))
+    orders, next_cursor = page_of(result.scalars().all(), limit, ["id"])
+    
+    if not orders:
+        return await archive.archived_orders_page_async(db, event_id, cursor, limit, user_id) or (orders, next_cursor)
+    
+    return orders, next_cursor
+
 def get_active_orders_by_user(db: Session, user_id: int):
     """Get all active (incomplete/partially filled) orders for a user"""
     return db.query(order_model.Order).filter(
@@ -48,7 +97,7 @@ def get_active_orders_by_user(db: Session, user_id: int):
             order_model.Order.user_id == user_id,
             or_(
                 order_model.Order.status == order_enums.OrderStatus.INCOMPLETE,
-                order_model.Order.status == order_enums.OrderStatus.PARTIAL_FILLED
+                order_model.Order.status == order_enums.OrderStatus.PARTIALFILLED
             )
         )
     ).order_by(order_model.Order.id.desc()).all()
@@ -60,7 +109,7 @@ def get_active_orders_by_event(db: Session, event_id: int):
             order_model.Order.event_id == event_id,
             or_(
                 order_model.Order.status == order_enums.OrderStatus.INCOMPLETE,
-                order_model.Order.status == order_enums.OrderStatus.PARTIAL_FILLED
+                order_model.Order.status == order_enums.OrderStatus.PARTIALFILLED
             )
         )
     ).order_by(order_model.Order.price.desc(), order_model.Order.id.asc()).all()
@@ -86,8 +135,8 @@ def create_order(db: Session, order_data: order_schema.OrderCreate, user_id: int
 
     return db_order
 
-def update_order(db: Session, order_id: int, order_update: order_schema.OrderUpdate):
-    """Update an existing order"""
+def update_order(db: Session, order_id: int, order_update: order_schema.OrderUpdate, commit: bool = True):
+    """Update an existing order , with commit False the caller commits"""
     db_order = db.query(order_model.Order).filter(
         order_model.Order.id == order_id
     ).first()
@@ -104,6 +153,10 @@ def update_order(db: Session, order_id: int, order_update: order_schema.OrderUpd
     if 'filled_quantity' in update_data:
         db_order.status = _calculate_order_status(db_order.total_quantity, db_order.filled_quantity)
     
+    if not commit:
+        db.flush()
+        return db_order
+
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -164,6 +217,25 @@ def cancel_order(db: Session, order_id: int):
     db.refresh(db_order)
     return db_order
 
+def cancel_orders_by_event(db: Session, event_id: int) -> List[int]:
+    """Cancel every open order of an event in one statement. Returns the cancelled ids"""
+    result = db.execute(
+        update(order_model.Order)
+        .where(
+            order_model.Order.event_id == event_id,
+            order_model.Order.status.in_([
+                order_enums.OrderStatus.INCOMPLETE,
+                order_enums.OrderStatus.PARTIALFILLED
+            ])
+        )
+        .values(status=order_enums.OrderStatus.CANCELLED)
+        .returning(order_model.Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    order_ids = list(result.scalars().all())
+    db.commit()
+    return order_ids
+
 def delete_order(db: Session, order_id: int):
     """Delete an order (use with caution - usually prefer cancelling)"""
     db_order = db.query(order_model.Order).filter(
@@ -177,27 +249,39 @@ def delete_order(db: Session, order_id: int):
     db.commit()
     return db_order
 
+def _user_order_totals_stmt(user_id: int):
+    status = order_model.Order.status
+    
+    return select(
+        func.count(order_model.Order.id).label("total_orders"),
+        func.count(order_model.Order.id).filter(status.in_([
+            order_enums.OrderStatus.INCOMPLETE,
+            order_enums.OrderStatus.PARTIALFILLED
+        ])).label("active_orders"),
+        func.count(order_model.Order.id).filter(status == order_enums.OrderStatus.COMPLETELYFILLED).label("completed_orders"),
+        func.count(order_model.Order.id).filter(status == order_enums.OrderStatus.CANCELLED).label("cancelled_orders"),
+        func.coalesce(func.sum(order_model.Order.total_quantity), 0).label("total_volume")
+    ).where(order_model.Order.user_id == user_id)
+
 def get_user_order_summary(db: Session, user_id: int):
     """Get order summary statistics for a user"""
-    orders = db.query(order_model.Order).filter(
-        order_model.Order.user_id == user_id
-    ).all()
+    totals = db.execute(_user_order_totals_stmt(user_id)).one()
     
-    total_orders = len(orders)
-    active_orders = len([o for o in orders if o.status in [
-        order_enums.OrderStatus.INCOMPLETE, 
-        order_enums.OrderStatus.PARTIAL_FILLED
-    ]])
-    completed_orders = len([o for o in orders if o.status == order_enums.OrderStatus.COMPLETELY_FILLED])
-    cancelled_orders = len([o for o in orders if o.status == order_enums.OrderStatus.CANCELLED])
-    total_volume = sum([o.total_quantity for o in orders])
+    return _user_order_summary(totals)
+
+async def get_user_order_summary_async(db: AsyncSession, user_id: int):
+    """Get order summary statistics for a user"""
+    totals = (await db.execute(_user_order_totals_stmt(user_id))).one()
     
+    return _user_order_summary(totals)
+
+def _user_order_summary(totals) -> order_schema.OrderSummary:
     return order_schema.OrderSummary(
-        total_orders=total_orders,
-        active_orders=active_orders,
-        completed_orders=completed_orders,
-        cancelled_orders=cancelled_orders,
-        total_volume=total_volume
+        total_orders=totals.total_orders,
+        active_orders=totals.active_orders,
+        completed_orders=totals.completed_orders,
+        cancelled_orders=totals.cancelled_orders,
+        total_volume=totals.total_volume
     )
 
 def get_matching_orders(db: Session, event_id: int, share_type: order_enums.OrderShareType, 
@@ -212,7 +296,7 @@ def get_matching_orders(db: Session, event_id: int, share_type: order_enums.Orde
             order_model.Order.side == opposite_side,
             or_(
                 order_model.Order.status == order_enums.OrderStatus.INCOMPLETE,
-                order_model.Order.status == order_enums.OrderStatus.PARTIAL_FILLED
+                order_model.Order.status == order_enums.OrderStatus.PARTIALFILLED
             )
         )
     )
@@ -233,6 +317,6 @@ def _calculate_order_status(total_quantity: int, filled_quantity: int) -> order_
     if filled_quantity == 0:
         return order_enums.OrderStatus.INCOMPLETE
     elif filled_quantity < total_quantity:
-        return order_enums.OrderStatus.PARTIAL_FILLED
+        return order_enums.OrderStatus.PARTIALFILLED
     else:
-        return order_enums.OrderStatus.COMPLETELY_FILLED
\ No newline at end of file
+        return order_enums.OrderStatus.COMPLETELYFILLED
\ No newline at end of file
@@ -1,29 +1,38 @@
 from ..schemas import order_schema,trade_schema,user_schema,event_schema,portfolio_schema
 
-from ..service.redis_service import addLock,addToMap,getFromMap,isLocked,isQueueEmpty,peekToQueue,popToQueue,pushToQueue , removeLock , removeFromMap , updateMap
+from ..service.redis_service import addLock,addToMap,getFromMap,isLocked,isQueueEmpty,peekToQueue,popToQueue,pushToQueue , removeLock , removeFromMap , updateMap , incrBookVersion , getBookVersion , getQueueLengths , setLastTradePrice , getLastTradePrices , swapBbo , getBbo , updateCandles
 
-from fastapi import Depends
-
-from ..enums import order_enums , portfolio_enums
+from ..enums import order_enums , portfolio_enums , trade_enums , outbox_enums
 
 
 from ..service.trade import create_trade
 
-from ..service.portfolio import create_portfolio , update_portfolio_quantity , get_portfolio_by_user_event_share
+from ..service.portfolio import apply_position_deltas
 
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import SessionLocal
 
 from ..service.user import add_to_user_balance , deduct_from_user_balance
 
-import asyncio
+from ..service.outbox import record
+
+import json
+import threading
+import time
 
 
 from typing import Dict, List, Optional
 
+# number of price levels on each side of the book
+PRICE_LEVELS = 10
+
+# event_id -> {"version", "etag", "data", "depth"} , rebuilt when the book version moves
+_snapshot_cache: Dict[int, Dict] = {}
+_snapshot_locks: Dict[int, threading.Lock] = {}
+
 def getQueueName(id , side , type , price):
-    return str(id)+"X"+str(side)+"X"+str(type)+"X"+price
+    return str(id)+"X"+str(side)+"X"+str(type)+"X"+str(price)
 
 
 def addOrder(order:order_schema.Order):
@@ -36,23 +45,13 @@ def addOrder(order:order_schema.Order):
     excuteOrder(order)
     
 
-    db = next(get_db())
-
     # check if order is execute whole or partial
 
     updatedOrder:order_schema.Order = getFromMap(order.id)
 
-    # Get updated orderbook data
-    update_data = get_orderbook_update_data(order.event_id, db)
-        
-    # Broadcast to all connected clients for this event
-    from ..routes.orderbook import broadcast_orderbook_update
-
-    asyncio.create_task(broadcast_orderbook_update(order.event_id, update_data))
-     
 
     if updatedOrder.filled_quantity == updatedOrder.total_quantity :
-        removeFromMap(updatedOrder.id)
+        # removes it from the map , the book message commits with the filled order
         return persistOrderInDb(updatedOrder)
          
     else:
@@ -82,12 +81,8 @@ def addOrderToQueue(order:order_schema.Order):
     
     removeLock(queueName)
 
-    db: Session = Depends(get_db)
-
-    update_data = get_orderbook_update_data(order.event_id, db)
-    from ..routes.orderbook import broadcast_orderbook_update
-
-    asyncio.create_task(broadcast_orderbook_update(order.event_id, update_data))
+    # the resting order's fill state and the book message commit together
+    saveOrder(order)
 
     
     return result
@@ -95,17 +90,19 @@ def addOrderToQueue(order:order_schema.Order):
 
 def getBestQueue(price:int,side:str,type:str,event_id:int)->str:
 
+    # candidate levels best first , probed with one pipelined LLEN , the queues aren't locked yet
     if side == order_enums.OrderSide.BUY:
-        
-        for i in range(1,price+1):
-            if isQueueEmpty(getQueueName(event_id,order_enums.OrderSide.SELL,type,i)) == False:
-                return getQueueName(event_id,order_enums.OrderSide.SELL,type,i)
+        queueNames = [getQueueName(event_id,order_enums.OrderSide.SELL,type,i) for i in range(1,price+1)]
     
     elif side == order_enums.OrderSide.SELL:
+        queueNames = [getQueueName(event_id,order_enums.OrderSide.BUY,type,i) for i in range(10,price-1 ,-1)]
+
+    else:
+        return None
 
-        for i in range(10,price-1 ,-1):
-            if isQueueEmpty(getQueueName(event_id,order_enums.OrderSide.BUY,type,i)) == False:
-                return getQueueName(event_id,order_enums.OrderSide.BUY,type,i)
+    for queueName , length in zip(queueNames , getQueueLengths(queueNames)):
+        if length > 0:
+            return queueName
 
     return None
 
@@ -117,7 +114,7 @@ def excuteOrder(order:order_schema.Order):
 
         # get best queue
 
-        queueName = getBestQueue(order.price,order.side,order.type_of_share)
+        queueName = getBestQueue(order.price,order.side,order.type_of_share,order.event_id)
 
         if queueName == None:
             break
@@ -197,82 +194,67 @@ def addTrade(quant:int , price:int, order1:order_schema.Order , order2:order_sch
         event_id= order1.event_id,
         price = price,
         quantity= quant,
+        type_of_share = trade_enums.TradeShareType(order1.type_of_share.value),
         buyer_user_id = buyer_user_id,
         seller_user_id = seller_user_id,
         buyer_order_id=buyer_order_id,
         seller_order_id=seller_order_id
     )
-    db: Session = Depends(get_db)
-
-    create_trade(db , trade)
-
+    db: Session = SessionLocal()
+    try:
+        # the trade , both positions , both balances and the broadcast commit together ,
+        # the outbox relay publishes it only once all of them landed
+        record(db , order1.event_id , outbox_enums.OutboxKind.TRADE , {
+            "price": price,
+            "quantity": quant,
+            "type_of_share": _share_key(order1.type_of_share),
+            "buyer_order_id": buyer_order_id,
+            "seller_order_id": seller_order_id
+        })
 
-    # for buyer add the share to portfolio
+        create_trade(db , trade , commit=False)
 
-    typeOfShare:portfolio_enums.ShareType = None
 
-    if(order1.type_of_share == order_enums.OrderShareType.NO):
-        typeOfShare = portfolio_enums.ShareType.NO
-    elif(order1.type_of_share == order_enums.OrderShareType.YES):
-        typeOfShare = portfolio_enums.ShareType.YES
+        # for buyer add the share to portfolio
 
+        typeOfShare:portfolio_enums.ShareType = None
 
-    addToPortfolio(buyer_user_id , quant ,typeOfShare , order1.event_id )
+        if(order1.type_of_share == order_enums.OrderShareType.NO):
+            typeOfShare = portfolio_enums.ShareType.NO
+        elif(order1.type_of_share == order_enums.OrderShareType.YES):
+            typeOfShare = portfolio_enums.ShareType.YES
 
-    # for seller update share quant from portfolio
 
-    updateProtfolio(seller_user_id,quant , typeOfShare , order1.event_id)
+        # buyer gains the shares , seller gives them up , one upsert for both
+        updatePortfolios(db , buyer_user_id , seller_user_id , quant , typeOfShare , order1.event_id)
 
 
-    # update current balance from both seller and buyer
+        # update current balance from both seller and buyer
 
-    amount = quant * price
-    db: Session = Depends(get_db)
+        amount = quant * price
 
-    add_to_user_balance(db , seller_user_id , amount)
+        add_to_user_balance(db , seller_user_id , amount , commit=False)
 
-    deduct_from_user_balance(db , buyer_user_id , amount)
+        deduct_from_user_balance(db , buyer_user_id , amount , commit=False)
 
+        db.commit()
+    finally:
+        db.close()
 
-    update_data = get_orderbook_update_data(order1.event_id, db)
-    from ..routes.orderbook import broadcast_orderbook_update
+    setLastTradePrice(order1.event_id , _share_key(order1.type_of_share) , price)
 
-    asyncio.create_task(broadcast_orderbook_update(order1.event_id, update_data))
+    updateCandles(order1.event_id , trade.type_of_share.value , price , quant , time.time())
 
     
 
     return True
 
-def addToPortfolio(user_id:int , quant:int , typeOfShare:portfolio_enums.ShareType , event_id:int):
-
-    db: Session = Depends(get_db)
+def updatePortfolios(db:Session , buyer_user_id:int , seller_user_id:int , quant:int , typeOfShare:portfolio_enums.ShareType , event_id:int):
 
-    portfolio = get_portfolio_by_user_event_share(db , user_id , event_id , typeOfShare)
-
-    # if portfolio exist then add to current quant
-    if portfolio != None :
-        update_portfolio_quantity(db ,portfolio.id ,portfolio.quantity + quant)
-        
-    
-    # if adding for first time then create a portfolio entry
-    else :
-
-        portfolio:portfolio_schema.PortfolioCreate = portfolio_schema.PortfolioCreate(
-            event_id=event_id,
-            quantity=quant,
-            type_of_share=typeOfShare
-        )
-        
-
-        create_portfolio(db ,portfolio,user_id)
-
-def updateProtfolio(user_id:int, quant:int ,typeOfShare:portfolio_enums.ShareType , event_id:int ):
-
-    db: Session = Depends(get_db)
-
-    portfolio = get_portfolio_by_user_event_share(db , user_id , event_id , typeOfShare)
-
-    update_portfolio_quantity(db ,portfolio.id ,portfolio.quantity - quant)
+    apply_position_deltas(db , [
+        (buyer_user_id , event_id , typeOfShare , quant),
+        (seller_user_id , event_id , typeOfShare , -quant)
+    ] , commit=False)
             
 def persistOrderInDb(updatedOrder:order_schema.Order):
     if updatedOrder.filled_quantity == updatedOrder.total_quantity :
@@ -281,22 +263,7 @@ def persistOrderInDb(updatedOrder:order_schema.Order):
 
         if removeFromMap(updatedOrder.id) == True:
             # now change this in db
-            db: Session = Depends(get_db)
-
-            updateOrderObj:order_schema.OrderUpdate=order_schema.OrderUpdate(
-                event_id= updatedOrder.event_id,
-                total_quantity=updatedOrder.total_quantity,
-                filled_quantity=updatedOrder.filled_quantity,
-                price=updatedOrder.price,
-                type_of_share=updatedOrder.type_of_share,
-                side= updatedOrder.side,
-                status= updatedOrder.status
-            )
-
-            from ..service.order import update_order
-
-
-            update_order(db,updatedOrder.id,updateOrderObj)
+            saveOrder(updatedOrder)
         
         else:
             raise Exception("Not able to delete from memory")
@@ -311,53 +278,205 @@ def persistOrderInDb(updatedOrder:order_schema.Order):
 
 # websocket code
 
-def get_orderbook_snapshot(event_id: int, db: Session) -> Dict:
+def get_orderbook_snapshot(event_id: int, db: Session = None) -> Dict:
     """
     Get complete L2 orderbook snapshot for an event
     Returns both YES and NO orderbooks
     """
     try:
-        orderbook = {
-            "YES": {
-                "bids": [],  # Buy orders
-                "asks": []   # Sell orders
-            },
-            "NO": {
-                "bids": [],  # Buy orders  
-                "asks": []   # Sell orders
-            }
-        }
+        return _scan_orderbook(event_id)
         
+    except Exception as e:
+        print(f"Error getting orderbook snapshot: {e}")
+        return _empty_orderbook()
+
+def _empty_orderbook() -> Dict:
+    return {
+        "YES": {"bids": [], "asks": []},
+        "NO": {"bids": [], "asks": []},
+        "market_summary": {}
+    }
+
+def _scan_orderbook(event_id: int) -> Dict:
+    """Read every price level of an event from redis , raises if one can't be read"""
+    orderbook = {
         # Get orderbook for YES shares
-        yes_orderbook = _get_orderbook_for_share_type(event_id, order_enums.OrderShareType.YES)
-        orderbook["YES"] = yes_orderbook
-        
+        "YES": _get_orderbook_for_share_type(event_id, order_enums.OrderShareType.YES),
         # Get orderbook for NO shares
-        no_orderbook = _get_orderbook_for_share_type(event_id, order_enums.OrderShareType.NO)
-        orderbook["NO"] = no_orderbook
-        
-        # Add market summary
-        orderbook["market_summary"] = _get_market_summary(orderbook)
-        
-        return orderbook
+        "NO": _get_orderbook_for_share_type(event_id, order_enums.OrderShareType.NO)
+    }
+    
+    # Add market summary
+    orderbook["market_summary"] = _get_market_summary(orderbook)
+    
+    return orderbook
+
+def get_orderbook_depth(event_id: int, depth: int, db: Session = None) -> Dict:
+    """
+    Get orderbook depth (top N levels) for an event
+    Served from the cached snapshot, see get_cached_orderbook_depth
+    """
+    try:
+        return get_cached_orderbook_depth(event_id, depth)[1]
         
     except Exception as e:
-        print(f"Error getting orderbook snapshot: {e}")
+        print(f"Error getting orderbook depth: {e}")
         return {
             "YES": {"bids": [], "asks": []},
             "NO": {"bids": [], "asks": []},
             "market_summary": {}
         }
 
-def get_orderbook_depth(event_id: int, depth: int, db: Session) -> Dict:
+def invalidateOrderbook(event_id: int) -> int:
     """
-    Get orderbook depth (top N levels) for an event
+    Mark the orderbook of an event as changed
+    Bumps the book version so every worker rebuilds its cached snapshot on next read
+    """
+    return incrBookVersion(event_id)
+
+def saveOrder(updatedOrder:order_schema.Order):
+    """
+    Write the fill state of an order and a book message in one transaction
+    The cached book is invalidated first , the relay publishes once the order row is committed
     """
+    invalidateOrderbook(updatedOrder.event_id)
+
+    updateOrderObj:order_schema.OrderUpdate=order_schema.OrderUpdate(
+        event_id= updatedOrder.event_id,
+        total_quantity=updatedOrder.total_quantity,
+        filled_quantity=updatedOrder.filled_quantity,
+        price=updatedOrder.price,
+        type_of_share=updatedOrder.type_of_share,
+        side= updatedOrder.side,
+        status= updatedOrder.status
+    )
+
+    from ..service.order import update_order
+
+    db: Session = SessionLocal()
     try:
-        full_orderbook = get_orderbook_snapshot(event_id, db)
-        
-        # Limit depth
-        limited_orderbook = {
+        update_order(db , updatedOrder.id , updateOrderObj , commit=False)
+
+        record(db , updatedOrder.event_id , outbox_enums.OutboxKind.BOOK)
+
+        db.commit()
+    finally:
+        db.close()
+
+def get_bbo(event_id: int) -> Dict:
+    """
+    Get best bid , best ask and last traded price of an event
+    Served from the engine maintained top of book , computed once if the event never changed
+    """
+    bbo_data = getBbo(event_id)
+
+    if bbo_data is not None:
+        return json.loads(bbo_data)
+
+    bbo = _compute_bbo(event_id)
+    swapBbo(event_id, json.dumps(bbo))
+    return bbo
+
+def refreshBbo(event_id: int) -> Optional[Dict]:
+    """
+    Recompute the top of book of an event and store it
+    Returns the new top of book only when a best price or the last traded price moved
+    """
+    bbo = _compute_bbo(event_id)
+    bbo_data = json.dumps(bbo)
+
+    if swapBbo(event_id, bbo_data) == bbo_data:
+        return None
+
+    return bbo
+
+def _compute_bbo(event_id: int) -> Dict:
+    """
+    Find the best levels of both share types from queue lengths only
+    One pipelined round trip , no queue locks and no order lookups
+    """
+    share_types = [order_enums.OrderShareType.YES, order_enums.OrderShareType.NO]
+    prices = list(range(1, PRICE_LEVELS + 1))
+
+    queue_names = []
+    for share_type in share_types:
+        for side in [order_enums.OrderSide.BUY, order_enums.OrderSide.SELL]:
+            for price in prices:
+                queue_names.append(getQueueName(event_id, side, share_type, price))
+
+    lengths = getQueueLengths(queue_names)
+    last_trade_prices = getLastTradePrices(event_id)
+
+    bbo = {}
+    for index, share_type in enumerate(share_types):
+        offset = index * 2 * PRICE_LEVELS
+        buy_lengths = lengths[offset:offset + PRICE_LEVELS]
+        sell_lengths = lengths[offset + PRICE_LEVELS:offset + 2 * PRICE_LEVELS]
+
+        bid_prices = [price for price, length in zip(prices, buy_lengths) if length > 0]
+        ask_prices = [price for price, length in zip(prices, sell_lengths) if length > 0]
+
+        bbo[_share_key(share_type)] = {
+            "best_bid": max(bid_prices) if bid_prices else None,
+            "best_ask": min(ask_prices) if ask_prices else None,
+            "last_trade_price": last_trade_prices.get(_share_key(share_type))
+        }
+
+    return bbo
+
+def _share_key(share_type) -> str:
+    """Name used for a share type in orderbook payloads ("YES" / "NO")"""
+    if isinstance(share_type, order_enums.OrderShareType):
+        return share_type.name
+    return str(share_type).upper()
+
+def get_cached_orderbook(event_id: int) -> Dict:
+    """
+    Get the cached L2 snapshot of an event, rebuilding it if the book version moved
+    Returns {"version", "etag", "data", "depth"} , the entry must be treated as read only
+    """
+    version = getBookVersion(event_id)
+
+    cached = _snapshot_cache.get(event_id)
+    if cached is not None and cached["version"] == version:
+        return cached
+
+    # version unknown (redis error) -> serve a fresh snapshot without caching it
+    if version < 0:
+        return _build_uncached_entry(event_id)
+
+    # only one thread rebuilds a given book , the others wait and reuse its result
+    lock = _snapshot_locks.setdefault(event_id, threading.Lock())
+    with lock:
+        cached = _snapshot_cache.get(event_id)
+        if cached is not None and cached["version"] == version:
+            return cached
+
+        try:
+            cached = _build_cache_entry(event_id, version)
+        except Exception as e:
+            # a level that couldn't be read must not stay in the cache as an empty one
+            print(f"Error building orderbook snapshot of event {event_id}: {e}")
+            return _build_uncached_entry(event_id)
+        _snapshot_cache[event_id] = cached
+
+    return cached
+
+def get_cached_orderbook_depth(event_id: int, depth: int) -> tuple:
+    """
+    Get the top N levels of an event from the cached snapshot
+    Returns (cache entry, depth view) , views are built once per version and depth
+    """
+    cached = get_cached_orderbook(event_id)
+
+    # every level fits in the full snapshot
+    if depth >= PRICE_LEVELS:
+        return cached, cached["data"]
+
+    view = cached["depth"].get(depth)
+    if view is None:
+        full_orderbook = cached["data"]
+        view = {
             "YES": {
                 "bids": full_orderbook["YES"]["bids"][:depth],
                 "asks": full_orderbook["YES"]["asks"][:depth]
@@ -365,21 +484,35 @@ def get_orderbook_depth(event_id: int, depth: int, db: Session) -> Dict:
             "NO": {
                 "bids": full_orderbook["NO"]["bids"][:depth],
                 "asks": full_orderbook["NO"]["asks"][:depth]
-            }
-        }
-        
-        # Add market summary
-        limited_orderbook["market_summary"] = full_orderbook.get("market_summary", {})
-        
-        return limited_orderbook
-        
-    except Exception as e:
-        print(f"Error getting orderbook depth: {e}")
-        return {
-            "YES": {"bids": [], "asks": []},
-            "NO": {"bids": [], "asks": []},
-            "market_summary": {}
+            },
+            "market_summary": full_orderbook.get("market_summary", {})
         }
+        cached["depth"][depth] = view
+
+    return cached, view
+
+def drop_cached_orderbook(event_id: int):
+    """Forget the cached snapshot of an event (used when the event is torn down)"""
+    _snapshot_cache.pop(event_id, None)
+    _snapshot_locks.pop(event_id, None)
+
+def _build_cache_entry(event_id: int, version: int) -> Dict:
+    """Compute a snapshot and wrap it with its version and etag"""
+    return {
+        "version": version,
+        "etag": f'W/"{event_id}-{version}"',
+        "data": _scan_orderbook(event_id),
+        "depth": {}
+    }
+
+def _build_uncached_entry(event_id: int) -> Dict:
+    """Best effort snapshot with a version no request can match , never cached"""
+    return {
+        "version": -1,
+        "etag": f'W/"{event_id}--1"',
+        "data": get_orderbook_snapshot(event_id),
+        "depth": {}
+    }
 
 def _get_orderbook_for_share_type(event_id: int, share_type: str) -> Dict:
     """
@@ -388,88 +521,61 @@ def _get_orderbook_for_share_type(event_id: int, share_type: str) -> Dict:
     bids = []  # Buy orders
     asks = []  # Sell orders
     
-    try:
-        # Scan through all possible price levels (1 to 10)
-        for price in range(1, 11):
-            # Get buy orders at this price level
-            buy_queue_name = getQueueName(event_id, order_enums.OrderSide.BUY, share_type, price)
-            buy_quantity = _get_total_quantity_in_queue(buy_queue_name)
-            
-            if buy_quantity > 0:
-                bids.append({
-                    "price": price,
-                    "quantity": buy_quantity,
-                    "side": "BUY"
-                })
-            
-            # Get sell orders at this price level
-            sell_queue_name = getQueueName(event_id, order_enums.OrderSide.SELL, share_type, price)
-            sell_quantity = _get_total_quantity_in_queue(sell_queue_name)
-            
-            if sell_quantity > 0:
-                asks.append({
-                    "price": price,
-                    "quantity": sell_quantity,
-                    "side": "SELL"
-                })
-        
-        # Sort bids by price (highest first)
-        bids.sort(key=lambda x: x["price"], reverse=True)
-        
-        # Sort asks by price (lowest first)
-        asks.sort(key=lambda x: x["price"])
-        
-        return {
-            "bids": bids,
-            "asks": asks
-        }
-        
-    except Exception as e:
-        print(f"Error getting orderbook for share type {share_type}: {e}")
-        return {"bids": [], "asks": []}
+    # Scan through all possible price levels (1 to 10)
+    for price in range(1, PRICE_LEVELS + 1):
+        # Get buy orders at this price level
+        buy_queue_name = getQueueName(event_id, order_enums.OrderSide.BUY, share_type, price)
+        buy_quantity = _get_total_quantity_in_queue(buy_queue_name)
+        
+        if buy_quantity > 0:
+            bids.append({
+                "price": price,
+                "quantity": buy_quantity,
+                "side": "BUY"
+            })
+        
+        # Get sell orders at this price level
+        sell_queue_name = getQueueName(event_id, order_enums.OrderSide.SELL, share_type, price)
+        sell_quantity = _get_total_quantity_in_queue(sell_queue_name)
+        
+        if sell_quantity > 0:
+            asks.append({
+                "price": price,
+                "quantity": sell_quantity,
+                "side": "SELL"
+            })
+    
+    # Sort bids by price (highest first)
+    bids.sort(key=lambda x: x["price"], reverse=True)
+    
+    # Sort asks by price (lowest first)
+    asks.sort(key=lambda x: x["price"])
+    
+    return {
+        "bids": bids,
+        "asks": asks
+    }
 
 def _get_total_quantity_in_queue(queue_name: str) -> int:
     """
-    Get total quantity of all orders in a queue
+    Get total quantity of all orders in a queue , raises if redis can't be read.
+    No queue lock , LRANGE reads the queue atomically and a fill racing with the
+    scan bumps the book version , so the snapshot it lands in is rebuilt
     """
-    try:
-        # Try to acquire lock
-        if not addLock(queue_name):
-            return 0
-        
-        total_quantity = 0
-        
-        # Check if queue is empty
-        if isQueueEmpty(queue_name):
-            removeLock(queue_name)
-            return 0
-        
-        # Get all orders in the queue and sum their remaining quantities
-        # Note: This is a simplified approach. You might need to implement
-        # a more efficient way to get all queue items
-        
-        # For now, we'll estimate based on queue length
-        # You might want to implement a function to get all queue items
-        queue_key = f"queue:{queue_name}"
-        from redis_service import redis_client
-        
-        # Get all order IDs in the queue
-        order_ids = redis_client.lrange(queue_key, 0, -1)
-        
-        for order_id in order_ids:
-            order = getFromMap(int(order_id))
-            if order:
-                remaining_quantity = order.total_quantity - order.filled_quantity
-                total_quantity += remaining_quantity
-        
-        removeLock(queue_name)
-        return total_quantity
-        
-    except Exception as e:
-        print(f"Error getting total quantity in queue {queue_name}: {e}")
-        if queue_name in ['locks']:  # Check if we have the lock
-            removeLock(queue_name)
-        return 0
+    from ..service.redis_service import redis_client
+    
+    total_quantity = 0
+    
+    # Get all order IDs in the queue and sum their remaining quantities
+    order_ids = redis_client.lrange(f"queue:{queue_name}", 0, -1)
+    
+    for order_id in order_ids:
+        order = getFromMap(int(order_id))
+        if order:
+            remaining_quantity = order.total_quantity - order.filled_quantity
+            total_quantity += remaining_quantity
+    
+    return total_quantity
 
 def _get_market_summary(orderbook: Dict) -> Dict:
     """
@@ -526,7 +632,7 @@ def _get_market_summary(orderbook: Dict) -> Dict:
             "NO": {"best_bid": None, "best_ask": None, "bid_ask_spread": None, "total_bid_volume": 0, "total_ask_volume": 0}
         }
 
-def get_orderbook_update_data(event_id: int, db: Session) -> Dict:
+def get_orderbook_update_data(event_id: int, db: Session = None) -> Dict:
     """
     Get orderbook update data (used for broadcasting)
     This is a lighter version that only includes changed data
@@ -534,7 +640,7 @@ def get_orderbook_update_data(event_id: int, db: Session) -> Dict:
     try:
         # For now, return full snapshot
         # You can optimize this later to only return changed data
-        return get_orderbook_snapshot(event_id, db)
+        return get_cached_orderbook(event_id)["data"]
         
     except Exception as e:
         print(f"Error getting orderbook update data: {e}")
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, AsyncSessionLocal
+from ..enums import outbox_enums
+from ..model import outbox_model
+from ..service.broadcast import dispatcher
+
+# messages read from the outbox per query
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# seconds between two reads when nothing committed in this process , picks up other processes' rows
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+# a missing id may belong to a transaction still committing , it is waited for this long
+OUTBOX_GAP_TIMEOUT = float(os.getenv("OUTBOX_GAP_TIMEOUT", "2"))
+# the relay's position is stored under this name , a restarted process resumes from it ,
+# must be stable across restarts and distinct per worker (a pod or host name , plus a worker
+# slot when one host runs several)
+OUTBOX_RELAY_NAME = os.getenv("OUTBOX_RELAY_NAME") or socket.gethostname()
+# relayed messages are deleted after this many seconds , a relay down longer resumes at the oldest kept
+OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", "3600"))
+OUTBOX_CLEANUP_INTERVAL = float(os.getenv("OUTBOX_CLEANUP_INTERVAL", "60"))
+
+
+def record(db: Session, event_id: int, kind: outbox_enums.OutboxKind, payload: Optional[Dict] = None):
+    """Add a message to the outbox in the transaction of db , it is relayed once the caller commits"""
+    db.add(outbox_model.OutboxEvent(event_id=event_id, kind=kind, payload=payload))
+    db.info["outbox"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_relay(session):
+    # relay right away instead of at the next poll
+    if session.info.pop("outbox", False):
+        relay.notify()
+
+
+class OutboxRelay:
+    """
+    Tails the outbox on the event loop and publishes its messages to this process's
+    websocket and SSE subscribers , in id order. Every process runs one , so a fill
+    reaches clients connected to any worker.
+    Delivery is at least once. The position is stored under OUTBOX_RELAY_NAME after
+    every delivered batch , a process that restarts resumes from it , so a batch it
+    delivered but did not store yet goes out again. The id is the sequence number ,
+    sent as "seq" with every trade , clients drop what they already saw
+    """
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop = None
+        self.wakeup: asyncio.Event = None
+        self.notify_pending = False
+        self.worker: asyncio.Task = None
+        self.lock: asyncio.Lock = None
+        # id of the last message relayed , None until the relay starts
+        self.last_seq: Optional[int] = None
+        # monotonic time the relay started waiting on a missing id
+        self.gap_since: Optional[float] = None
+        self.last_cleanup = 0.0
+        self.stats = {
+            "relayed": 0,
+            "batches": 0,
+            "gaps_skipped": 0,
+            "failed": 0
+        }
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Bind the relay to the running loop , call from a startup hook"""
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.worker = loop.create_task(self._run())
+
+    async def stop(self):
+        """Relay what is committed and stop the worker"""
+        if self.worker is None:
+            return
+
+        try:
+            await self.relay_pending()
+        except Exception as e:
+            print(f"Error relaying outbox on shutdown: {e}")
+        self.worker.cancel()
+        self.worker = None
+        self.loop = None
+
+    def notify(self):
+        """Wake the relay , safe to call from any thread"""
+        if self.notify_pending:
+            return
+
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+
+        self.notify_pending = True
+        try:
+            loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            self.notify_pending = False
+
+    def relay_stats(self) -> Dict:
+        return {
+            "name": OUTBOX_RELAY_NAME,
+            "running": self.worker is not None,
+            "last_seq": self.last_seq,
+            "waiting_on_gap": self.gap_since is not None,
+            **self.stats
+        }
+
+    async def relay_pending(self) -> int:
+        """Publish every message committed after the last one relayed , returns how many"""
+        async with self.lock:
+            if self.last_seq is None:
+                self.last_seq = await self._load_position()
+
+            relayed = 0
+            while True:
+                rows = await self._fetch(self.last_seq)
+                batch = self._in_order(rows)
+                if not batch:
+                    return relayed
+
+                await self._deliver(batch)
+                self.last_seq = batch[-1].id
+                await self._save_position(self.last_seq)
+                relayed += len(batch)
+                self.stats["relayed"] += len(batch)
+                self.stats["batches"] += 1
+
+                if len(batch) < len(rows) or len(rows) < OUTBOX_BATCH_SIZE:
+                    return relayed
+
+    def _in_order(self, rows: List) -> List:
+        """
+        Leading rows without a hole in their ids. Ids are handed out before commit , so
+        a hole is a transaction that may still land , it is skipped only after a timeout
+        """
+        batch = []
+        expected = self.last_seq + 1
+        now = time.monotonic()
+
+        for row in rows:
+            if row.id != expected:
+                if self.gap_since is None:
+                    self.gap_since = now
+                if now - self.gap_since < OUTBOX_GAP_TIMEOUT:
+                    break
+                # rolled back , nothing will fill it
+                self.stats["gaps_skipped"] += row.id - expected
+
+            self.gap_since = None
+            batch.append(row)
+            expected = row.id + 1
+
+        return batch
+
+    async def _deliver(self, batch: List):
+        from ..routes.orderbook import broadcast_trade_update
+
+        # book messages carry no data , the snapshot is read on delivery , one per event is enough
+        books = []
+        for row in batch:
+            if row.kind == outbox_enums.OutboxKind.TRADE:
+                await broadcast_trade_update(row.event_id, {**(row.payload or {}), "seq": row.id})
+            elif row.event_id not in books:
+                books.append(row.event_id)
+
+        for event_id in books:
+            dispatcher.publish_book(event_id)
+
+    async def _load_position(self) -> int:
+        """Stored position of this relay , a relay seen for the first time starts at the tail"""
+        async with AsyncSessionLocal() as db:
+            cursor = await db.get(outbox_model.OutboxCursor, OUTBOX_RELAY_NAME)
+            if cursor is not None:
+                print(f"Outbox relay {OUTBOX_RELAY_NAME} resuming after message {cursor.last_id}")
+                return cursor.last_id
+
+            result = await db.execute(select(func.max(outbox_model.OutboxEvent.id)))
+            last_id = result.scalar() or 0
+            db.add(outbox_model.OutboxCursor(name=OUTBOX_RELAY_NAME, last_id=last_id))
+            await db.commit()
+            return last_id
+
+    async def _save_position(self, last_id: int):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(outbox_model.OutboxCursor)
+                .where(outbox_model.OutboxCursor.name == OUTBOX_RELAY_NAME)
+                .values(last_id=last_id)
+            )
+            await db.commit()
+
+    async def _fetch(self, after_id: int) -> List:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(outbox_model.OutboxEvent)
+                .where(outbox_model.OutboxEvent.id > after_id)
+                .order_by(outbox_model.OutboxEvent.id)
+                .limit(OUTBOX_BATCH_SIZE)
+            )
+            return result.scalars().all()
+
+    async def _cleanup(self):
+        now = time.monotonic()
+        if now - self.last_cleanup < OUTBOX_CLEANUP_INTERVAL:
+            return
+        self.last_cleanup = now
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=OUTBOX_RETENTION_SECONDS)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(outbox_model.OutboxEvent).where(outbox_model.OutboxEvent.created_at < cutoff)
+            )
+            await db.commit()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self.notify_pending = False
+
+            try:
+                await self.relay_pending()
+                await self._cleanup()
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Error relaying outbox: {e}")
+
+
+relay = OutboxRelay()
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# bcrypt cost factor , raising it rehashes every user at their next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# threads hashing passwords , kept apart from the request threadpool so logins can't starve it
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# hashes waiting for a worker , past that new ones are turned away
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+# seconds a turned away client is told to wait
+PASSWORD_RETRY_AFTER = int(os.getenv("PASSWORD_RETRY_AFTER", "2"))
+
+# the one context of the app , hashes of an older cost are flagged for rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small pool of its own with a bounded queue. bcrypt releases the
+    GIL , so threads hash in parallel without the cost of a process pool. Once the
+    queue is full callers get a 503 instead of piling up behind each other
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self.capacity = workers + max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            "hashed": 0,
+            "verified": 0,
+            "rehashed": 0,
+            "rejected": 0
+        }
+
+    def submit(self, fn, *args) -> Future:
+        """Queue a hash on the pool , raises 503 when the queue is full"""
+        with self.lock:
+            if self.pending >= self.capacity:
+                self.stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many logins in progress , retry shortly",
+                    headers={"Retry-After": str(PASSWORD_RETRY_AFTER)}
+                )
+            self.pending += 1
+
+        future = self.executor.submit(fn, *args)
+        # released when the hash is done , not when the caller stops waiting
+        future.add_done_callback(self._release)
+        return future
+
+    def hash_stats(self) -> Dict:
+        with self.lock:
+            return {
+                "workers": self.executor._max_workers,
+                "rounds": BCRYPT_ROUNDS,
+                "pending": self.pending,
+                "capacity": self.capacity,
+                **self.stats
+            }
+
+    def _release(self, future: Future):
+        with self.lock:
+            self.pending -= 1
+
+    def _count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _hash(self, password: str) -> str:
+        self._count("hashed")
+        return pwd_context.hash(password)
+
+    def _verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        self._count("verified")
+        valid, new_hash = pwd_context.verify_and_update(password, hashed_password)
+        if new_hash is not None:
+            self._count("rehashed")
+        return valid, new_hash
+
+
+hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_MAX_PENDING)
+
+
+def hash_password(password: str) -> str:
+    """Hash a password on the pool , blocks the calling thread"""
+    return hasher.submit(hasher._hash, password).result()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the pool"""
+    return await asyncio.wrap_future(hasher.submit(hasher._hash, password))
+
+
+def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password , returns (valid , new hash if the stored one should be replaced)"""
+    return hasher.submit(hasher._verify, password, hashed_password).result()
+
+
+async def verify_password_async(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password , returns (valid , new hash if the stored one should be replaced)"""
+    return await asyncio.wrap_future(hasher.submit(hasher._verify, password, hashed_password))
@@ -1,8 +1,17 @@
+import asyncio
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, List, Optional, Tuple
 
+from ..database import SessionLocal
 from ..enums import portfolio_enums
 from ..model import portfolio_model
 from ..schemas import portfolio_schema
+from ..service.pagination import paginate, page_of, encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+from ..service.redis_service import loadPositions, getPositions, getPositionsVersion, dropPositions
 
 def get_portfolio_by_user_event_share(db: Session, user_id: int, event_id: int, share_type: portfolio_enums.ShareType):
     """Get portfolio entry by user ID, event ID, and share type"""
@@ -18,12 +27,33 @@ def get_portfolio_by_id(db: Session, portfolio_id: int):
         portfolio_model.Portfolio.id == portfolio_id
     ).first()
 
+async def get_portfolio_by_id_async(db: AsyncSession, portfolio_id: int):
+    """Get portfolio entry by ID"""
+    result = await db.execute(select(portfolio_model.Portfolio).where(
+        portfolio_model.Portfolio.id == portfolio_id
+    ))
+    return result.scalars().first()
+
 def get_portfolios_by_user(db: Session, user_id: int):
     """Get all portfolio entries for a specific user"""
     return db.query(portfolio_model.Portfolio).filter(
         portfolio_model.Portfolio.user_id == user_id
     ).all()
 
+async def get_all_portfolios_by_user_async(db: AsyncSession, user_id: int):
+    """Get all portfolio entries for a specific user"""
+    result = await db.execute(select(portfolio_model.Portfolio).where(
+        portfolio_model.Portfolio.user_id == user_id
+    ))
+    return result.scalars().all()
+
+async def get_portfolios_by_user_async(db: AsyncSession, user_id: int, cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """Get one page of portfolio entries for a specific user , returns (entries , next cursor)"""
+    result = await db.execute(paginate(select(portfolio_model.Portfolio).where(
+        portfolio_model.Portfolio.user_id == user_id
+    ), [portfolio_model.Portfolio.id], cursor, limit, descending=False))
+    return page_of(result.scalars().all(), limit, ["id"])
+
 def get_portfolios_by_event(db: Session, event_id: int):
     """Get all portfolio entries for a specific event"""
     return db.query(portfolio_model.Portfolio).filter(
@@ -40,8 +70,95 @@ def create_portfolio(db: Session, portfolio_data: portfolio_schema.PortfolioCrea
     db.add(db_portfolio)
     db.commit()
     db.refresh(db_portfolio)
+    dropPositions(user_id)
     return db_portfolio
 
+def _position_upsert_stmt(dialect_name: str, rows: List[Dict]):
+    """Insert the positions , or add their quantity to the existing rows , in one statement"""
+    insert = pg_insert if dialect_name == "postgresql" else sqlite_insert
+    stmt = insert(portfolio_model.Portfolio).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "event_id", "type_of_share"],
+        set_={"quantity": portfolio_model.Portfolio.quantity + stmt.excluded.quantity}
+    ).returning(
+        portfolio_model.Portfolio.id,
+        portfolio_model.Portfolio.user_id,
+        portfolio_model.Portfolio.event_id,
+        portfolio_model.Portfolio.type_of_share
+    )
+
+def apply_position_deltas(db: Session, deltas: List[Tuple[int, int, portfolio_enums.ShareType, int]], commit: bool = True):
+    """
+    Add signed quantities to positions , deltas are (user_id , event_id , share type , delta).
+    A missing position is created. With commit False the caller commits , either way the
+    mirrors of the users are dropped once the transaction commits
+    """
+    # a row can be upserted only once per statement , fold deltas of the same position
+    merged: Dict[Tuple, int] = {}
+    for user_id, event_id, share_type, delta in deltas:
+        merged[(user_id, event_id, share_type)] = merged.get((user_id, event_id, share_type), 0) + delta
+
+    rows = [
+        {"user_id": user_id, "event_id": event_id, "type_of_share": share_type, "quantity": delta}
+        for (user_id, event_id, share_type), delta in merged.items()
+    ]
+    if not rows:
+        return
+
+    db.execute(_position_upsert_stmt(db.get_bind().dialect.name, rows))
+    db.info.setdefault("positions_changed", set()).update(user_id for user_id, _, _ in merged)
+    if commit:
+        db.commit()
+
+@event.listens_for(SessionLocal, "after_commit")
+def _drop_changed_positions(session):
+    # dropped , not patched , the next read reloads the committed rows
+    user_ids = session.info.pop("positions_changed", None)
+    if user_ids:
+        dropPositions(*user_ids)
+
+def get_cached_positions(user_id: int) -> Optional[List[Dict]]:
+    """Positions of a user from the mirror , None when it has to be loaded"""
+    return getPositions(user_id)
+
+def _as_positions(portfolios) -> List[Dict]:
+    return [{
+        "id": entry.id,
+        "user_id": entry.user_id,
+        "event_id": entry.event_id,
+        "type_of_share": entry.type_of_share.value,
+        "quantity": entry.quantity
+    } for entry in portfolios]
+
+def load_positions(db: Session, user_id: int) -> List[Dict]:
+    """Read the positions of a user and mirror them , db must be on the primary"""
+    version = getPositionsVersion(user_id)
+    positions = _as_positions(get_portfolios_by_user(db, user_id))
+    if version is not None:
+        loadPositions(user_id, positions, version)
+    return positions
+
+async def load_positions_async(db: AsyncSession, user_id: int) -> List[Dict]:
+    """Read the positions of a user and mirror them , db must be on the primary"""
+    version = await asyncio.to_thread(getPositionsVersion, user_id)
+    positions = _as_positions(await get_all_portfolios_by_user_async(db, user_id))
+    if version is not None:
+        await asyncio.to_thread(loadPositions, user_id, positions, version)
+    return positions
+
+def page_positions(positions: List[Dict], cursor: Optional[str] = None, limit: Optional[int] = DEFAULT_PAGE_SIZE):
+    """One page of mirrored positions in id order , returns (positions , next cursor) , every one with no limit"""
+    positions = sorted(positions, key=lambda position: position["id"])
+    if cursor:
+        after = decode_cursor(cursor, [portfolio_model.Portfolio.id])[0]
+        positions = [position for position in positions if position["id"] > after]
+
+    if limit is None or len(positions) <= limit:
+        return positions, None
+
+    positions = positions[:limit]
+    return positions, encode_cursor([positions[-1]["id"]])
+
 def update_portfolio(db: Session, portfolio_id: int, portfolio_update: portfolio_schema.PortfolioUpdate):
     """Update an existing portfolio entry"""
     db_portfolio = db.query(portfolio_model.Portfolio).filter(
@@ -51,6 +168,8 @@ def update_portfolio(db: Session, portfolio_id: int, portfolio_update: portfolio
     if not db_portfolio:
         return None
     
+    previous_user_id = db_portfolio.user_id
+    
     # Update only the fields that are provided (not None)
     update_data = portfolio_update.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -58,6 +177,7 @@ def update_portfolio(db: Session, portfolio_id: int, portfolio_update: portfolio
     
     db.commit()
     db.refresh(db_portfolio)
+    dropPositions(previous_user_id, db_portfolio.user_id)
     return db_portfolio
 
 def delete_portfolio(db: Session, portfolio_id: int):
@@ -71,6 +191,7 @@ def delete_portfolio(db: Session, portfolio_id: int):
     
     db.delete(db_portfolio)
     db.commit()
+    dropPositions(db_portfolio.user_id)
     return db_portfolio
 
 def get_user_portfolio_summary(db: Session, user_id: int):
@@ -98,4 +219,5 @@ def update_portfolio_quantity(db: Session, portfolio_id: int, new_quantity: int)
     db_portfolio.quantity = new_quantity
     db.commit()
     db.refresh(db_portfolio)
+    dropPositions(db_portfolio.user_id)
     return db_portfolio
\ No newline at end of file
@@ -0,0 +1,285 @@
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from ..service.redis_service import redis_client
+from ..service.api_key import is_signed
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# memory keeps buckets per worker , redis shares them across workers at one round trip per request
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# buckets kept in memory , the least recently used goes first
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# load balancers and ingresses in front of the app , comma separated addresses or networks.
+# Without them every client behind a proxy shares the proxy's address bucket. A request from
+# one is counted against the rightmost X-Forwarded-For address that isn't a trusted proxy ,
+# earlier ones are client supplied. Leave empty when uvicorn already runs with
+# --proxy-headers --forwarded-allow-ips , the client address is rewritten before it gets here
+RATE_LIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if proxy.strip()
+]
+
+
+def _limit(name: str, rate: str, burst: str) -> Tuple[float, int]:
+    """(tokens refilled per second , bucket size) of a route class"""
+    return (
+        float(os.getenv(f"RATE_LIMIT_{name}_RATE", rate)),
+        int(os.getenv(f"RATE_LIMIT_{name}_BURST", burst))
+    )
+
+
+RATE_LIMITS = {
+    # order entry , cancels and amends , the path that reaches the engine
+    "order": _limit("ORDER", "20", "40"),
+    # logins and registrations , per client address since the caller isn't known yet ,
+    # behind a proxy that needs RATE_LIMIT_TRUSTED_PROXIES
+    "auth": _limit("AUTH", "1", "10"),
+    "write": _limit("WRITE", "10", "20"),
+    "read": _limit("READ", "50", "100"),
+}
+
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+_EXEMPT_PATHS = {"/", "/docs", "/redoc", "/openapi.json"}
+
+# atomic refill and take on a hash of tokens and last refill time , clocked by redis
+# so workers agree. Floats go back as strings , lua numbers are truncated on return
+_take_script = redis_client.register_script("""
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(wait)}
+""")
+
+
+def _get_bucket_key(identity: str, route_class: str) -> str:
+    return f"rate_limit:{route_class}:{identity}"
+
+
+def route_class_of(method: str, path: str) -> Optional[str]:
+    """Route class a request is limited under , None if it isn't limited"""
+    if path in _EXEMPT_PATHS or path.startswith("/health"):
+        return None
+    if path.startswith("/auth/login") or path.startswith("/auth/register"):
+        return "auth"
+    if method in _READ_METHODS:
+        return "read"
+    if path.startswith("/orders"):
+        return "order"
+    return "write"
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_address(scope, headers: Headers) -> str:
+    """Address of the client , taken from X-Forwarded-For only when a trusted proxy sent it"""
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not _is_trusted_proxy(address):
+        return address
+
+    hops = [hop.strip() for hop in ",".join(headers.getlist("x-forwarded-for")).split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    # every hop is a proxy , the first one is as close to the client as it gets
+    return hops[0] if hops else address
+
+
+class RateLimiter:
+    """Token buckets per caller and route class"""
+
+    def __init__(self, backend: str, max_buckets: int):
+        self.backend = backend
+        self.max_buckets = max_buckets
+        # (route class , identity) -> [tokens , monotonic time of the last refill]
+        self.buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        # bearer token -> subject , saves a jwt decode per request
+        self.subjects: Dict[str, str] = {}
+        self.stats = {name: {"allowed": 0, "throttled": 0} for name in RATE_LIMITS}
+        self.redis_errors = 0
+
+    def identity_of(self, scope, headers: Headers, route_class: str, body: Optional[bytes] = None) -> str:
+        """
+        Whom a request is counted against , the api key , the user of the token or the
+        client address. A key counts only with a valid signature over body , a token
+        only if its own signature checks out , anything else spends the address bucket
+        so made up credentials can't get a fresh bucket or drain someone else's
+        """
+        if route_class != "auth":
+            key_id = headers.get("x-api-key")
+            if key_id and body is not None and is_signed(
+                key_id, headers.get("x-timestamp"), headers.get("x-nonce"), headers.get("x-signature"),
+                scope["method"], scope["path"], scope["query_string"].decode("latin-1"), body
+            ):
+                return f"key:{key_id}"
+
+            authorization = headers.get("authorization")
+            if not key_id and authorization and authorization[:7].lower() == "bearer ":
+                subject = self._subject(authorization[7:])
+                if subject is not None:
+                    return f"user:{subject}"
+
+        return f"ip:{client_address(scope, headers)}"
+
+    async def hit(self, identity: str, route_class: str) -> Tuple[bool, int, float]:
+        """Take a token , returns (allowed , tokens left , seconds until the next one)"""
+        rate, burst = RATE_LIMITS[route_class]
+        result = None
+        if self.backend == "redis":
+            try:
+                result = await asyncio.to_thread(self._take_redis, identity, route_class, rate, burst)
+            except Exception as e:
+                # limited per worker until redis is back
+                self.redis_errors += 1
+                print(f"Error taking rate limit token from redis: {e}")
+
+        if result is None:
+            result = self._take_local(identity, route_class, rate, burst)
+
+        self.stats[route_class]["allowed" if result[0] else "throttled"] += 1
+        return result
+
+    def limit_stats(self) -> Dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "backend": self.backend,
+            "buckets": len(self.buckets),
+            "redis_errors": self.redis_errors,
+            "classes": {
+                name: {"rate": rate, "burst": burst, **self.stats[name]}
+                for name, (rate, burst) in RATE_LIMITS.items()
+            }
+        }
+
+    def _subject(self, token: str) -> Optional[str]:
+        subject = self.subjects.get(token)
+        if subject is None:
+            try:
+                subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except JWTError:
+                return None
+            if len(self.subjects) >= self.max_buckets:
+                self.subjects.clear()
+            self.subjects[token] = subject
+        return subject
+
+    def _take_local(self, identity: str, route_class: str, rate: float, burst: int) -> Tuple[bool, int, float]:
+        now = time.monotonic()
+        key = (route_class, identity)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(burst), now]
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, int(bucket[0]), 0.0
+        return False, 0, (1 - bucket[0]) / rate
+
+    def _take_redis(self, identity: str, route_class: str, rate: float, burst: int) -> Tuple[bool, int, float]:
+        allowed, tokens, wait = _take_script(keys=[_get_bucket_key(identity, route_class)], args=[rate, burst])
+        return bool(allowed), int(float(tokens)), float(wait)
+
+
+limiter = RateLimiter(RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_BUCKETS)
+
+
+async def _buffer_body(receive):
+    """Read the whole request body , returns it with a receive that replays it"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            # client gone , let the app see the disconnect
+            pending = [message]
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            pending = [{"type": "http.request", "body": b"".join(chunks), "more_body": False}]
+            break
+
+    async def replay():
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    body = b"".join(chunks) if pending and pending[0]["type"] == "http.request" else None
+    return body, replay
+
+
+class RateLimitMiddleware:
+    """Answers 429 with Retry-After once a caller's bucket for the route class is empty"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = route_class_of(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        body = None
+        if "x-api-key" in headers and route_class != "auth":
+            # the signature covers the body , read it here and hand it on to the app
+            body, receive = await _buffer_body(receive)
+
+        identity = limiter.identity_of(scope, headers, route_class, body)
+        allowed, remaining, retry_after = await limiter.hit(identity, route_class)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse(
+            {"detail": "Rate limit exceeded"},
+            status_code=429,
+            headers={
+                "Retry-After": str(max(1, math.ceil(retry_after))),
+                "X-RateLimit-Limit": str(RATE_LIMITS[route_class][1]),
+                "X-RateLimit-Remaining": str(remaining)
+            }
+        )
+        await response(scope, receive, send)
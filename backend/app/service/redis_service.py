@@ -1,7 +1,7 @@
 import redis
 import pickle
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
 import time
@@ -11,9 +11,72 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
+from ..database import PoolMetrics
+
 # Get Redis connection
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-redis_client = redis.from_url(redis_url, decode_responses=True)
+
+# connection pool settings , each client below gets its own pool
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '5'))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Blocking pool that records how long callers wait for a connection"""
+
+    def __init__(self, *args, metrics: PoolMetrics = None, **kwargs):
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            if "No connection available" in str(e):
+                self.metrics.record_exhausted()
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def status(self) -> Dict[str, Any]:
+        idle = len([connection for connection in self.pool.queue if connection is not None])
+        return {
+            "max_connections": self.max_connections,
+            "timeout": self.timeout,
+            "created": len(self._connections),
+            "idle": idle,
+            "in_use": len(self._connections) - idle,
+            **self.metrics.snapshot()
+        }
+
+
+def _create_pool(name: str, **kwargs) -> InstrumentedConnectionPool:
+    return InstrumentedConnectionPool.from_url(
+        redis_url,
+        metrics=PoolMetrics(name),
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        **kwargs
+    )
+
+redis_pool = _create_pool("redis", decode_responses=True)
+redis_client = redis.Redis(connection_pool=redis_pool)
+# pickled orders are raw bytes and can't go through the decoding client
+redis_binary_pool = _create_pool("redis_binary")
+redis_binary_client = redis.Redis(connection_pool=redis_binary_pool)
+
+def redis_pool_status() -> Dict[str, Any]:
+    """Usage and checkout metrics of both redis pools"""
+    return {
+        "text": redis_pool.status(),
+        "binary": redis_binary_pool.status()
+    }
 
 # Global dictionary to store locks
 locks: Dict[str, redis.lock.Lock] = {}
@@ -35,6 +98,30 @@ def _get_map_key(id: int) -> str:
     """Generate map key for orders"""
     return f"order:{id}"
 
+def _get_book_version_key(event_id: int) -> str:
+    """Generate key holding the orderbook version of an event"""
+    return f"book_version:{event_id}"
+
+def _get_bbo_key(event_id: int) -> str:
+    """Generate key holding the top of book of an event"""
+    return f"bbo:{event_id}"
+
+def _get_last_trade_key(event_id: int) -> str:
+    """Generate key holding the last traded price per share type of an event"""
+    return f"last_trade:{event_id}"
+
+def _get_event_keys_key(event_id: int) -> str:
+    """Generate set key registering the per-order keys of an event , for teardown"""
+    return f"event_keys:{event_id}"
+
+def _get_candle_key(event_id: int, share_type: str, interval: str) -> str:
+    """Generate hash key holding the candles of one share type and interval , by bucket start"""
+    return f"candles:{event_id}:{share_type}:{interval}"
+
+def _get_candle_index_key(event_id: int, share_type: str, interval: str) -> str:
+    """Generate sorted set key of the bucket starts of a candle hash , for range reads"""
+    return f"candles_index:{event_id}:{share_type}:{interval}"
+
 def isLocked(queue_name: str) -> bool:
     """Check if a queue is locked by this process"""
     return queue_name in locks
@@ -47,7 +134,8 @@ def addLock(queue_name: str) -> bool:
             return False
         
         lock_key = _get_lock_key(queue_name)
-        lock = redis_client.lock(lock_key, timeout=LOCK_TIMEOUT)
+        # token kept on the lock , not per thread , so shutdown can release it from any thread
+        lock = redis_client.lock(lock_key, timeout=LOCK_TIMEOUT, thread_local=False)
         
         # Try to acquire the lock (non-blocking)
         if lock.acquire(blocking=False):
@@ -72,6 +160,14 @@ def removeLock(queue_name: str) -> bool:
         print(f"Error removing lock from queue {queue_name}: {e}")
         return False
 
+def releaseAllLocks() -> int:
+    """Release every queue lock held by this process , returns how many. Used on shutdown"""
+    released = 0
+    for queue_name in list(locks.keys()):
+        if removeLock(queue_name):
+            released += 1
+    return released
+
 
 def pushToQueue(queue_name: str, id: int) -> bool:
     """Push an ID to the queue (only if queue is locked)"""
@@ -167,7 +263,14 @@ def addToMap(order, id: int) -> bool:
     try:
         map_key = _get_map_key(id)
         order_data = pickle.dumps(order)
-        redis_client.set(map_key, order_data)
+        
+        pipe = redis_binary_client.pipeline(transaction=False)
+        pipe.set(map_key, order_data)
+        # register the key with its event so teardown finds it without a scan
+        event_id = getattr(order, "event_id", None)
+        if event_id is not None:
+            pipe.sadd(_get_event_keys_key(event_id), map_key)
+        pipe.execute()
         return True
     except Exception as e:
         print(f"Error adding order to map with ID {id}: {e}")
@@ -178,7 +281,7 @@ def updateMap(order, id: int) -> bool:
     try:
         map_key = _get_map_key(id)
         order_data = pickle.dumps(order)
-        redis_client.set(map_key, order_data)
+        redis_binary_client.set(map_key, order_data)
         return True
     except Exception as e:
         print(f"Error adding order to map with ID {id}: {e}")
@@ -188,7 +291,7 @@ def getFromMap(id: int):
     """Get an Order object from the map by ID"""
     try:
         map_key = _get_map_key(id)
-        order_data = redis_client.get(map_key)
+        order_data = redis_binary_client.get(map_key)
         
         if order_data is None:
             return None
@@ -213,6 +316,301 @@ def removeFromMap(id: int) -> bool:
         return False
 
 
+def freeEvent(event_id: int, queue_names: List[str], order_ids: List[int] = ()) -> int:
+    """
+    Delete every key of an event in one pipelined round trip : its queues and their
+    locks , its registered order keys plus order_ids , and its top of book.
+    Returns the number of keys deleted.
+    Only memory is freed. Orders reserve no balance and no shares , both are checked
+    at entry and moved when a trade executes , so a cancelled order has nothing to give back
+    """
+    registry_key = _get_event_keys_key(event_id)
+    
+    # the lock keys are deleted below , drop this process's handles without releasing
+    for queue_name in queue_names:
+        locks.pop(queue_name, None)
+    
+    try:
+        keys = set(redis_client.smembers(registry_key))
+        keys.update(_get_map_key(order_id) for order_id in order_ids)
+        for queue_name in queue_names:
+            keys.add(_get_queue_key(queue_name))
+            keys.add(_get_lock_key(queue_name))
+        keys.add(_get_bbo_key(event_id))
+        keys.add(registry_key)
+        
+        keys = list(keys)
+        pipe = redis_client.pipeline(transaction=False)
+        for i in range(0, len(keys), 1000):
+            pipe.unlink(*keys[i:i + 1000])
+        return sum(pipe.execute())
+    except Exception as e:
+        print(f"Error freeing keys of event {event_id}: {e}")
+        return 0
+
+def incrBookVersion(event_id: int) -> int:
+    """Bump the orderbook version of an event. Returns the new version"""
+    try:
+        return int(redis_client.incr(_get_book_version_key(event_id)))
+    except Exception as e:
+        print(f"Error bumping book version for event {event_id}: {e}")
+        return -1
+
+def getBookVersion(event_id: int) -> int:
+    """Get the current orderbook version of an event (0 if the book never changed)"""
+    try:
+        version = redis_client.get(_get_book_version_key(event_id))
+        return int(version) if version is not None else 0
+    except Exception as e:
+        print(f"Error getting book version for event {event_id}: {e}")
+        return -1
+
+def getQueueLengths(queue_names: list) -> list:
+    """
+    Get the length of many queues in one round trip.
+    Does not need the queue locks, LLEN is atomic on its own
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for queue_name in queue_names:
+            pipe.llen(_get_queue_key(queue_name))
+        return [int(length) for length in pipe.execute()]
+    except Exception as e:
+        print(f"Error getting queue lengths: {e}")
+        return [0 for _ in queue_names]
+
+def setLastTradePrice(event_id: int, share_type: str, price: int) -> bool:
+    """Record the last traded price of a share type"""
+    try:
+        redis_client.hset(_get_last_trade_key(event_id), share_type, price)
+        return True
+    except Exception as e:
+        print(f"Error setting last trade price for event {event_id}: {e}")
+        return False
+
+def getLastTradePrices(event_id: int) -> Dict[str, int]:
+    """Get the last traded price per share type of an event"""
+    try:
+        prices = redis_client.hgetall(_get_last_trade_key(event_id))
+        return {share_type: int(price) for share_type, price in prices.items()}
+    except Exception as e:
+        print(f"Error getting last trade prices for event {event_id}: {e}")
+        return {}
+
+def swapBbo(event_id: int, bbo_data: str) -> Optional[str]:
+    """Store the serialized top of book of an event. Returns the previous value"""
+    try:
+        return redis_client.set(_get_bbo_key(event_id), bbo_data, get=True)
+    except Exception as e:
+        print(f"Error storing bbo for event {event_id}: {e}")
+        return None
+
+def getBbo(event_id: int) -> Optional[str]:
+    """Get the serialized top of book of an event"""
+    try:
+        return redis_client.get(_get_bbo_key(event_id))
+    except Exception as e:
+        print(f"Error getting bbo for event {event_id}: {e}")
+        return None
+
+# interval -> (bucket length in seconds , buckets kept)
+CANDLE_INTERVALS = {
+    "1s": (1, 3600),
+    "1m": (60, 1440),
+    "5m": (300, 2016),
+    "1h": (3600, 2160),
+}
+
+# folds one fill into the current bucket of every interval , in one round trip.
+# KEYS are (hash , index) pairs per interval , ARGV is price , quantity and then
+# (bucket start , buckets kept) per interval. Candles are stored as "o,h,l,c,v"
+_update_candles_script = redis_client.register_script("""
+local price = tonumber(ARGV[1])
+local quantity = tonumber(ARGV[2])
+for i = 1, #KEYS / 2 do
+    local candles = KEYS[2 * i - 1]
+    local index = KEYS[2 * i]
+    local bucket = ARGV[2 * i + 1]
+    local keep = tonumber(ARGV[2 * i + 2])
+
+    local current = redis.call('HGET', candles, bucket)
+    if current then
+        local o, h, l, c, v = string.match(current, '([^,]+),([^,]+),([^,]+),([^,]+),([^,]+)')
+        h = math.max(tonumber(h), price)
+        l = math.min(tonumber(l), price)
+        v = tonumber(v) + quantity
+        redis.call('HSET', candles, bucket, o .. ',' .. h .. ',' .. l .. ',' .. price .. ',' .. v)
+    else
+        redis.call('HSET', candles, bucket, price .. ',' .. price .. ',' .. price .. ',' .. price .. ',' .. quantity)
+        redis.call('ZADD', index, bucket, bucket)
+
+        local excess = redis.call('ZCARD', index) - keep
+        if excess > 0 then
+            local expired = redis.call('ZRANGE', index, 0, excess - 1)
+            redis.call('HDEL', candles, unpack(expired))
+            redis.call('ZREMRANGEBYRANK', index, 0, excess - 1)
+        end
+    end
+end
+return 1
+""")
+
+def updateCandles(event_id: int, share_type: str, price: int, quantity: int, timestamp: float) -> bool:
+    """Fold a fill into the candles of every interval"""
+    keys = []
+    args = [price, quantity]
+    for interval, (seconds, keep) in CANDLE_INTERVALS.items():
+        keys += [_get_candle_key(event_id, share_type, interval), _get_candle_index_key(event_id, share_type, interval)]
+        args += [int(timestamp) // seconds * seconds, keep]
+
+    try:
+        _update_candles_script(keys=keys, args=args)
+        return True
+    except Exception as e:
+        print(f"Error updating candles for event {event_id}: {e}")
+        return False
+
+def getCandles(event_id: int, share_type: str, interval: str, start: Optional[int] = None,
+               end: Optional[int] = None, limit: int = 500) -> List[Dict[str, int]]:
+    """Candles of a bucket range , oldest first , at most limit of the latest ones"""
+    try:
+        buckets = redis_client.zrevrangebyscore(
+            _get_candle_index_key(event_id, share_type, interval),
+            "+inf" if end is None else end,
+            "-inf" if start is None else start,
+            start=0,
+            num=limit
+        )
+        if not buckets:
+            return []
+
+        buckets.reverse()
+        values = redis_client.hmget(_get_candle_key(event_id, share_type, interval), buckets)
+    except Exception as e:
+        print(f"Error getting candles for event {event_id}: {e}")
+        return []
+
+    candles = []
+    for bucket, value in zip(buckets, values):
+        # bucket trimmed between the two reads
+        if value is None:
+            continue
+        o, h, l, c, v = (int(float(part)) for part in value.split(","))
+        candles.append({"time": int(bucket), "open": o, "high": h, "low": l, "close": c, "volume": v})
+    return candles
+
+def deleteCandles(event_id: int):
+    """Drop every candle of an event"""
+    try:
+        keys = [
+            key_function(event_id, share_type, interval)
+            for key_function in (_get_candle_key, _get_candle_index_key)
+            for share_type in ("yes", "no")
+            for interval in CANDLE_INTERVALS
+        ]
+        redis_client.delete(*keys)
+    except Exception as e:
+        print(f"Error deleting candles for event {event_id}: {e}")
+
+
+# positions of a user are mirrored for this long , rebuilt from the database when missing
+POSITION_CACHE_TTL = int(os.getenv('POSITION_CACHE_TTL', '300'))
+# marks a loaded mirror , so a user without positions is cached too
+_POSITIONS_LOADED = "_loaded"
+
+def _get_positions_key(user_id: int) -> str:
+    """Generate hash key mirroring the positions of a user"""
+    return f"positions:{user_id}"
+
+def _position_field(event_id: int, share_type: str) -> str:
+    return f"{event_id}:{share_type}"
+
+def _get_positions_version_key(user_id: int) -> str:
+    """Generate key counting the changes to the positions of a user"""
+    return f"positions_version:{user_id}"
+
+# loads the mirror only if no position changed since the loader read the version ,
+# a load racing with a commit is dropped instead of caching what it read before it
+_load_positions_script = redis_client.register_script("""
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+""")
+
+def getPositionsVersion(user_id: int) -> Optional[int]:
+    """Version of the positions of a user , read before loading them , None if redis is down"""
+    try:
+        return int(redis_client.get(_get_positions_version_key(user_id)) or 0)
+    except Exception as e:
+        print(f"Error getting positions version of user {user_id}: {e}")
+        return None
+
+def loadPositions(user_id: int, positions: List[Dict[str, Any]], version: int) -> bool:
+    """
+    Mirror positions read from the primary , version is getPositionsVersion from before
+    the read. False if they changed since , the mirror stays empty
+    """
+    args = [version, POSITION_CACHE_TTL, _POSITIONS_LOADED, 1]
+    for position in positions:
+        args.append(_position_field(position["event_id"], position["type_of_share"]))
+        args.append(f"{position['id']}:{position['quantity']}")
+
+    try:
+        return bool(_load_positions_script(
+            keys=[_get_positions_key(user_id), _get_positions_version_key(user_id)],
+            args=args
+        ))
+    except Exception as e:
+        print(f"Error loading positions of user {user_id}: {e}")
+        return False
+
+def getPositions(user_id: int) -> Optional[List[Dict[str, Any]]]:
+    """Mirrored positions of a user , None when the mirror isn't loaded"""
+    try:
+        fields = redis_client.hgetall(_get_positions_key(user_id))
+    except Exception as e:
+        print(f"Error getting positions of user {user_id}: {e}")
+        return None
+
+    if not fields:
+        return None
+
+    positions = []
+    for field, value in fields.items():
+        if field == _POSITIONS_LOADED:
+            continue
+        event_id, share_type = field.split(":")
+        portfolio_id, quantity = value.split(":")
+        positions.append({
+            "id": int(portfolio_id),
+            "user_id": user_id,
+            "event_id": int(event_id),
+            "type_of_share": share_type,
+            "quantity": int(quantity)
+        })
+    return positions
+
+def dropPositions(*user_ids: int):
+    """
+    Forget the mirror of users after their positions changed , their next read reloads
+    it. Bumps their version too , so a load that read the database before is not kept
+    """
+    try:
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            pipe.delete(_get_positions_key(user_id))
+            pipe.incr(_get_positions_version_key(user_id))
+            # outlives any load in flight , an expired version only fails those loads
+            pipe.expire(_get_positions_version_key(user_id), 2 * POSITION_CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error dropping positions of users {user_ids}: {e}")
+
+
 # class MockOrder:
 #     def __init__(self, symbol, quantity, price):
 #         self.symbol = symbol
@@ -270,8 +668,8 @@ def removeFromMap(id: int) -> bool:
 
 
 # if __name__ == "__main__":
-    print("==== Running Queue Test ====")
-    test_queue_flow()
+#     print("==== Running Queue Test ====")
+#     test_queue_flow()
 
-    print("\n==== Running Order Map Test ====")
-    test_order_map()
\ No newline at end of file
+#     print("\n==== Running Order Map Test ====")
+#     test_order_map()
\ No newline at end of file
@@ -0,0 +1,397 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Integer, and_, bindparam, column, func, insert, or_, select, update, values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..enums import event_enums, portfolio_enums, settlement_enums, trade_enums
+from ..model import portfolio_model, settlement_job_model, trade_model, user_model
+from ..service import archive
+
+# portfolio rows settled per transaction , keeps row locks on users short
+SETTLEMENT_CHUNK_SIZE = int(os.getenv("SETTLEMENT_CHUNK_SIZE", "1000"))
+# events settled at the same time
+SETTLEMENT_WORKERS = int(os.getenv("SETTLEMENT_WORKERS", "4"))
+# a running job without a checkpoint for this long belongs to a dead process
+SETTLEMENT_STALE_SECONDS = int(os.getenv("SETTLEMENT_STALE_SECONDS", "60"))
+
+_executor = ThreadPoolExecutor(max_workers=SETTLEMENT_WORKERS, thread_name_prefix="settlement")
+# jobs being run by this process
+_active_jobs: Set[int] = set()
+_active_lock = threading.Lock()
+# set on shutdown , workers stop at the next checkpoint
+_stopping = threading.Event()
+
+
+def payout_rule(share_type: portfolio_enums.ShareType, result: event_enums.EventResult) -> Tuple[int, int, int]:
+    """
+    (trade price , credit per share , debit per share) for the holder of a position.
+    The admin takes the other side , it pays the credit and receives the debit
+    """
+    if result == event_enums.EventResult.DRAW:
+        return 5, 5, 0
+
+    won = (share_type == portfolio_enums.ShareType.YES and result == event_enums.EventResult.YES) or \
+          (share_type == portfolio_enums.ShareType.NO and result == event_enums.EventResult.NO)
+    if won:
+        return 10, 10, 0
+
+    return 0, 0, 10
+
+
+def _lock_balances(db: Session, user_ids: Set[int]) -> Dict[int, int]:
+    """Balances of the users , locked until the chunk commits. Locked in id order , so chunks can't deadlock"""
+    rows = db.execute(
+        select(user_model.User.id, user_model.User.current_balance)
+        .where(user_model.User.id.in_(user_ids))
+        .order_by(user_model.User.id)
+        .with_for_update()
+    ).all()
+    return {row.id: row.current_balance or 0 for row in rows}
+
+
+def _replay_payouts(balances: Dict[int, int], payouts: List[Tuple[int, int, int]]):
+    """
+    Apply (payer , payee , amount) in position order , one at a time like the per row
+    payout did: the payee is credited , then a debit the payer can't cover at that
+    point is skipped , the same rule as deduct_from_user_balance
+    """
+    for payer, payee, amount in payouts:
+        if payee in balances:
+            balances[payee] += amount
+        if payer in balances and balances[payer] >= amount:
+            balances[payer] -= amount
+
+
+def write_balances(db: Session, balances: Dict[int, int]):
+    """Set {user_id: balance} in one statement"""
+    if not balances:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        rows = values(
+            column("user_id", Integer),
+            column("balance", Integer),
+            name="balances"
+        ).data(list(balances.items()))
+
+        db.execute(
+            update(user_model.User)
+            .where(user_model.User.id == rows.c.user_id)
+            .values(current_balance=rows.c.balance)
+            .execution_options(synchronize_session=False)
+        )
+        return
+
+    # sqlite has no UPDATE ... FROM (VALUES ...) with named columns , one executemany instead
+    db.connection().execute(
+        update(user_model.User.__table__)
+        .where(user_model.User.__table__.c.id == bindparam("target_id"))
+        .values(current_balance=bindparam("balance")),
+        [{"target_id": user_id, "balance": balance} for user_id, balance in balances.items()]
+    )
+
+
+def settle_chunk(db: Session, event_id: int, result: event_enums.EventResult, admin_id: int,
+                 after_id: int = 0, limit: int = SETTLEMENT_CHUNK_SIZE) -> Tuple[Optional[int], int]:
+    """
+    Settle the next portfolio rows of an event after after_id , without committing.
+    Returns (id of the last row settled , rows settled) , (None , 0) when nothing is left
+    """
+    positions = db.execute(
+        select(
+            portfolio_model.Portfolio.id,
+            portfolio_model.Portfolio.user_id,
+            portfolio_model.Portfolio.quantity,
+            portfolio_model.Portfolio.type_of_share
+        )
+        .where(
+            portfolio_model.Portfolio.event_id == event_id,
+            portfolio_model.Portfolio.id > after_id
+        )
+        .order_by(portfolio_model.Portfolio.id)
+        .limit(limit)
+    ).all()
+
+    if not positions:
+        return None, 0
+
+    trades = []
+    # (payer , payee , amount) in position order , the admin is the counterparty of every payout
+    payouts: List[Tuple[int, int, int]] = []
+
+    for position in positions:
+        if position.quantity <= 0:
+            continue
+
+        price, credit, debit = payout_rule(position.type_of_share, result)
+
+        trades.append({
+            "event_id": event_id,
+            "price": price,
+            "quantity": position.quantity,
+            "type_of_share": trade_enums.TradeShareType(position.type_of_share.value),
+            "buyer_user_id": admin_id,
+            "seller_user_id": position.user_id,
+            "buyer_order_id": None,
+            "seller_order_id": None
+        })
+
+        if credit:
+            payouts.append((admin_id, position.user_id, credit * position.quantity))
+        if debit:
+            payouts.append((position.user_id, admin_id, debit * position.quantity))
+
+    if trades:
+        db.execute(insert(trade_model.Trade), trades)
+
+    if payouts:
+        balances = _lock_balances(db, {user_id for payout in payouts for user_id in payout[:2]})
+        before = dict(balances)
+        _replay_payouts(balances, payouts)
+        write_balances(db, {user_id: balance for user_id, balance in balances.items() if balance != before[user_id]})
+
+    return positions[-1].id, len(positions)
+
+
+def settle_event(db: Session, event_id: int, result: event_enums.EventResult, admin_id: int,
+                 chunk_size: int = SETTLEMENT_CHUNK_SIZE) -> Dict[str, int]:
+    """Pay out every position of an event , one transaction per chunk"""
+    after_id = 0
+    processed = 0
+
+    while True:
+        try:
+            last_id, count = settle_chunk(db, event_id, result, admin_id, after_id, chunk_size)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        if last_id is None:
+            break
+
+        after_id = last_id
+        processed += count
+
+    return {"event_id": event_id, "processed": processed, "last_portfolio_id": after_id}
+
+
+def get_settlement_job(db: Session, event_id: int):
+    """Get the settlement job of an event"""
+    return db.execute(
+        select(settlement_job_model.SettlementJob).where(settlement_job_model.SettlementJob.event_id == event_id)
+    ).scalars().first()
+
+
+def _is_stale(job) -> bool:
+    updated_at = job.updated_at or job.created_at
+    if updated_at is None:
+        return True
+    if updated_at.tzinfo is None:
+        # sqlite hands back naive utc timestamps
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - updated_at).total_seconds() > SETTLEMENT_STALE_SECONDS
+
+
+def start_settlement(db: Session, event_id: int, result: event_enums.EventResult, admin_id: int):
+    """
+    Create the settlement job of an event and queue it. Calling it again returns the
+    existing job , a failed or abandoned one is resumed from its checkpoint
+    """
+    job = get_settlement_job(db, event_id)
+
+    if job is None:
+        total = db.execute(
+            select(func.count(portfolio_model.Portfolio.id)).where(portfolio_model.Portfolio.event_id == event_id)
+        ).scalar()
+
+        job = settlement_job_model.SettlementJob(
+            event_id=event_id,
+            result=result,
+            admin_id=admin_id,
+            status=settlement_enums.SettlementStatus.PENDING,
+            total=total,
+            processed=0,
+            last_portfolio_id=0
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # another request created it first
+            db.rollback()
+            return get_settlement_job(db, event_id)
+        db.refresh(job)
+
+    if job.status in [settlement_enums.SettlementStatus.PENDING, settlement_enums.SettlementStatus.FAILED] or \
+            (job.status == settlement_enums.SettlementStatus.RUNNING and _is_stale(job)):
+        submit_settlement_job(job.id)
+
+    return job
+
+
+def submit_settlement_job(job_id: int) -> bool:
+    """Queue a job on the worker pool unless this process already runs it"""
+    with _active_lock:
+        if job_id in _active_jobs or _stopping.is_set():
+            return False
+        _active_jobs.add(job_id)
+
+    _executor.submit(run_settlement_job, job_id)
+    return True
+
+
+def _claim_job(db: Session, job_id: int) -> bool:
+    """
+    Mark a job running for this process , in one conditional update so only one
+    process wins a pending , failed or abandoned job. False if another one has it
+    """
+    job_table = settlement_job_model.SettlementJob
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=SETTLEMENT_STALE_SECONDS)
+    claimed = db.execute(
+        update(job_table)
+        .where(
+            job_table.id == job_id,
+            or_(
+                job_table.status.in_([settlement_enums.SettlementStatus.PENDING, settlement_enums.SettlementStatus.FAILED]),
+                and_(
+                    job_table.status == settlement_enums.SettlementStatus.RUNNING,
+                    or_(job_table.updated_at.is_(None), job_table.updated_at < stale_before)
+                )
+            )
+        )
+        .values(status=settlement_enums.SettlementStatus.RUNNING, error=None, updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return claimed.rowcount == 1
+
+
+def _advance_job(db: Session, job_id: int, after_id: int, values: Dict) -> bool:
+    """
+    Move the checkpoint of a running job on from after_id , in the transaction of the
+    payouts it covers. False if the checkpoint already moved , another process paid
+    that chunk and the caller must roll back. On postgres the row lock makes a
+    concurrent caller wait and then see the moved checkpoint
+    """
+    job_table = settlement_job_model.SettlementJob
+    advanced = db.execute(
+        update(job_table)
+        .where(
+            job_table.id == job_id,
+            job_table.status == settlement_enums.SettlementStatus.RUNNING,
+            job_table.last_portfolio_id == after_id
+        )
+        .values(updated_at=datetime.now(timezone.utc), **values)
+        .execution_options(synchronize_session=False)
+    )
+    return advanced.rowcount == 1
+
+
+def run_settlement_job(job_id: int):
+    """Settle an event chunk by chunk , the checkpoint commits with the payouts of its chunk"""
+    db = SessionLocal()
+    after_id = None
+    try:
+        if not _claim_job(db, job_id):
+            return
+
+        job = db.get(settlement_job_model.SettlementJob, job_id)
+        event_id, result, admin_id = job.event_id, job.result, job.admin_id
+        after_id = job.last_portfolio_id
+
+        while not _stopping.is_set():
+            last_id, count = settle_chunk(db, event_id, result, admin_id, after_id)
+
+            if last_id is None:
+                if not _advance_job(db, job_id, after_id, {
+                    "status": settlement_enums.SettlementStatus.COMPLETED,
+                    "finished_at": datetime.now(timezone.utc)
+                }):
+                    db.rollback()
+                    return
+                db.commit()
+                _archive_settled(db, event_id)
+                return
+
+            if not _advance_job(db, job_id, after_id, {
+                "processed": settlement_job_model.SettlementJob.processed + count,
+                "last_portfolio_id": last_id
+            }):
+                # taken over as stale while this chunk ran , its payouts are undone
+                print(f"Settlement job {job_id} was taken over , stopping")
+                db.rollback()
+                return
+            db.commit()
+            after_id = last_id
+
+        # shutting down , the next start picks it up from the checkpoint
+        if _advance_job(db, job_id, after_id, {"status": settlement_enums.SettlementStatus.PENDING}):
+            db.commit()
+
+    except Exception as e:
+        print(f"Error settling job {job_id}: {e}")
+        db.rollback()
+        try:
+            # only while still ours , a job taken over is left to its new owner
+            if after_id is not None and _advance_job(db, job_id, after_id, {
+                "status": settlement_enums.SettlementStatus.FAILED,
+                "error": str(e)
+            }):
+                db.commit()
+        except Exception as e:
+            print(f"Error marking job {job_id} failed: {e}")
+            db.rollback()
+    finally:
+        db.close()
+        with _active_lock:
+            _active_jobs.discard(job_id)
+
+
+def _archive_settled(db: Session, event_id: int):
+    if not archive.ARCHIVE_AFTER_SETTLEMENT:
+        return
+    try:
+        archive.archive_event(db, event_id)
+    except Exception as e:
+        # the event stays in the hot tables , it can be archived again from the admin endpoint
+        print(f"Error archiving event {event_id}: {e}")
+        db.rollback()
+
+
+def resume_settlement_jobs() -> int:
+    """Queue the jobs an earlier process left unfinished , call on startup"""
+    db = SessionLocal()
+    try:
+        jobs = db.execute(
+            select(settlement_job_model.SettlementJob).where(settlement_job_model.SettlementJob.status.in_([
+                settlement_enums.SettlementStatus.PENDING,
+                settlement_enums.SettlementStatus.RUNNING
+            ]))
+        ).scalars().all()
+
+        resumed = 0
+        for job in jobs:
+            # a fresh checkpoint means another process is still on it
+            if job.status == settlement_enums.SettlementStatus.RUNNING and not _is_stale(job):
+                continue
+            if submit_settlement_job(job.id):
+                resumed += 1
+        return resumed
+    except Exception as e:
+        print(f"Error resuming settlement jobs: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def stop_settlement_workers():
+    """Let running jobs stop at their next checkpoint"""
+    _stopping.set()
+    _executor.shutdown(wait=True, cancel_futures=True)
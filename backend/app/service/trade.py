@@ -1,20 +1,38 @@
+import asyncio
+import csv
+import io
+import json
+import os
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
-from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, desc, func, select
+from typing import AsyncIterator, Optional, List
 
 from ..enums import trade_enums
 from ..model import trade_model
 from ..schemas import trade_schema
+from ..service.pagination import paginate, page_of, DEFAULT_PAGE_SIZE
+from ..service.redis_service import getCandles
+from ..service import archive
 
-def get_trade_by_id(db: Session, trade_id: int):
-    """Get trade by ID"""
-    return db.query(trade_model.Trade).filter(
-        trade_model.Trade.id == trade_id
-    ).first()
+# newest first , the id breaks ties between trades of the same timestamp
+TRADE_PAGE_KEY = [trade_model.Trade.executed_at, trade_model.Trade.id]
+TRADE_PAGE_ATTRIBUTES = ["executed_at", "id"]
 
-def get_trades_by_user(db: Session, user_id: int, event_id: Optional[int] = None, limit: int = 100):
-    """Get all trades for a specific user (as buyer or seller)"""
-    query = db.query(trade_model.Trade).filter(
+# rows fetched per round trip by the export cursor
+TRADE_EXPORT_BATCH_SIZE = int(os.getenv("TRADE_EXPORT_BATCH_SIZE", "5000"))
+TRADE_EXPORT_COLUMNS = [
+    "id", "event_id", "price", "quantity", "type_of_share",
+    "buyer_user_id", "seller_user_id", "buyer_order_id", "seller_order_id", "executed_at"
+]
+
+# statements shared by the sync and async read paths
+
+def _trade_by_id_stmt(trade_id: int):
+    return select(trade_model.Trade).where(trade_model.Trade.id == trade_id)
+
+def _trades_by_user_stmt(user_id: int, event_id: Optional[int] = None):
+    stmt = select(trade_model.Trade).where(
         or_(
             trade_model.Trade.buyer_user_id == user_id,
             trade_model.Trade.seller_user_id == user_id
@@ -22,31 +40,30 @@ def get_trades_by_user(db: Session, user_id: int, event_id: Optional[int] = None
     )
     
     if event_id:
-        query = query.filter(trade_model.Trade.event_id == event_id)
+        stmt = stmt.where(trade_model.Trade.event_id == event_id)
     
-    return query.order_by(desc(trade_model.Trade.executed_at)).limit(limit).all()
+    return stmt
 
-def get_trades_by_event(db: Session, event_id: int, limit: int = 100):
-    """Get all trades for a specific event"""
-    return db.query(trade_model.Trade).filter(
-        trade_model.Trade.event_id == event_id
-    ).order_by(desc(trade_model.Trade.executed_at)).limit(limit).all()
+def _trades_by_event_stmt(event_id: int):
+    return select(trade_model.Trade).where(trade_model.Trade.event_id == event_id)
 
-def get_latest_trades_by_event(db: Session, event_id: int, limit: int = 10):
-    """Get latest trades for an event - useful for price discovery"""
-    return db.query(trade_model.Trade).filter(
-        trade_model.Trade.event_id == event_id
-    ).order_by(desc(trade_model.Trade.executed_at)).limit(limit).all()
+def _latest_trade_stmt(event_id: int, share_type: trade_enums.TradeShareType):
+    return select(trade_model.Trade).where(
+        and_(
+            trade_model.Trade.event_id == event_id,
+            trade_model.Trade.type_of_share == share_type
+        )
+    ).order_by(desc(trade_model.Trade.executed_at)).limit(1)
 
-def get_trades_with_filters(db: Session, query_params: trade_schema.TradeHistoryQuery):
-    """Get trades with various filters"""
-    query = db.query(trade_model.Trade)
-    
+def _recent_trades_stmt(event_id: int, limit: int):
+    return _trades_by_event_stmt(event_id).order_by(desc(trade_model.Trade.executed_at)).limit(limit)
+
+def _with_trade_filters(stmt, query_params: trade_schema.TradeHistoryQuery):
     if query_params.event_id:
-        query = query.filter(trade_model.Trade.event_id == query_params.event_id)
+        stmt = stmt.where(trade_model.Trade.event_id == query_params.event_id)
     
     if query_params.user_id:
-        query = query.filter(
+        stmt = stmt.where(
             or_(
                 trade_model.Trade.buyer_user_id == query_params.user_id,
                 trade_model.Trade.seller_user_id == query_params.user_id
@@ -54,22 +71,110 @@ def get_trades_with_filters(db: Session, query_params: trade_schema.TradeHistory
         )
     
     if query_params.type_of_share:
-        query = query.filter(trade_model.Trade.type_of_share == query_params.type_of_share)
+        stmt = stmt.where(trade_model.Trade.type_of_share == query_params.type_of_share)
     
     if query_params.start_date:
-        query = query.filter(trade_model.Trade.executed_at >= query_params.start_date)
+        stmt = stmt.where(trade_model.Trade.executed_at >= query_params.start_date)
     
     if query_params.end_date:
-        query = query.filter(trade_model.Trade.executed_at <= query_params.end_date)
+        stmt = stmt.where(trade_model.Trade.executed_at <= query_params.end_date)
+    
+    return stmt
+
+def _trades_with_filters_stmt(query_params: trade_schema.TradeHistoryQuery):
+    stmt = _with_trade_filters(select(trade_model.Trade), query_params)
     
     limit = query_params.limit or 100
-    return query.order_by(desc(trade_model.Trade.executed_at)).limit(limit).all()
+    return stmt.order_by(desc(trade_model.Trade.executed_at)).limit(limit)
+
+def _archive_filters(query_params: trade_schema.TradeHistoryQuery):
+    # the filters of _with_trade_filters other than the event , for an archived event
+    return {
+        "user_id": query_params.user_id,
+        "type_of_share": query_params.type_of_share,
+        "start_date": query_params.start_date,
+        "end_date": query_params.end_date
+    }
+
+def _trade_export_stmt(query_params: trade_schema.TradeHistoryQuery):
+    # plain columns , no ORM objects are built for the rows
+    stmt = select(*[trade_model.Trade.__table__.c[name] for name in TRADE_EXPORT_COLUMNS])
+    return _with_trade_filters(stmt, query_params).order_by(trade_model.Trade.id)
+
+def get_trade_by_id(db: Session, trade_id: int):
+    """Get trade by ID"""
+    return db.execute(_trade_by_id_stmt(trade_id)).scalars().first()
+
+async def get_trade_by_id_async(db: AsyncSession, trade_id: int):
+    """Get trade by ID"""
+    return (await db.execute(_trade_by_id_stmt(trade_id))).scalars().first()
+
+def get_trades_by_user(db: Session, user_id: int, event_id: Optional[int] = None, limit: int = 100):
+    """Get all trades for a specific user (as buyer or seller)"""
+    stmt = _trades_by_user_stmt(user_id, event_id).order_by(desc(trade_model.Trade.executed_at)).limit(limit)
+    return db.execute(stmt).scalars().all()
+
+async def get_trades_by_user_async(db: AsyncSession, user_id: int, event_id: Optional[int] = None,
+                                   cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Get one page of trades for a specific user (as buyer or seller) , returns (trades , next cursor)"""
+    stmt = paginate(_trades_by_user_stmt(user_id, event_id), TRADE_PAGE_KEY, cursor, limit)
+    trades, next_cursor = page_of((await db.execute(stmt)).scalars().all(), limit, TRADE_PAGE_ATTRIBUTES)
+    
+    # history across events only covers the hot table , one archived event is read from its file
+    if not trades and event_id:
+        return await archive.archived_trades_page_async(db, event_id, cursor, limit, user_id=user_id) or (trades, next_cursor)
+    
+    return trades, next_cursor
+
+def get_trades_by_event(db: Session, event_id: int, limit: int = 100):
+    """Get all trades for a specific event"""
+    return db.execute(_recent_trades_stmt(event_id, limit)).scalars().all()
+
+async def get_trades_by_event_async(db: AsyncSession, event_id: int, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Get one page of trades for a specific event , returns (trades , next cursor)"""
+    stmt = paginate(_trades_by_event_stmt(event_id), TRADE_PAGE_KEY, cursor, limit)
+    trades, next_cursor = page_of((await db.execute(stmt)).scalars().all(), limit, TRADE_PAGE_ATTRIBUTES)
+    
+    # an archived event has no rows left in the hot table
+    if not trades:
+        return await archive.archived_trades_page_async(db, event_id, cursor, limit) or (trades, next_cursor)
+    
+    return trades, next_cursor
 
-def create_trade(db: Session, trade_data: trade_schema.TradeCreate):
-    """Create a new trade"""
+def get_latest_trades_by_event(db: Session, event_id: int, limit: int = 10):
+    """Get latest trades for an event - useful for price discovery"""
+    return db.execute(_recent_trades_stmt(event_id, limit)).scalars().all()
+
+async def get_latest_trades_by_event_async(db: AsyncSession, event_id: int, limit: int = 10):
+    """Get latest trades for an event - useful for price discovery"""
+    return (await db.execute(_recent_trades_stmt(event_id, limit))).scalars().all()
+
+def get_trades_with_filters(db: Session, query_params: trade_schema.TradeHistoryQuery):
+    """Get trades with various filters"""
+    return db.execute(_trades_with_filters_stmt(query_params)).scalars().all()
+
+async def get_trades_with_filters_async(db: AsyncSession, query_params: trade_schema.TradeHistoryQuery, cursor: Optional[str] = None):
+    """Get one page of trades with various filters , returns (trades , next cursor)"""
+    limit = query_params.limit or DEFAULT_PAGE_SIZE
+    stmt = paginate(_trades_with_filters_stmt(query_params), TRADE_PAGE_KEY, cursor, limit)
+    trades, next_cursor = page_of((await db.execute(stmt)).scalars().all(), limit, TRADE_PAGE_ATTRIBUTES)
+    
+    if not trades and query_params.event_id:
+        return await archive.archived_trades_page_async(
+            db, query_params.event_id, cursor, limit, **_archive_filters(query_params)
+        ) or (trades, next_cursor)
+    
+    return trades, next_cursor
+
+def create_trade(db: Session, trade_data: trade_schema.TradeCreate, commit: bool = True):
+    """Create a new trade , with commit False it is only flushed and the caller commits"""
     db_trade = trade_model.Trade(**trade_data.dict())
     
     db.add(db_trade)
+    if not commit:
+        db.flush()
+        return db_trade
+
     db.commit()
     db.refresh(db_trade)
     return db_trade
@@ -105,13 +210,75 @@ def delete_trade(db: Session, trade_id: int):
     db.commit()
     return db_trade
 
+def _event_trade_totals_stmt(event_id: int):
+    return select(
+        func.count(trade_model.Trade.id).label("total_trades"),
+        func.coalesce(func.sum(trade_model.Trade.quantity), 0).label("total_volume")
+    ).where(trade_model.Trade.event_id == event_id)
+
+def _user_trade_totals_stmt(user_id: int, event_id: Optional[int] = None):
+    bought = trade_model.Trade.buyer_user_id == user_id
+    sold = trade_model.Trade.seller_user_id == user_id
+    value = trade_model.Trade.quantity * trade_model.Trade.price
+    
+    stmt = select(
+        func.coalesce(func.sum(trade_model.Trade.quantity).filter(bought), 0).label("total_bought"),
+        func.coalesce(func.sum(trade_model.Trade.quantity).filter(sold), 0).label("total_sold"),
+        func.coalesce(func.sum(value).filter(bought), 0).label("total_bought_value"),
+        func.coalesce(func.sum(value).filter(sold), 0).label("total_sold_value")
+    ).where(or_(bought, sold))
+    
+    if event_id:
+        stmt = stmt.where(trade_model.Trade.event_id == event_id)
+    
+    return stmt
+
+def _trade_totals_stmt(event_id: Optional[int] = None):
+    stmt = select(
+        func.count(trade_model.Trade.id).label("total_trades"),
+        func.coalesce(func.sum(trade_model.Trade.quantity), 0).label("total_volume"),
+        func.coalesce(func.sum(trade_model.Trade.quantity * trade_model.Trade.price), 0).label("total_value"),
+        func.count(trade_model.Trade.id).filter(trade_model.Trade.type_of_share == trade_enums.TradeShareType.YES).label("yes_trades"),
+        func.count(trade_model.Trade.id).filter(trade_model.Trade.type_of_share == trade_enums.TradeShareType.NO).label("no_trades")
+    )
+    
+    if event_id:
+        stmt = stmt.where(trade_model.Trade.event_id == event_id)
+    
+    return stmt
+
 def get_event_trade_summary(db: Session, event_id: int) -> trade_schema.EventTradeSummary:
     """Get trade summary for a specific event"""
-    trades = db.query(trade_model.Trade).filter(
-        trade_model.Trade.event_id == event_id
-    ).all()
+    totals = db.execute(_event_trade_totals_stmt(event_id)).one()
     
-    if not trades:
+    if not totals.total_trades:
+        return _event_trade_summary(event_id, totals, None, None, [])
+    
+    # Get latest prices for YES and NO shares
+    latest_yes_trade = db.execute(_latest_trade_stmt(event_id, trade_enums.TradeShareType.YES)).scalars().first()
+    latest_no_trade = db.execute(_latest_trade_stmt(event_id, trade_enums.TradeShareType.NO)).scalars().first()
+    
+    recent_trades = db.execute(_recent_trades_stmt(event_id, 10)).scalars().all()
+    
+    return _event_trade_summary(event_id, totals, latest_yes_trade, latest_no_trade, recent_trades)
+
+async def get_event_trade_summary_async(db: AsyncSession, event_id: int) -> trade_schema.EventTradeSummary:
+    """Get trade summary for a specific event"""
+    totals = (await db.execute(_event_trade_totals_stmt(event_id))).one()
+    
+    if not totals.total_trades:
+        return _event_trade_summary(event_id, totals, None, None, [])
+    
+    # Get latest prices for YES and NO shares
+    latest_yes_trade = (await db.execute(_latest_trade_stmt(event_id, trade_enums.TradeShareType.YES))).scalars().first()
+    latest_no_trade = (await db.execute(_latest_trade_stmt(event_id, trade_enums.TradeShareType.NO))).scalars().first()
+    
+    recent_trades = (await db.execute(_recent_trades_stmt(event_id, 10))).scalars().all()
+    
+    return _event_trade_summary(event_id, totals, latest_yes_trade, latest_no_trade, recent_trades)
+
+def _event_trade_summary(event_id: int, totals, latest_yes_trade, latest_no_trade, recent_trades) -> trade_schema.EventTradeSummary:
+    if not totals.total_trades:
         return trade_schema.EventTradeSummary(
             event_id=event_id,
             total_trades=0,
@@ -121,34 +288,16 @@ def get_event_trade_summary(db: Session, event_id: int) -> trade_schema.EventTra
             price_trend=None
         )
     
-    total_trades = len(trades)
-    total_volume = sum([t.quantity for t in trades])
-    
-    # Get latest prices for YES and NO shares
-    latest_yes_trade = db.query(trade_model.Trade).filter(
-        and_(
-            trade_model.Trade.event_id == event_id,
-            trade_model.Trade.type_of_share == trade_enums.TradeShareType.YES
-        )
-    ).order_by(desc(trade_model.Trade.executed_at)).first()
-    
-    latest_no_trade = db.query(trade_model.Trade).filter(
-        and_(
-            trade_model.Trade.event_id == event_id,
-            trade_model.Trade.type_of_share == trade_enums.TradeShareType.NO
-        )
-    ).order_by(desc(trade_model.Trade.executed_at)).first()
-    
     latest_price_yes = latest_yes_trade.price if latest_yes_trade else None
     latest_price_no = latest_no_trade.price if latest_no_trade else None
     
     # Calculate price trend (simplified - you might want more sophisticated logic)
-    price_trend = _calculate_price_trend(db, event_id)
+    price_trend = _price_trend(recent_trades)
     
     return trade_schema.EventTradeSummary(
         event_id=event_id,
-        total_trades=total_trades,
-        total_volume=total_volume,
+        total_trades=totals.total_trades,
+        total_volume=totals.total_volume,
         latest_price_yes=latest_price_yes,
         latest_price_no=latest_price_no,
         price_trend=price_trend
@@ -156,71 +305,49 @@ def get_event_trade_summary(db: Session, event_id: int) -> trade_schema.EventTra
 
 def get_user_trade_summary(db: Session, user_id: int, event_id: Optional[int] = None) -> trade_schema.UserTradeSummary:
     """Get trade summary for a specific user"""
-    query = db.query(trade_model.Trade).filter(
-        or_(
-            trade_model.Trade.buyer_user_id == user_id,
-            trade_model.Trade.seller_user_id == user_id
-        )
-    )
-    
-    if event_id:
-        query = query.filter(trade_model.Trade.event_id == event_id)
-    
-    trades = query.all()
+    totals = db.execute(_user_trade_totals_stmt(user_id, event_id)).one()
     
-    bought_trades = [t for t in trades if t.buyer_user_id == user_id]
-    sold_trades = [t for t in trades if t.seller_user_id == user_id]
-    
-    total_bought = sum([t.quantity for t in bought_trades])
-    total_sold = sum([t.quantity for t in sold_trades])
-    total_bought_value = sum([t.quantity * t.price for t in bought_trades])
-    total_sold_value = sum([t.quantity * t.price for t in sold_trades])
-    
-    net_position = total_bought - total_sold
+    return _user_trade_summary(user_id, totals)
+
+async def get_user_trade_summary_async(db: AsyncSession, user_id: int, event_id: Optional[int] = None) -> trade_schema.UserTradeSummary:
+    """Get trade summary for a specific user"""
+    totals = (await db.execute(_user_trade_totals_stmt(user_id, event_id))).one()
     
+    return _user_trade_summary(user_id, totals)
+
+def _user_trade_summary(user_id: int, totals) -> trade_schema.UserTradeSummary:
     return trade_schema.UserTradeSummary(
         user_id=user_id,
-        total_bought=total_bought,
-        total_sold=total_sold,
-        total_bought_value=total_bought_value,
-        total_sold_value=total_sold_value,
-        net_position=net_position
+        total_bought=totals.total_bought,
+        total_sold=totals.total_sold,
+        total_bought_value=totals.total_bought_value,
+        total_sold_value=totals.total_sold_value,
+        net_position=totals.total_bought - totals.total_sold
     )
 
 def get_trade_summary(db: Session, event_id: Optional[int] = None) -> trade_schema.TradeSummary:
     """Get overall trade summary"""
-    query = db.query(trade_model.Trade)
-    
-    if event_id:
-        query = query.filter(trade_model.Trade.event_id == event_id)
-    
-    trades = query.all()
-    
-    if not trades:
-        return trade_schema.TradeSummary(
-            total_trades=0,
-            total_volume=0,
-            total_value=0,
-            average_price=0.0,
-            yes_trades=0,
-            no_trades=0
-        )
+    totals = db.execute(_trade_totals_stmt(event_id)).one()
     
-    total_trades = len(trades)
-    total_volume = sum([t.quantity for t in trades])
-    total_value = sum([t.quantity * t.price for t in trades])
-    average_price = total_value / total_volume if total_volume > 0 else 0.0
+    return _trade_summary(totals)
+
+async def get_trade_summary_async(db: AsyncSession, event_id: Optional[int] = None) -> trade_schema.TradeSummary:
+    """Get overall trade summary"""
+    totals = (await db.execute(_trade_totals_stmt(event_id))).one()
     
-    yes_trades = len([t for t in trades if t.type_of_share == trade_enums.TradeShareType.YES])
-    no_trades = len([t for t in trades if t.type_of_share == trade_enums.TradeShareType.NO])
+    return _trade_summary(totals)
+
+def _trade_summary(totals) -> trade_schema.TradeSummary:
+    total_volume = totals.total_volume
+    average_price = totals.total_value / total_volume if total_volume > 0 else 0.0
     
     return trade_schema.TradeSummary(
-        total_trades=total_trades,
+        total_trades=totals.total_trades,
         total_volume=total_volume,
-        total_value=total_value,
+        total_value=totals.total_value,
         average_price=average_price,
-        yes_trades=yes_trades,
-        no_trades=no_trades
+        yes_trades=totals.yes_trades,
+        no_trades=totals.no_trades
     )
 
 def get_price_history(db: Session, event_id: int, share_type: trade_enums.TradeShareType, limit: int = 100):
@@ -232,6 +359,64 @@ def get_price_history(db: Session, event_id: int, share_type: trade_enums.TradeS
         )
     ).order_by(desc(trade_model.Trade.executed_at)).limit(limit).all()
 
+def get_candles(event_id: int, share_type: trade_enums.TradeShareType, interval: trade_enums.CandleInterval,
+                start: Optional[int] = None, end: Optional[int] = None, limit: int = 500) -> trade_schema.CandleSeries:
+    """Precomputed OHLCV buckets of an event , maintained by the engine on every fill"""
+    candles = getCandles(event_id, share_type.value, interval.value, start, end, limit)
+    
+    return trade_schema.CandleSeries(
+        event_id=event_id,
+        type_of_share=share_type,
+        interval=interval,
+        candles=candles
+    )
+
+def _export_value(value):
+    if isinstance(value, trade_enums.TradeShareType):
+        return value.value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def _format_trade_rows(rows, export_format: trade_enums.ExportFormat) -> str:
+    if export_format == trade_enums.ExportFormat.NDJSON:
+        return "".join(
+            json.dumps(dict(zip(TRADE_EXPORT_COLUMNS, map(_export_value, row))), separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([map(_export_value, row) for row in rows])
+    return buffer.getvalue()
+
+async def export_trades(db: AsyncSession, query_params: trade_schema.TradeHistoryQuery,
+                        export_format: trade_enums.ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Every trade matching the filters , oldest first , as CSV or NDJSON chunks.
+    Read through a server side cursor , or the archive file of an archived event ,
+    one batch at a time , memory stays flat however many trades there are
+    """
+    if export_format == trade_enums.ExportFormat.CSV:
+        header = io.StringIO()
+        csv.writer(header).writerow(TRADE_EXPORT_COLUMNS)
+        yield header.getvalue().encode()
+
+    # an archived event has no rows left in the hot table , its file is streamed instead
+    entry = await archive.get_archived_event_async(db, query_params.event_id) if query_params.event_id else None
+    if entry is not None:
+        batches = archive.iter_trade_rows(entry, TRADE_EXPORT_COLUMNS, **_archive_filters(query_params))
+        while True:
+            # file reads stay off the loop
+            rows = await asyncio.to_thread(next, batches, None)
+            if rows is None:
+                return
+            yield _format_trade_rows(rows, export_format).encode()
+
+    stmt = _trade_export_stmt(query_params).execution_options(yield_per=TRADE_EXPORT_BATCH_SIZE)
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield _format_trade_rows(rows, export_format).encode()
+
 def get_volume_by_price(db: Session, event_id: int, share_type: trade_enums.TradeShareType):
     """Get volume traded at each price point"""
     result = db.query(
@@ -248,10 +433,12 @@ def get_volume_by_price(db: Session, event_id: int, share_type: trade_enums.Trad
 
 def _calculate_price_trend(db: Session, event_id: int) -> Optional[str]:
     """Calculate price trend for an event (simplified logic)"""
-    recent_trades = db.query(trade_model.Trade).filter(
-        trade_model.Trade.event_id == event_id
-    ).order_by(desc(trade_model.Trade.executed_at)).limit(10).all()
+    recent_trades = db.execute(_recent_trades_stmt(event_id, 10)).scalars().all()
     
+    return _price_trend(recent_trades)
+
+def _price_trend(recent_trades) -> Optional[str]:
+    """Price trend from the latest trades , newest first"""
     if len(recent_trades) < 2:
         return "stable"
     
@@ -267,4 +454,4 @@ def _calculate_price_trend(db: Session, event_id: int) -> Optional[str]:
         else:
             return "stable"
     
-    return "stable"
\ No newline at end of file
+    return "stable"
@@ -1,21 +1,13 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from passlib.context import CryptContext
+from sqlalchemy import or_, select
 from typing import Optional
 
 from ..schemas import user_schema
 from ..model import user_model
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+from ..service.pagination import paginate, page_of, DEFAULT_PAGE_SIZE
+from ..service.user_cache import user_cache
+from ..service.password import hash_password, verify_password
+from ..service.api_key import api_keys, delete_keys_by_user
 
 def get_user_by_id(db: Session, id: int):
     """Get user by ID"""
@@ -38,9 +30,10 @@ def get_user_by_username_or_email(db: Session, username_or_email: str):
         )
     ).first()
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    """Get all users with pagination"""
-    return db.query(user_model.User).offset(skip).limit(limit).all()
+def get_all_users(db: Session, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Get one page of users in id order , returns (users , next cursor)"""
+    stmt = paginate(select(user_model.User), [user_model.User.id], cursor, limit, descending=False)
+    return page_of(db.execute(stmt).scalars().all(), limit, ["id"])
 
 def create_user(db: Session, user: user_schema.UserCreate):
     """Create a new user"""
@@ -65,7 +58,8 @@ def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, _ = verify_password(password, user.hashed_password)
+    if not valid:
         return False
     return user
 
@@ -81,20 +75,24 @@ def update_user_balance(db: Session, user_id: int, new_balance: int):
     db.refresh(db_user)
     return db_user
 
-def add_to_user_balance(db: Session, user_id: int, amount: int):
-    """Add amount to user's current balance"""
+def add_to_user_balance(db: Session, user_id: int, amount: int, commit: bool = True):
+    """Add amount to user's current balance , with commit False the caller commits"""
     db_user = db.query(user_model.User).filter(user_model.User.id == user_id).first()
     
     if not db_user:
         return None
     
     db_user.current_balance += amount
+    if not commit:
+        db.flush()
+        return db_user
+
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def deduct_from_user_balance(db: Session, user_id: int, amount: int):
-    """Deduct amount from user's current balance"""
+def deduct_from_user_balance(db: Session, user_id: int, amount: int, commit: bool = True):
+    """Deduct amount from user's current balance , with commit False the caller commits"""
     db_user = db.query(user_model.User).filter(user_model.User.id == user_id).first()
     
     if not db_user:
@@ -105,6 +103,10 @@ def deduct_from_user_balance(db: Session, user_id: int, amount: int):
         return False  # Insufficient balance
     
     db_user.current_balance -= amount
+    if not commit:
+        db.flush()
+        return db_user
+
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -119,6 +121,9 @@ def update_user_admin_status(db: Session, user_id: int, is_admin: bool):
     db_user.is_admin = is_admin
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.username)
+    # principals of the user's api keys carry the flag too
+    api_keys.changed()
     return db_user
 
 def update_user_password(db: Session, user_id: int, new_password: str):
@@ -134,6 +139,7 @@ def update_user_password(db: Session, user_id: int, new_password: str):
     
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.username)
     return db_user
 
 def delete_user(db: Session, user_id: int):
@@ -143,8 +149,11 @@ def delete_user(db: Session, user_id: int):
     if not db_user:
         return None
     
+    delete_keys_by_user(db, user_id)
     db.delete(db_user)
     db.commit()
+    user_cache.invalidate(db_user.username)
+    api_keys.changed()
     return db_user
 
 def get_users_by_admin_status(db: Session, is_admin: bool, skip: int = 0, limit: int = 100):
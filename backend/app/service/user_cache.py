@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from ..service.redis_service import redis_client
+
+# tokens kept per worker , the least recently used goes first
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# seconds a cached principal is trusted , never past the expiry of its token
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+# seconds between two checks for invalidations published by other workers
+USER_CACHE_SYNC_INTERVAL = float(os.getenv("USER_CACHE_SYNC_INTERVAL", "1"))
+# invalidations kept in redis for workers that fell behind , older ones clear the whole cache
+USER_INVALIDATION_HISTORY = int(os.getenv("USER_INVALIDATION_HISTORY", "10000"))
+
+_VERSION_KEY = "user_cache:version"
+_INVALIDATIONS_KEY = "user_cache:invalidations"
+
+# bumps the version and records the user under it , atomically so no worker reads
+# a version whose invalidation isn't there yet. Members are "version:username"
+_invalidate_script = redis_client.register_script("""
+local version = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], version, version .. ':' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+return version
+""")
+
+
+class Principal:
+    """The caller of a request , only what handlers check"""
+
+    __slots__ = ("id", "username", "email", "is_admin", "scopes")
+
+    def __init__(self, id: int, username: str, email: str, is_admin: bool, scopes: Optional[frozenset] = None):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = is_admin
+        # scopes of the api key the request was signed with , None for a login token
+        self.scopes = scopes
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(user.id, user.username, user.email, bool(user.is_admin))
+
+
+class UserCache:
+    """Bounded LRU of token -> principal , with a ttl and invalidation by username"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        # token -> (principal , monotonic expiry)
+        self.entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self.tokens_by_user: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+        # bumped by every invalidation , a lookup that raced one doesn't cache its result
+        self.generation = 0
+        # last redis version applied , None before the first sync
+        self.version: Optional[int] = None
+        self.synced_at = 0.0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def get(self, token: str) -> Optional[Principal]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None or now >= entry[1]:
+                if entry is not None:
+                    self._remove(token)
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(token)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, generation: int, token_expires_at: Optional[float] = None):
+        """Cache a principal looked up when the cache was at generation"""
+        expires_at = time.monotonic() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, time.monotonic() + token_expires_at - time.time())
+
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            if token in self.entries:
+                self._remove(token)
+            self.entries[token] = (principal, expires_at)
+            self.tokens_by_user.setdefault(principal.username, set()).add(token)
+
+            while len(self.entries) > self.size:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def forget(self, usernames: Iterable[str]):
+        """Drop the cached tokens of users in this worker"""
+        with self.lock:
+            self.generation += 1
+            for username in usernames:
+                for token in self.tokens_by_user.pop(username, ()):
+                    self.entries.pop(token, None)
+                    self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.tokens_by_user.clear()
+
+    def claim_sync(self) -> bool:
+        """True for the one caller that should sync now"""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.synced_at < USER_CACHE_SYNC_INTERVAL:
+                return False
+            self.synced_at = now
+            return True
+
+    def sync(self):
+        """Apply the invalidations other workers published since the last sync"""
+        try:
+            version = int(redis_client.get(_VERSION_KEY) or 0)
+            if self.version is None or version == self.version:
+                self.version = version
+                return
+
+            changes = redis_client.zrangebyscore(_INVALIDATIONS_KEY, self.version + 1, version)
+            if len(changes) < version - self.version:
+                # part of the history was trimmed , nothing cached can be trusted
+                self.clear()
+            else:
+                self.forget({change.split(":", 1)[1] for change in changes})
+            self.version = version
+        except Exception as e:
+            # invalidations of other workers can't be seen , stop trusting the cache
+            print(f"Error syncing user cache: {e}")
+            self.clear()
+
+    def invalidate(self, username: str):
+        """Drop a user from the cache of this worker and of every other one"""
+        self.forget([username])
+        try:
+            _invalidate_script(keys=[_VERSION_KEY, _INVALIDATIONS_KEY], args=[username, USER_INVALIDATION_HISTORY])
+        except Exception as e:
+            print(f"Error publishing invalidation of user {username}: {e}")
+
+    def cache_stats(self) -> Dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "capacity": self.size,
+                "version": self.version,
+                **self.stats
+            }
+
+    def _remove(self, token: str):
+        principal, _ = self.entries.pop(token)
+        tokens = self.tokens_by_user.get(principal.username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[principal.username]
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
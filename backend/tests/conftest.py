@@ -0,0 +1,57 @@
+"""
+Shared test setup.
+
+The app reads its settings at import , so they have to be in the environment before
+any test module imports it. Without DATABASE_URL a scratch sqlite file stands in ,
+the tests that need a real database skip on TEST_SCRATCH_DATABASE and the ones that
+create and drop every table only run on it.
+"""
+import os
+import tempfile
+
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "scratch.db")
+    os.environ["TEST_SCRATCH_DATABASE"] = "true"
+
+os.environ.setdefault("DB_ECHO", "false")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# a fixed fernet key , tests don't need a secret one
+os.environ.setdefault("API_KEY_ENCRYPTION_KEY", "dGVzdC1hcGkta2V5LWVuY3J5cHRpb24ta2V5LTMyYiE=")
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point both redis pools at an in-memory server , scripts included"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.service import redis_service
+
+    server = fakeredis.FakeServer()
+    for pool in (redis_service.redis_pool, redis_service.redis_binary_pool):
+        # connections made before keep their server , start the pool over
+        pool.disconnect()
+        pool.reset()
+        monkeypatch.setattr(pool, "connection_class", fakeredis.FakeConnection)
+        monkeypatch.setitem(pool.connection_kwargs, "server", server)
+    yield server
+    for pool in (redis_service.redis_pool, redis_service.redis_binary_pool):
+        pool.disconnect()
+        pool.reset()
+
+
+@pytest.fixture
+def database():
+    """Every table of the models on the scratch sqlite database , dropped after the test"""
+    if not os.getenv("TEST_SCRATCH_DATABASE"):
+        pytest.skip("only runs on the scratch sqlite database")
+
+    from app.database import Base, engine
+    from app.model import (api_key_model, archived_event_model, event_model, order_model, outbox_model,
+                           portfolio_model, settlement_job_model, trade_model, user_model)
+
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
@@ -0,0 +1,30 @@
+"""
+API key test , a key gets a random secret that is stored encrypted and doesn't depend
+on the jwt signing key.
+"""
+from app.database import SessionLocal
+from app.enums import api_key_enums
+from app.model import api_key_model, user_model
+from app.service import api_key
+
+
+def test_issued_secret_is_random_and_stored_encrypted(database, fake_redis, monkeypatch):
+    db = SessionLocal()
+    try:
+        user = user_model.User(username="bot", email="bot@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+
+        db_key, secret = api_key.issue_key(db, user.id, "market maker", [api_key_enums.ApiKeyScope.TRADE])
+        stored = db.get(api_key_model.ApiKey, db_key.id).secret_encrypted
+    finally:
+        db.close()
+
+    assert secret != api_key.derive_secret(db_key.key_id)
+    assert secret not in stored
+    assert api_key.api_keys.get(db_key.key_id).secret == secret
+
+    # rotating the jwt key leaves the key working
+    monkeypatch.setattr(api_key, "SECRET_KEY", "rotated")
+    api_key.api_keys.load()
+    assert api_key.api_keys.get(db_key.key_id).secret == secret
@@ -0,0 +1,116 @@
+"""
+Matching engine test , places orders through the order service against the scratch
+sqlite database and an in-memory redis , and checks that a fill writes the trade ,
+both positions , both balances and its outbox messages together.
+"""
+import pytest
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.enums import event_enums, order_enums, outbox_enums, portfolio_enums
+from app.model import event_model, order_model, outbox_model, portfolio_model, trade_model, user_model
+from app.schemas import order_schema
+from app.service import order as order_service
+from app.service import orderbook
+
+
+@pytest.fixture
+def market(database, fake_redis):
+    """An ongoing event , a seller holding 5 YES shares and a buyer with a balance of 100"""
+    db = SessionLocal()
+    try:
+        seller = user_model.User(username="seller", email="seller@example.com", hashed_password="x", current_balance=0)
+        buyer = user_model.User(username="buyer", email="buyer@example.com", hashed_password="x", current_balance=100)
+        db.add_all([seller, buyer])
+        db.flush()
+
+        event = event_model.Event(title="rain tomorrow", created_by=seller.id, status=event_enums.EventStatus.ONGOING)
+        db.add(event)
+        db.flush()
+
+        db.add(portfolio_model.Portfolio(user_id=seller.id, event_id=event.id, quantity=5,
+                                         type_of_share=portfolio_enums.ShareType.YES))
+        db.commit()
+        yield {"seller": seller.id, "buyer": buyer.id, "event": event.id}
+    finally:
+        db.close()
+
+
+def _place(user_id: int, event_id: int, side: order_enums.OrderSide, quantity: int, price: int):
+    db = SessionLocal()
+    try:
+        return order_service.create_order(db, order_schema.OrderCreate(
+            event_id=event_id,
+            total_quantity=quantity,
+            price=price,
+            type_of_share=order_enums.OrderShareType.YES,
+            side=side
+        ), user_id).id
+    finally:
+        db.close()
+
+
+def _state(market):
+    db = SessionLocal()
+    try:
+        balances = dict(db.execute(select(user_model.User.id, user_model.User.current_balance)).all())
+        positions = dict(db.execute(select(portfolio_model.Portfolio.user_id, portfolio_model.Portfolio.quantity)).all())
+        trades = db.execute(select(trade_model.Trade)).scalars().all()
+        outbox = [row.kind for row in db.execute(select(outbox_model.OutboxEvent).order_by(outbox_model.OutboxEvent.id)).scalars()]
+        return {
+            "seller_balance": balances[market["seller"]],
+            "buyer_balance": balances[market["buyer"]],
+            "seller_shares": positions.get(market["seller"], 0),
+            "buyer_shares": positions.get(market["buyer"], 0),
+            "trades": [(trade.price, trade.quantity) for trade in trades],
+            "outbox": outbox
+        }
+    finally:
+        db.close()
+
+
+def test_crossing_orders_fill_at_the_resting_price(market):
+    _place(market["seller"], market["event"], order_enums.OrderSide.SELL, 3, 4)
+    buy_id = _place(market["buyer"], market["event"], order_enums.OrderSide.BUY, 2, 5)
+
+    state = _state(market)
+    assert state["trades"] == [(4, 2)]
+    assert (state["seller_balance"], state["buyer_balance"]) == (8, 92)
+    assert (state["seller_shares"], state["buyer_shares"]) == (3, 2)
+    # the resting sell's book message , then the trade , then the filled buy's book message
+    assert state["outbox"] == [outbox_enums.OutboxKind.BOOK, outbox_enums.OutboxKind.TRADE, outbox_enums.OutboxKind.BOOK]
+
+    db = SessionLocal()
+    try:
+        buy = db.get(order_model.Order, buy_id)
+        assert (buy.filled_quantity, buy.status) == (2, order_enums.OrderStatus.COMPLETELYFILLED)
+    finally:
+        db.close()
+
+    # one YES share left at 4 on the ask side
+    bbo = orderbook.get_bbo(market["event"])
+    assert bbo["YES"]["best_ask"] == 4
+
+
+def test_a_failed_fill_writes_nothing(market, monkeypatch):
+    sell_id = _place(market["seller"], market["event"], order_enums.OrderSide.SELL, 3, 4)
+    before = _state(market)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("balance update failed")
+
+    monkeypatch.setattr(orderbook, "deduct_from_user_balance", fail)
+
+    db = SessionLocal()
+    try:
+        sell = db.get(order_model.Order, sell_id)
+        buy = order_model.Order(id=sell_id + 1, user_id=market["buyer"], event_id=market["event"], total_quantity=2,
+                                filled_quantity=0, price=5, type_of_share=order_enums.OrderShareType.YES,
+                                side=order_enums.OrderSide.BUY, status=order_enums.OrderStatus.INCOMPLETE)
+        with pytest.raises(RuntimeError):
+            orderbook.addTrade(2, 4, sell, buy)
+    finally:
+        db.close()
+
+    # no trade , no position or balance move and nothing for the relay to publish
+    assert _state(market) == before
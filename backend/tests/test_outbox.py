@@ -0,0 +1,92 @@
+"""
+Outbox relay test , the relay's stored position survives a restart and a batch that
+was delivered but not stored goes out again.
+"""
+import asyncio
+
+import pytest
+
+from app.database import SessionLocal, async_engine
+from app.enums import event_enums, outbox_enums
+from app.model import event_model, user_model
+from app.service import outbox
+
+
+@pytest.fixture
+def event_id(database):
+    db = SessionLocal()
+    try:
+        user = user_model.User(username="admin", email="admin@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        event = event_model.Event(title="rain tomorrow", created_by=user.id, status=event_enums.EventStatus.ONGOING)
+        db.add(event)
+        db.commit()
+        yield event.id
+    finally:
+        db.close()
+
+
+def _record(event_id: int, count: int):
+    db = SessionLocal()
+    try:
+        for _ in range(count):
+            outbox.record(db, event_id, outbox_enums.OutboxKind.TRADE, {"quantity": 1})
+        db.commit()
+    finally:
+        db.close()
+
+
+class RecordingRelay(outbox.OutboxRelay):
+    def __init__(self):
+        super().__init__()
+        self.delivered = []
+
+    async def _deliver(self, batch):
+        self.delivered.extend(row.id for row in batch)
+
+
+def _relay(relay: outbox.OutboxRelay) -> int:
+    async def run():
+        # normally made by start() on the app's loop
+        relay.lock = asyncio.Lock()
+        try:
+            return await relay.relay_pending()
+        finally:
+            # the pool's connections belong to this loop
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_a_restarted_relay_resumes_from_its_stored_position(event_id):
+    _record(event_id, 2)
+    first = RecordingRelay()
+    # a relay seen for the first time starts at the tail
+    assert _relay(first) == 0
+
+    _record(event_id, 3)
+    assert _relay(first) == 3
+
+    _record(event_id, 1)
+    restarted = RecordingRelay()
+    assert _relay(restarted) == 1
+    assert restarted.delivered == [first.delivered[-1] + 1]
+
+
+def test_a_batch_delivered_but_not_stored_is_delivered_again(event_id, monkeypatch):
+    relay = RecordingRelay()
+    _relay(relay)
+    _record(event_id, 2)
+
+    async def crash(last_id):
+        raise RuntimeError("process died")
+
+    monkeypatch.setattr(relay, "_save_position", crash)
+    with pytest.raises(RuntimeError):
+        _relay(relay)
+    assert len(relay.delivered) == 2
+
+    restarted = RecordingRelay()
+    assert _relay(restarted) == 2
+    assert restarted.delivered == relay.delivered
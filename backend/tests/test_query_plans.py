@@ -0,0 +1,196 @@
+"""
+Query plan regression test for the hot read paths.
+
+Seeds a realistic volume of users , events , orders , trades and positions inside a
+transaction , refreshes planner statistics , runs EXPLAIN on every hot query and
+fails if any of them falls back to a sequential scan. The transaction is rolled
+back at the end , nothing is left behind in the database.
+
+    DATABASE_URL=postgresql://... pytest tests/test_query_plans.py
+    QUERY_PLAN_ORDERS=50000 pytest tests/test_query_plans.py
+
+Skipped without DATABASE_URL , or when the database isn't migrated.
+"""
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+
+if os.getenv("TEST_SCRATCH_DATABASE"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import func, inspect, insert, select, text
+from sqlalchemy.engine import Connection
+
+from app.database import Base, engine
+from app.enums import event_enums, order_enums, portfolio_enums, trade_enums
+from app.model import event_model, order_model, portfolio_model, trade_model, user_model
+from app.service import trade as trade_service
+
+SEED_USERS = int(os.getenv("QUERY_PLAN_USERS", "500"))
+SEED_EVENTS = int(os.getenv("QUERY_PLAN_EVENTS", "50"))
+SEED_ORDERS = int(os.getenv("QUERY_PLAN_ORDERS", "20000"))
+SEED_TRADES = int(os.getenv("QUERY_PLAN_TRADES", "20000"))
+
+
+def _next_id(conn: Connection, table) -> int:
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def seed(conn: Connection, users: int, events: int, orders: int, trades: int) -> Dict[str, int]:
+    """Insert the seed rows with explicit ids , returns one id of each kind to query with"""
+    rnd = random.Random(7)
+    user_table = user_model.User.__table__
+    event_table = event_model.Event.__table__
+    order_table = order_model.Order.__table__
+    trade_table = trade_model.Trade.__table__
+    portfolio_table = portfolio_model.Portfolio.__table__
+
+    first_user = _next_id(conn, user_table)
+    user_ids = list(range(first_user, first_user + users))
+    conn.execute(insert(user_table), [{
+        "id": user_id,
+        "username": f"__plan_seed_{user_id}",
+        "email": f"__plan_seed_{user_id}@example.com",
+        "hashed_password": "x",
+        "is_admin": False,
+        "current_balance": 0
+    } for user_id in user_ids])
+
+    first_event = _next_id(conn, event_table)
+    event_ids = list(range(first_event, first_event + events))
+    conn.execute(insert(event_table), [{
+        "id": event_id,
+        "title": f"__plan_seed_{event_id}",
+        "created_by": user_ids[0],
+        "status": event_enums.EventStatus.ONGOING
+    } for event_id in event_ids])
+
+    first_order = _next_id(conn, order_table)
+    order_ids = list(range(first_order, first_order + orders))
+    conn.execute(insert(order_table), [{
+        "id": order_id,
+        "user_id": rnd.choice(user_ids),
+        "event_id": rnd.choice(event_ids),
+        "total_quantity": 10,
+        "filled_quantity": 0,
+        "price": rnd.randint(1, 10),
+        "type_of_share": rnd.choice(list(order_enums.OrderShareType)),
+        "side": rnd.choice(list(order_enums.OrderSide)),
+        "status": rnd.choice(list(order_enums.OrderStatus))
+    } for order_id in order_ids])
+
+    first_trade = _next_id(conn, trade_table)
+    conn.execute(insert(trade_table), [{
+        "id": trade_id,
+        "event_id": rnd.choice(event_ids),
+        "price": rnd.randint(1, 10),
+        "quantity": rnd.randint(1, 10),
+        "type_of_share": rnd.choice(list(trade_enums.TradeShareType)),
+        "buyer_user_id": rnd.choice(user_ids),
+        "seller_user_id": rnd.choice(user_ids),
+        "buyer_order_id": rnd.choice(order_ids),
+        "seller_order_id": rnd.choice(order_ids)
+    } for trade_id in range(first_trade, first_trade + trades)])
+
+    first_position = _next_id(conn, portfolio_table)
+    positions = [
+        (user_id, event_id, share_type)
+        for user_id in user_ids
+        for event_id in rnd.sample(event_ids, min(5, len(event_ids)))
+        for share_type in portfolio_enums.ShareType
+    ]
+    conn.execute(insert(portfolio_table), [{
+        "id": first_position + i,
+        "user_id": user_id,
+        "event_id": event_id,
+        "quantity": rnd.randint(1, 100),
+        "type_of_share": share_type
+    } for i, (user_id, event_id, share_type) in enumerate(positions)])
+
+    return {"user_id": user_ids[len(user_ids) // 2], "event_id": event_ids[len(event_ids) // 2]}
+
+
+def hot_queries(user_id: int, event_id: int) -> List[Tuple[str, object]]:
+    """(name , statement) of every query that must stay on an index"""
+    Order = order_model.Order
+    Portfolio = portfolio_model.Portfolio
+
+    return [
+        ("orders by user", select(Order).where(Order.user_id == user_id).order_by(Order.id.desc()).limit(50)),
+        ("open orders by event", select(Order).where(
+            Order.event_id == event_id,
+            Order.status == order_enums.OrderStatus.INCOMPLETE
+        )),
+        ("recent trades by event", trade_service._recent_trades_stmt(event_id, 50)),
+        ("trades by user", trade_service._trades_by_user_stmt(user_id)),
+        ("position lookup", select(Portfolio).where(
+            Portfolio.user_id == user_id,
+            Portfolio.event_id == event_id,
+            Portfolio.type_of_share == portfolio_enums.ShareType.YES
+        )),
+        ("positions by user", select(Portfolio).where(Portfolio.user_id == user_id)),
+    ]
+
+
+def _postgres_seq_scans(conn: Connection, sql: str) -> List[str]:
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node.get("Relation Name"))
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def _sqlite_seq_scans(conn: Connection, sql: str) -> List[str]:
+    scans = []
+    for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql)):
+        detail = row[-1]
+        # "SCAN orders" is a full scan , "SEARCH ..." / "SCAN orders USING INDEX ..." are not
+        if detail.startswith("SCAN") and "INDEX" not in detail:
+            scans.append(detail.split()[1])
+    return scans
+
+
+# ids are only known once seeded , the queries are built per test from their name
+HOT_QUERY_NAMES = [name for name, _ in hot_queries(0, 0)]
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """Connection with the seed rows and fresh statistics , rolled back after the module"""
+    try:
+        tables = set(inspect(engine).get_table_names())
+    except Exception as e:
+        pytest.skip(f"database unreachable: {e}")
+    missing = sorted(set(Base.metadata.tables) - tables)
+    if missing:
+        pytest.skip(f"database schema is missing tables {missing} , run alembic upgrade head")
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            ids = seed(conn, SEED_USERS, SEED_EVENTS, SEED_ORDERS, SEED_TRADES)
+            conn.execute(text("ANALYZE"))
+            yield conn, ids
+        finally:
+            transaction.rollback()
+
+
+@pytest.mark.parametrize("name", HOT_QUERY_NAMES)
+def test_hot_query_uses_an_index(seeded, name):
+    conn, ids = seeded
+    stmt = dict(hot_queries(ids["user_id"], ids["event_id"]))[name]
+    find_scans = _postgres_seq_scans if conn.dialect.name == "postgresql" else _sqlite_seq_scans
+
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    scans = find_scans(conn, sql)
+    assert not scans, f"{name}: sequential scan on {', '.join(scans)}"
@@ -0,0 +1,39 @@
+"""
+Rate limit identity test , callers behind a trusted proxy get their own address bucket
+and a forged X-Forwarded-For from anyone else is ignored.
+"""
+import ipaddress
+
+import pytest
+from starlette.datastructures import Headers
+
+from app.service import rate_limit
+
+
+@pytest.fixture
+def behind_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def _identity(client: str, forwarded_for: str = None) -> str:
+    headers = Headers({"x-forwarded-for": forwarded_for} if forwarded_for else {})
+    scope = {"client": (client, 40000), "method": "POST", "path": "/auth/login", "query_string": b""}
+    return rate_limit.limiter.identity_of(scope, headers, "auth")
+
+
+def test_clients_behind_the_proxy_get_their_own_bucket(behind_proxy):
+    assert _identity("10.0.0.5", "203.0.113.7") == "ip:203.0.113.7"
+    assert _identity("10.0.0.5", "198.51.100.2") == "ip:198.51.100.2"
+
+
+def test_only_the_hops_added_by_trusted_proxies_count(behind_proxy):
+    # the client prepended a made up address , the proxies appended the real one
+    assert _identity("10.0.0.5", "1.2.3.4, 203.0.113.7, 10.0.0.9") == "ip:203.0.113.7"
+
+
+def test_forwarded_for_from_an_untrusted_peer_is_ignored(behind_proxy):
+    assert _identity("203.0.113.7", "1.2.3.4") == "ip:203.0.113.7"
+
+
+def test_without_trusted_proxies_the_peer_address_counts():
+    assert _identity("10.0.0.5", "203.0.113.7") == "ip:10.0.0.5"
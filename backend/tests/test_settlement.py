@@ -0,0 +1,70 @@
+"""
+Settlement test , pays out an event against the scratch sqlite database. Checks that the
+chunked payout replays the per row rule , a debit the payer can't cover is skipped.
+"""
+import pytest
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.enums import event_enums, portfolio_enums
+from app.model import event_model, portfolio_model, trade_model, user_model
+from app.service import settlement
+
+
+def _balances(db):
+    db.expire_all()
+    return dict(db.execute(select(user_model.User.id, user_model.User.current_balance)).all())
+
+
+def test_replay_skips_a_debit_the_payer_cant_cover():
+    balances = {1: 15, 2: 0, 3: 0, 4: 0, 5: 3}
+    settlement._replay_payouts(balances, [(1, 2, 10), (1, 3, 10), (1, 4, 10), (5, 1, 10)])
+
+    # the admin pays the first winner , can't cover the next two , then the loser can't pay it
+    assert balances == {1: 15, 2: 10, 3: 10, 4: 10, 5: 3}
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_settle_chunk_matches_the_per_row_payout(db):
+    """The admin holding 15 against 3 winners and 1 loser who can't pay ends at 15"""
+    admin = user_model.User(username="admin", email="admin@example.com", hashed_password="x",
+                            is_admin=True, current_balance=15)
+    winners = [user_model.User(username=f"winner{i}", email=f"winner{i}@example.com", hashed_password="x",
+                               current_balance=0) for i in range(3)]
+    loser = user_model.User(username="loser", email="loser@example.com", hashed_password="x", current_balance=3)
+    db.add_all([admin, *winners, loser])
+    db.flush()
+
+    event = event_model.Event(title="rain tomorrow", created_by=admin.id, status=event_enums.EventStatus.COMPLETED)
+    db.add(event)
+    db.flush()
+
+    for winner in winners:
+        db.add(portfolio_model.Portfolio(user_id=winner.id, event_id=event.id, quantity=1,
+                                         type_of_share=portfolio_enums.ShareType.YES))
+    db.add(portfolio_model.Portfolio(user_id=loser.id, event_id=event.id, quantity=1,
+                                     type_of_share=portfolio_enums.ShareType.NO))
+    db.commit()
+
+    last_id, count = settlement.settle_chunk(db, event.id, event_enums.EventResult.YES, admin.id)
+    db.commit()
+
+    assert count == 4
+    assert settlement.settle_chunk(db, event.id, event_enums.EventResult.YES, admin.id, last_id) == (None, 0)
+
+    balances = _balances(db)
+    assert balances[admin.id] == 15
+    assert [balances[winner.id] for winner in winners] == [10, 10, 10]
+    assert balances[loser.id] == 3
+
+    trades = db.execute(select(trade_model.Trade.price, trade_model.Trade.quantity)
+                        .order_by(trade_model.Trade.id)).all()
+    assert [tuple(trade) for trade in trades] == [(10, 1), (10, 1), (10, 1), (0, 1)]
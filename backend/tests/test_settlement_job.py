@@ -0,0 +1,91 @@
+"""
+Settlement job test , runs a job against the scratch sqlite database. Checks that only one
+process claims a job until it goes stale , that a chunk moves the checkpoint once and that
+running a job again doesn't pay twice.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.enums import event_enums, portfolio_enums, settlement_enums
+from app.model import event_model, portfolio_model, settlement_job_model, user_model
+from app.service import settlement
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def job(db):
+    """A pending job for an event where one user holds 3 winning YES shares"""
+    admin = user_model.User(username="admin", email="admin@example.com", hashed_password="x",
+                            is_admin=True, current_balance=100000)
+    holder = user_model.User(username="holder", email="holder@example.com", hashed_password="x", current_balance=0)
+    db.add_all([admin, holder])
+    db.flush()
+
+    event = event_model.Event(title="rain tomorrow", created_by=admin.id, status=event_enums.EventStatus.COMPLETED)
+    db.add(event)
+    db.flush()
+
+    db.add(portfolio_model.Portfolio(user_id=holder.id, event_id=event.id, quantity=3,
+                                     type_of_share=portfolio_enums.ShareType.YES))
+    settlement_job = settlement_job_model.SettlementJob(
+        event_id=event.id,
+        result=event_enums.EventResult.YES,
+        admin_id=admin.id,
+        status=settlement_enums.SettlementStatus.PENDING,
+        total=1,
+        processed=0,
+        last_portfolio_id=0
+    )
+    db.add(settlement_job)
+    db.commit()
+    return {"id": settlement_job.id, "holder": holder.id}
+
+
+def _set_job(db, job_id: int, **values):
+    db.execute(update(settlement_job_model.SettlementJob)
+               .where(settlement_job_model.SettlementJob.id == job_id)
+               .values(**values))
+    db.commit()
+
+
+def test_only_one_process_claims_a_job_until_it_goes_stale(db, job):
+    assert settlement._claim_job(db, job["id"]) is True
+    assert settlement._claim_job(db, job["id"]) is False
+
+    _set_job(db, job["id"], updated_at=datetime.now(timezone.utc) - timedelta(seconds=settlement.SETTLEMENT_STALE_SECONDS + 60))
+    assert settlement._claim_job(db, job["id"]) is True
+
+
+def test_a_chunk_advances_the_checkpoint_once(db, job):
+    assert settlement._claim_job(db, job["id"]) is True
+
+    assert settlement._advance_job(db, job["id"], 0, {"last_portfolio_id": 5}) is True
+    db.commit()
+    # a process taken over while paying the same chunk must roll back
+    assert settlement._advance_job(db, job["id"], 0, {"last_portfolio_id": 5}) is False
+    db.rollback()
+
+    db.expire_all()
+    assert db.get(settlement_job_model.SettlementJob, job["id"]).last_portfolio_id == 5
+
+
+def test_running_a_job_twice_pays_once(db, job):
+    settlement.run_settlement_job(job["id"])
+    settlement.run_settlement_job(job["id"])
+
+    db.expire_all()
+    assert db.get(user_model.User, job["holder"]).current_balance == 30
+    settlement_job = db.get(settlement_job_model.SettlementJob, job["id"])
+    assert settlement_job.status == settlement_enums.SettlementStatus.COMPLETED
+    assert settlement_job.processed == 1